@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Time it takes LxaNetwork to discover and set up a bus full of nodes
+
+Runs the server side against simulated nodes on the python-can virtual bus
+and reports the time until all nodes are set up.
+No CAN interface is needed.
+
+Usage:
+
+    python3 contrib/benchmarks/lss_scan.py [--nodes N] [--latency SECONDS] [--products]
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+from simulated_bus import SimulatedBus, SimulatedNode
+
+from lxa_iobus.network import LxaNetwork
+from lxa_iobus.node.products import PRODUCTS
+
+CHANNEL = "lss-scan-benchmark"
+
+
+async def discover(args):
+    loop = asyncio.get_running_loop()
+    network = LxaNetwork(loop, CHANNEL, bustype="virtual")
+
+    start = time.monotonic()
+    task = loop.create_task(network.run())
+
+    while len(network.nodes) < args.nodes:
+        await asyncio.sleep(0.01)
+
+    duration = time.monotonic() - start
+
+    network.shutdown()
+    await task
+
+    return duration, network.lss_timeout
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", type=int, default=30)
+    parser.add_argument("--latency", type=float, default=0.001, help="Response latency of the nodes")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--products", action="store_true", help="Simulate a mix of the known products")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+
+    # Without --products all nodes share vendor, product and revision,
+    # but are not of a known product
+    products = [[0x507, 4, 3]]
+
+    if args.products:
+        products = [[p.LSS_VENDOR, p.LSS_PRODUCT, p.LSS_REVISION] for p in PRODUCTS]
+
+    nodes = [SimulatedNode(rng.choice(products) + [rng.getrandbits(32)]) for _ in range(args.nodes)]
+    bus = SimulatedBus(nodes, CHANNEL, latency=args.latency)
+
+    duration, lss_timeout = asyncio.run(discover(args))
+
+    bus.stop()
+
+    print(f"nodes:              {args.nodes}")
+    print(f"total:              {duration:.2f}s")
+    print(f"per node:           {duration / args.nodes:.3f}s")
+    print(f"lss requests:       {bus.lss_requests}")
+    print(f"learned timeout:    {lss_timeout * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
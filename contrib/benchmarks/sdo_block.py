@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""Time it takes to read and write objects with block and segmented transfers
+
+Runs the server side against a simulated node on the python-can virtual bus
+and reports the average time per transfer for both transfer types.
+With --segment-loss some segments of block uploads get lost, so the node
+has to send them again.
+No CAN interface is needed.
+
+Usage:
+
+    python3 contrib/benchmarks/sdo_block.py [--sizes KIB [KIB ...]] [--repeat N] [--latency SECONDS]
+                                            [--segment-loss P]
+"""
+
+import argparse
+import asyncio
+import time
+
+from simulated_bus import SimulatedBus, SimulatedNode
+
+from lxa_iobus.network import LxaNetwork
+
+CHANNEL = "sdo-block-benchmark"
+INDEX = 0x2F00
+
+
+async def transfer(node, simulated_node, payload, upload, block):
+    # Writes use a block download whenever the node is not known to lack
+    # support for it, reads when asked to
+    node.block_transfer_supported = None if block else False
+
+    if upload:
+        simulated_node.objects[(INDEX, 0)] = payload
+        data = await node.sdo_read(INDEX, 0, block=block)
+
+    else:
+        await node.sdo_write(INDEX, 0, payload)
+        data = simulated_node.objects[(INDEX, 0)]
+
+    assert bytes(data) == payload
+
+
+async def measure(args, simulated_node):
+    loop = asyncio.get_running_loop()
+    network = LxaNetwork(loop, CHANNEL, bustype="virtual")
+    task = loop.create_task(network.run())
+
+    while not network.nodes:
+        await asyncio.sleep(0.01)
+
+    node = next(iter(network.nodes.values()))
+    results = []
+
+    for kib in args.sizes:
+        payload = bytes(i & 0xFF for i in range(kib * 1024))
+
+        for upload in (True, False):
+            for block in (True, False):
+                start = time.monotonic()
+
+                for _ in range(args.repeat):
+                    await transfer(node, simulated_node, payload, upload, block)
+
+                duration = (time.monotonic() - start) / args.repeat
+
+                results.append((kib, upload, block, duration))
+
+    network.shutdown()
+    await task
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 8], help="Transfer sizes in KiB")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.001, help="Response latency of the node")
+    parser.add_argument("--segment-loss", type=float, default=0.0, help="Probability a block segment gets lost")
+    args = parser.parse_args()
+
+    simulated_node = SimulatedNode([0x507, 4, 3, 1], segment_loss=args.segment_loss)
+    bus = SimulatedBus([simulated_node], CHANNEL, latency=args.latency)
+
+    results = asyncio.run(measure(args, simulated_node))
+
+    bus.stop()
+
+    print(f"{'direction':10} {'size':>8} {'block':>10} {'segmented':>10}")
+
+    for kib in args.sizes:
+        for upload in (True, False):
+            durations = {block: duration for size, up, block, duration in results if size == kib and up == upload}
+            direction = "upload" if upload else "download"
+
+            print(f"{direction:10} {kib:>5}KiB {durations[True] * 1000:>8.1f}ms {durations[False] * 1000:>8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
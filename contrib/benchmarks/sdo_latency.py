@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""SDO round trip latency of the threaded and the asyncio CAN transport
+
+A responder process answers expedited SDO uploads for a fake node on the
+given interface while the benchmark performs SDO reads through LxaNetwork,
+once per transport.
+Needs a SocketCAN interface without other nodes on it, e.g. a vcan:
+
+    sudo ip link add dev vcan0 type vcan
+    sudo ip link set vcan0 up
+
+Usage:
+
+    python3 contrib/benchmarks/sdo_latency.py [--interface vcan0] [--reads N]
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import statistics
+import time
+
+from can import Bus, Message
+
+from lxa_iobus.network import TRANSPORTS, LxaNetwork
+from lxa_iobus.node.bus_node import LxaBusNode
+
+NODE_ID = 1
+
+
+def responder(interface, ready):
+    bus = Bus(channel=interface, interface="socketcan")
+    ready.set()
+
+    while True:
+        request = bus.recv()
+
+        if request.arbitration_id != 0x600 + NODE_ID:
+            continue
+
+        # Expedited upload response with four bytes of data
+        bus.send(
+            Message(
+                arbitration_id=0x580 + NODE_ID,
+                data=bytes([0x43]) + bytes(request.data[1:4]) + b"\x01\x02\x03\x04",
+                is_extended_id=False,
+            )
+        )
+
+
+async def measure(interface, transport, reads):
+    loop = asyncio.get_running_loop()
+    network = LxaNetwork(loop, interface, transport=transport)
+    task = loop.create_task(network.run(with_lss=False))
+
+    await network.await_running()
+
+    node = LxaBusNode(network, [0, 0, 0, 0], NODE_ID)
+    network.nodes[NODE_ID] = node
+
+    # Warm up
+    for _ in range(10):
+        await node.sdo_read(0x1018, 1)
+
+    samples = []
+
+    for _ in range(reads):
+        start = time.perf_counter()
+        await node.sdo_read(0x1018, 1)
+        samples.append(time.perf_counter() - start)
+
+    network.shutdown()
+    await task
+
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--interface", default="vcan0")
+    parser.add_argument("--reads", type=int, default=2000, help="SDO reads per transport")
+    args = parser.parse_args()
+
+    ready = multiprocessing.Event()
+    process = multiprocessing.Process(target=responder, args=(args.interface, ready), daemon=True)
+    process.start()
+    ready.wait()
+
+    print(f"{'transport':12} {'min':>10} {'median':>10} {'p99':>10} {'reads/s':>10}")
+
+    for transport in TRANSPORTS:
+        samples = sorted(asyncio.run(measure(args.interface, transport, args.reads)))
+
+        print(
+            f"{transport:12} "
+            f"{samples[0] * 1e6:8.0f}us "
+            f"{statistics.median(samples) * 1e6:8.0f}us "
+            f"{samples[int(len(samples) * 0.99)] * 1e6:8.0f}us "
+            f"{len(samples) / sum(samples):10,.0f}"
+        )
+
+    process.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""CPU time and memory used by segmented SDO transfers
+
+Runs segmented uploads and downloads of different sizes against a simulated
+node that answers in-process, without a CAN bus in between, so only the
+work done by the transfer engine in LxaBusNode is measured.
+No CAN interface is needed.
+
+Usage:
+
+    python3 contrib/benchmarks/sdo_segmented.py [--sizes KIB [KIB ...]] [--repeat N]
+"""
+
+import argparse
+import asyncio
+import time
+import tracemalloc
+
+from can import Message
+from simulated_bus import SDO_RESPONSE, SimulatedNode
+
+from lxa_iobus.node.bus_node import LxaBusNode
+
+NODE_ID = 1
+INDEX = 0x2F00
+
+
+class LoopbackNetwork:
+    """Hands every frame to a SimulatedNode and its response back to the LxaBusNode"""
+
+    bitrate = 1000000
+
+    def __init__(self, simulated_node):
+        self.simulated_node = simulated_node
+        self.node = None
+
+    async def send_message(self, message, priority=None):
+        message.timestamp = time.time()
+        for response in self.simulated_node.sdo(message.data):
+            asyncio.get_running_loop().call_soon(
+                self.node.set_sdo_response,
+                Message(arbitration_id=SDO_RESPONSE + NODE_ID, data=response, is_extended_id=False),
+            )
+
+        sent = asyncio.get_running_loop().create_future()
+        sent.set_result(message.timestamp)
+
+        return sent
+
+
+async def transfer(node, simulated_node, size, upload):
+    payload = bytes(i & 0xFF for i in range(size))
+
+    if upload:
+        simulated_node.objects[(INDEX, 0)] = payload
+        data = await node.sdo_read(INDEX, 0, block=False)
+
+    else:
+        await node.sdo_write(INDEX, 0, payload)
+        data = simulated_node.objects[(INDEX, 0)]
+
+    assert bytes(data) == payload
+
+
+async def measure(size, upload, repeat):
+    simulated_node = SimulatedNode([0, 0, 0, 0])
+    simulated_node.node_id = NODE_ID
+
+    network = LoopbackNetwork(simulated_node)
+    node = LxaBusNode(lxa_network=network, lss_address=[0, 0, 0, 0], node_id=NODE_ID)
+    node.block_transfer_supported = False
+    network.node = node
+
+    # Warm up and measure the allocations of a single transfer
+    tracemalloc.start()
+    await transfer(node, simulated_node, size, upload)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.process_time()
+
+    for _ in range(repeat):
+        await transfer(node, simulated_node, size, upload)
+
+    cpu = (time.process_time() - start) / repeat
+
+    return cpu, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 8, 28, 64], help="Transfer sizes in KiB")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'direction':10} {'size':>8} {'cpu/KiB':>10} {'peak memory':>12}")
+
+    for upload in (True, False):
+        for kib in args.sizes:
+            cpu, peak = asyncio.run(measure(kib * 1024, upload, args.repeat))
+            direction = "upload" if upload else "download"
+
+            print(f"{direction:10} {kib:>5}KiB {cpu / kib * 1000:>8.2f}ms {peak / 1024:>9.0f}KiB")
+
+
+if __name__ == "__main__":
+    main()
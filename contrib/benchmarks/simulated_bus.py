@@ -0,0 +1,383 @@
+"""Simulated IOBus nodes on the python-can virtual bus
+
+Used by the benchmarks to run LxaNetwork without any hardware.
+The nodes implement enough of LSS (switch mode, configure node id and fast
+scan) and of the SDO server (expedited, segmented and block transfers) for
+the server to discover them and set up their object directories.
+They send heartbeats once a producer heartbeat time is written to 0x1017.
+"""
+
+import binascii
+import random
+import struct
+import threading
+import time
+
+import can
+
+LSS_REQUEST = 0x7E5
+LSS_RESPONSE = 0x7E4
+SDO_REQUEST = 0x600
+SDO_RESPONSE = 0x580
+HEARTBEAT = 0x700
+
+NMT_STATE_OPERATIONAL = 0x05
+
+SDO_ABORT_OBJECT_DOES_NOT_EXIST = 0x06020000
+SDO_ABORT_UNKNOWN_COMMAND = 0x05040001
+
+SDO_BLOCK_SIZE = 127
+
+
+def iobus_objects():
+    """Object directory of a node with four outputs, three inputs and a locator"""
+
+    return {
+        (0x1008, 0): b"Simulated IOBus node",
+        (0x1009, 0): b"1",
+        (0x100A, 0): b"0.6.0",
+        (0x2000, 0): struct.pack("<L", 3),
+        (0x2000, 1): struct.pack("<L", 0x2100),
+        (0x2000, 2): struct.pack("<L", 0x2101),
+        (0x2000, 3): struct.pack("<L", 0x210C),
+        (0x2100, 0): struct.pack("<L", 2),
+        (0x2100, 1): struct.pack("<L", 4),
+        (0x2100, 2): struct.pack("<L", 0),
+        (0x2101, 0): struct.pack("<L", 2),
+        (0x2101, 1): struct.pack("<L", 3),
+        (0x2101, 2): struct.pack("<L", 0),
+        (0x210C, 1): struct.pack("<L", 0),
+    }
+
+
+class SimulatedNode:
+    """A node that answers LSS and SDO requests
+
+    segment_loss: probability that a segment of a block upload gets lost
+    """
+
+    def __init__(self, lss_address, objects=None, segment_loss=0.0, seed=1):
+        self.lss_address = list(lss_address)
+        self.node_id = 0xFF
+        self.objects = iobus_objects() if objects is None else dict(objects)
+        self.segment_loss = segment_loss
+        self._rng = random.Random(seed)
+
+        for sub_index, value in enumerate(self.lss_address, start=1):
+            self.objects[(0x1018, sub_index)] = struct.pack("<L", value)
+
+        self._configuration = False
+        self._pending_node_id = None
+        self._lss_pos = 0
+        self._transfer = None
+        self._block_download = None
+        self._next_heartbeat = 0
+
+    def reset(self):
+        """Forget the node id and all transfers, like a node that was power cycled"""
+
+        self.objects.pop((0x1017, 0), None)
+        self.node_id = 0xFF
+
+        self._configuration = False
+        self._pending_node_id = None
+        self._lss_pos = 0
+        self._transfer = None
+        self._block_download = None
+
+    # Heartbeat ###############################################################
+    def heartbeat(self, now):
+        producer_time = struct.unpack("<H", self.objects.get((0x1017, 0), bytes(2)))[0]
+
+        if not producer_time or self.node_id == 0xFF or now < self._next_heartbeat:
+            return None
+
+        self._next_heartbeat = now + producer_time / 1000
+
+        return bytes([NMT_STATE_OPERATIONAL])
+
+    # LSS #####################################################################
+    def lss(self, data):
+        command = data[0]
+
+        if command == 0x04:  # switch mode global
+            if data[1] == 1:
+                self._configuration = True
+
+            else:
+                if self._pending_node_id is not None:
+                    self.node_id = self._pending_node_id
+                    self._pending_node_id = None
+
+                self._configuration = False
+
+        elif command == 0x11 and self._configuration:  # configure node id
+            if data[1] == 0xFF:
+                self.node_id = 0xFF
+
+            else:
+                self._pending_node_id = data[1]
+
+            return bytes([0x11, 0, 0, 0, 0, 0, 0, 0])
+
+        elif command == 0x51 and self.node_id == 0xFF:  # fast scan
+            id_number, bit_checked, lss_sub, lss_next = struct.unpack_from("<LBBB", data, 1)
+
+            if bit_checked == 0x80:
+                self._lss_pos = 0
+
+                return bytes([0x4F, 0, 0, 0, 0, 0, 0, 0])
+
+            if lss_sub != self._lss_pos:
+                return None
+
+            mask = (0xFFFFFFFF << bit_checked) & 0xFFFFFFFF
+
+            if (id_number ^ self.lss_address[lss_sub]) & mask:
+                return None
+
+            if bit_checked == 0:
+                if lss_sub == 3 and lss_next == 0:
+                    self._configuration = True
+
+                self._lss_pos = lss_next
+
+            return bytes([0x4F, 0, 0, 0, 0, 0, 0, 0])
+
+        return None
+
+    # SDO #####################################################################
+    def sdo(self, data):
+        """Handle an SDO request. Returns the list of response frames."""
+
+        # While a sub-block of a block download is in progress, every frame
+        # is a segment with a sequence number instead of a command
+        if self._block_download is not None and not self._block_download["complete"] and data[0] != 0x80:
+            return self._block_download_segment(data)
+
+        command = data[0] >> 5
+
+        if command == 5:
+            return self._block_upload(data)
+
+        if command == 6:
+            return self._block_download_request(data)
+
+        response = self._sdo(data)
+
+        return [] if response is None else [response]
+
+    def _sdo(self, data):
+        command = data[0] >> 5
+
+        if command == 2:  # initiate upload
+            index, sub_index = struct.unpack_from("<HB", data, 1)
+            value = self.objects.get((index, sub_index))
+
+            if value is None:
+                return struct.pack("<BHBL", 0x80, index, sub_index, SDO_ABORT_OBJECT_DOES_NOT_EXIST)
+
+            if len(value) <= 4:
+                unused = 4 - len(value)
+
+                return struct.pack("<BHB", 0x43 | (unused << 2), index, sub_index) + value + bytes(unused)
+
+            self._transfer = [value, 0]
+
+            return struct.pack("<BHBL", 0x41, index, sub_index, len(value))
+
+        if command == 3:  # upload segment
+            value, offset = self._transfer
+            segment = value[offset : offset + 7]
+            self._transfer[1] += len(segment)
+            unused = 7 - len(segment)
+            complete = self._transfer[1] >= len(value)
+
+            return bytes([(data[0] & 0x10) | (unused << 1) | complete]) + segment + bytes(unused)
+
+        if command == 1:  # initiate download
+            index, sub_index = struct.unpack_from("<HB", data, 1)
+
+            if data[0] & 0x02:
+                unused = (data[0] >> 2) & 0b11 if data[0] & 0x01 else 0
+                self.objects[(index, sub_index)] = bytes(data[4 : 8 - unused])
+
+            else:
+                self._transfer = [index, sub_index, bytearray()]
+
+            return struct.pack("<BHBL", 0x60, index, sub_index, 0)
+
+        if command == 0:  # download segment
+            index, sub_index, value = self._transfer
+            unused = (data[0] >> 1) & 0b111
+            value += data[1 : 8 - unused]
+
+            if data[0] & 0x01:
+                self.objects[(index, sub_index)] = bytes(value)
+
+            return bytes([0x20 | (data[0] & 0x10), 0, 0, 0, 0, 0, 0, 0])
+
+        if command == 4:  # abort
+            self._transfer = None
+            self._block_download = None
+
+            return None
+
+        return struct.pack("<BHBL", 0x80, 0, 0, SDO_ABORT_UNKNOWN_COMMAND)
+
+    def _block_upload(self, data):
+        subcommand = data[0] & 0x03
+
+        if subcommand == 0:  # initiate
+            index, sub_index, blksize = struct.unpack_from("<HBB", data, 1)
+            value = self.objects.get((index, sub_index))
+
+            if value is None:
+                return [struct.pack("<BHBL", 0x80, index, sub_index, SDO_ABORT_OBJECT_DOES_NOT_EXIST)]
+
+            self._transfer = {"value": value, "offset": 0, "block_start": 0, "blksize": blksize}
+
+            # CRC supported, size indicated
+            return [struct.pack("<BHBL", 0xC6, index, sub_index, len(value))]
+
+        transfer = self._transfer
+
+        if subcommand == 1:  # end
+            self._transfer = None
+
+            return []
+
+        if subcommand == 2:  # acknowledge
+            ackseq, transfer["blksize"] = data[1], data[2]
+            transfer["offset"] = min(transfer["block_start"] + ackseq * 7, len(transfer["value"]))
+
+            if transfer["offset"] >= len(transfer["value"]):
+                unused = (7 - len(transfer["value"]) % 7) % 7
+                crc = binascii.crc_hqx(transfer["value"], 0)
+
+                return [struct.pack("<BH", 0xC1 | (unused << 2), crc) + bytes(5)]
+
+        # Start (subcommand 3) or acknowledge: send the next sub-block
+        value = transfer["value"]
+        offset = transfer["block_start"] = transfer["offset"]
+        frames = []
+
+        for seqno in range(1, transfer["blksize"] + 1):
+            segment = value[offset : offset + 7]
+            offset += len(segment)
+            last = offset >= len(value)
+
+            if self._rng.random() >= self.segment_loss:
+                frames.append(bytes([seqno | (0x80 if last else 0)]) + segment + bytes(7 - len(segment)))
+
+            if last:
+                break
+
+        return frames
+
+    def _block_download_request(self, data):
+        if data[0] & 0x01:  # end
+            transfer = self._block_download
+            self._block_download = None
+
+            unused = (data[0] >> 2) & 0b111
+            value = transfer["value"]
+            self.objects[(transfer["index"], transfer["sub_index"])] = bytes(value[: len(value) - unused])
+
+            return [bytes([0xA1]) + bytes(7)]
+
+        # initiate
+        index, sub_index = struct.unpack_from("<HB", data, 1)
+        self._block_download = {
+            "index": index,
+            "sub_index": sub_index,
+            "value": bytearray(),
+            "seqno": 0,
+            "complete": False,
+        }
+
+        # CRC supported
+        return [struct.pack("<BHBB", 0xA4, index, sub_index, SDO_BLOCK_SIZE) + bytes(3)]
+
+    def _block_download_segment(self, data):
+        transfer = self._block_download
+        seqno = data[0] & 0x7F
+        last = (data[0] & 0x80) != 0
+
+        # Segments after a lost one are dropped and sent again
+        # in the next sub-block
+        if seqno == transfer["seqno"] + 1:
+            transfer["seqno"] = seqno
+            transfer["value"] += data[1:8]
+            transfer["complete"] = last
+
+        if not last and seqno < SDO_BLOCK_SIZE:
+            return []
+
+        ackseq = transfer["seqno"]
+        transfer["seqno"] = 0
+
+        return [bytes([0xA2, ackseq, SDO_BLOCK_SIZE]) + bytes(5)]
+
+
+class SimulatedBus:
+    """Answers requests for a list of SimulatedNodes in a background thread
+
+    latency: time between a request and the response of the nodes
+    """
+
+    def __init__(self, nodes, channel, latency=0.0):
+        self.nodes = nodes
+        self.latency = latency
+        self.lss_requests = 0
+
+        self._bus = can.Bus(channel=channel, interface="virtual")
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while self._running:
+            request = self._bus.recv(0.05)
+            now = time.monotonic()
+
+            for node in self.nodes:
+                heartbeat = node.heartbeat(now)
+
+                if heartbeat is not None:
+                    self._bus.send(
+                        can.Message(arbitration_id=HEARTBEAT + node.node_id, data=heartbeat, is_extended_id=False)
+                    )
+
+            if request is None:
+                continue
+
+            responses = []
+
+            if request.arbitration_id == LSS_REQUEST:
+                self.lss_requests += 1
+
+                for node in self.nodes:
+                    response = node.lss(request.data)
+
+                    # Identical frames of multiple nodes merge on a real bus
+                    if response is not None and (LSS_RESPONSE, response) not in responses:
+                        responses.append((LSS_RESPONSE, response))
+
+            elif SDO_REQUEST < request.arbitration_id < SDO_REQUEST + 0x80:
+                node_id = request.arbitration_id - SDO_REQUEST
+
+                for node in self.nodes:
+                    if node.node_id == node_id:
+                        responses.extend((SDO_RESPONSE + node_id, response) for response in node.sdo(request.data))
+
+            if responses and self.latency:
+                time.sleep(self.latency)
+
+            for arbitration_id, data in responses:
+                self._bus.send(can.Message(arbitration_id=arbitration_id, data=data, is_extended_id=False))
+
+    def stop(self):
+        self._running = False
+        self._thread.join()
+        self._bus.shutdown()
@@ -0,0 +1,152 @@
+import time
+
+# Length of the window the bus utilisation is averaged over in seconds
+UTILISATION_WINDOW = 10
+
+
+def frame_bits(dlc, is_extended_id=False):
+    """Worst case length of a CAN data frame on the wire in bits
+
+    Includes start of frame, arbitration, control, CRC, ACK and end of
+    frame fields, the interframe space and the maximum number of stuff
+    bits. Stuff bits are inserted after every five bits of the same value
+    between start of frame and CRC, which is at most one per four bits of
+    the stuffed fields.
+    """
+
+    # From start of frame to the end of the CRC
+    stuffed = (54 if is_extended_id else 34) + 8 * dlc
+
+    # CRC delimiter, ACK, end of frame and interframe space
+    unstuffed = 13
+
+    return stuffed + unstuffed + (stuffed - 1) // 4
+
+
+# Lookup tables for the per frame accounting
+_FRAME_BITS = tuple(frame_bits(dlc) for dlc in range(9))
+_FRAME_BITS_EXTENDED = tuple(frame_bits(dlc, is_extended_id=True) for dlc in range(9))
+
+
+def cob_id_node_id(cob_id):
+    """The node id a CANopen COB-ID belongs to, or None for broadcasts and LSS"""
+
+    if cob_id < 0x80 or cob_id >= 0x780:
+        return None
+
+    return (cob_id & 0x7F) or None
+
+
+class TrafficCounter:
+    """Frames, payload bytes and worst case bits on the wire"""
+
+    __slots__ = ("frames", "bytes", "bits")
+
+    def __init__(self):
+        self.frames = 0
+        self.bytes = 0
+        self.bits = 0
+
+    def to_dict(self):
+        return {
+            "frames": self.frames,
+            "bytes": self.bytes,
+            "bits": self.bits,
+        }
+
+
+class BusStatistics:
+    """Per direction and per node traffic accounting and bus utilisation
+
+    Only frames seen by the server are counted. Frames sent by nodes that
+    were dropped by the receive filters do not show up here.
+    """
+
+    def __init__(self, bitrate, window=UTILISATION_WINDOW):
+        self.bitrate = bitrate
+        self.window = window
+
+        self.tx = TrafficCounter()
+        self.rx = TrafficCounter()
+
+        # {node_id: (tx counter, rx counter)}
+        self.nodes = dict()
+
+        # Bits on the wire per second, for the last `window` seconds
+        self._second = int(time.monotonic())
+        self._bits = [0] * (window + 1)
+
+    def count_tx(self, message):
+        self._count(self.tx, 0, message)
+
+    def count_rx(self, message):
+        self._count(self.rx, 1, message)
+
+    def _count(self, counter, direction, message):
+        dlc = message.dlc
+        bits = _FRAME_BITS_EXTENDED[dlc] if message.is_extended_id else _FRAME_BITS[dlc]
+
+        counter.frames += 1
+        counter.bytes += dlc
+        counter.bits += bits
+
+        if not message.is_extended_id:
+            node_id = cob_id_node_id(message.arbitration_id)
+
+            if node_id is not None:
+                if node_id not in self.nodes:
+                    self.nodes[node_id] = (TrafficCounter(), TrafficCounter())
+
+                node_counter = self.nodes[node_id][direction]
+                node_counter.frames += 1
+                node_counter.bytes += dlc
+                node_counter.bits += bits
+
+        self._advance(int(time.monotonic()))
+        self._bits[self._second % len(self._bits)] += bits
+
+    def _advance(self, second):
+        # Clear the buckets of the seconds that passed without traffic
+        if second == self._second:
+            return
+
+        for passed in range(self._second + 1, min(second, self._second + len(self._bits)) + 1):
+            self._bits[passed % len(self._bits)] = 0
+
+        self._second = second
+
+    def utilisation(self):
+        """Share of the bus bandwidth used, averaged over the last `window` seconds
+        and the peak of a single second in that window.
+        The second that is currently in progress is not included.
+
+        Returns: (average, peak), both between 0 and 1
+        """
+
+        self._advance(int(time.monotonic()))
+
+        complete = [self._bits[(self._second - i) % len(self._bits)] for i in range(1, self.window + 1)]
+
+        return sum(complete) / (self.bitrate * self.window), max(complete) / self.bitrate
+
+    def to_dict(self, node_names=None):
+        """
+        node_names: {node_id: name} used to label the per node counters.
+                    Node ids that are not in it are labeled by their id.
+        """
+
+        node_names = node_names or dict()
+        utilisation, utilisation_peak = self.utilisation()
+
+        return {
+            "bitrate": self.bitrate,
+            "utilisation": utilisation,
+            "utilisation_peak": utilisation_peak,
+            "utilisation_window": self.window,
+            "tx": self.tx.to_dict(),
+            "rx": self.rx.to_dict(),
+            "nodes": {
+                node_names.get(node_id, str(node_id)): {"tx": tx.to_dict(), "rx": rx.to_dict()}
+                for node_id, (tx, rx) in sorted(self.nodes.items())
+            },
+        }
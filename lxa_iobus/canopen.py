@@ -1,5 +1,7 @@
+import binascii
+import enum
 import struct
-from time import time
+from typing import NamedTuple
 
 from can import Message
 
@@ -17,6 +19,9 @@ SDO_PROTOCOL_IDENTIFIER_MASTER_TO_SLAVE = range(
 )
 SDO_PROTOCOL_IDENTIFIER_SLAVE_TO_MASTER = range(0x581, 0x5FF + 1)
 
+HEARTBEAT_PROTOCOL_IDENTIFIER_PREFIX = 0x700
+HEARTBEAT_PROTOCOL_IDENTIFIER = range(0x701, 0x77F + 1)
+
 # The length of the data is stored in the data field
 SDO_TRANSFER_TYPE_SIZE = 0b01
 
@@ -26,6 +31,19 @@ SDO_TRANSFER_TYPE_DATA_WITH_SIZE = 0b11
 # No size is given and must be inverted from packet size
 SDO_TRANSFER_TYPE_DATA_NO_SIZE = 0b10
 
+# The maximum number of segments per block in an SDO block transfer
+SDO_BLOCK_SIZE_MAX = 127
+
+# Sub commands of SDO block download/upload responses
+SDO_BLOCK_SUBCOMMAND_INITIATE = 0
+SDO_BLOCK_SUBCOMMAND_END = 1
+SDO_BLOCK_SUBCOMMAND_ACK = 2
+
+SDO_ABORT_CODE_TIMEOUT = 0x05040000
+SDO_ABORT_CODE_UNKNOWN_COMMAND = 0x05040001
+SDO_ABORT_CODE_INVALID_SEQUENCE_NUMBER = 0x05040003
+SDO_ABORT_CODE_CRC_ERROR = 0x05040004
+
 SDO_ABORT_CODES = {
     0x05030000: "Toggle bit not alternated",
     0x05040000: "SDO protocol timed out",
@@ -61,6 +79,70 @@ SDO_ABORT_CODES = {
 }
 
 
+# Precompiled frame layouts and lookup tables for the frame generators below.
+#
+# Every frame is packed into a freshly allocated 8 byte bytearray that is
+# handed to can.Message as-is. python-can keeps bytearrays without copying
+# them, so the payload is only allocated once per frame.
+# The buffer can not be shared between frames, because frames may still sit
+# in the outgoing queue when the next one is generated.
+_LSS_COMMAND = struct.Struct("<BB")
+_LSS_FAST_SCAN = struct.Struct("<BLBBB")
+_SDO_INITIATE = struct.Struct("<BHB")
+_SDO_MULTIPLEXER = struct.Struct("<HB")
+_SDO_ABORT = struct.Struct("<HBL")
+_SDO_ABORT_REQUEST = struct.Struct("<BHBL")
+_SDO_BLOCK_DOWNLOAD_INITIATE = struct.Struct("<BHBL")
+_SDO_BLOCK_UPLOAD_INITIATE = struct.Struct("<BHBBB")
+_SDO_BLOCK_END = struct.Struct("<BH")
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<L")
+
+_NODE_IDS = frozenset(range(0, 128))
+_U8_VALUES = frozenset(range(0, 256))
+_SDO_TRANSFER_TYPES = frozenset(range(0, 4))
+
+# ccs=1, indexed by [number of data bytes][transfer type]
+_SDO_INITIATE_DOWNLOAD_COMMANDS = tuple(
+    tuple((1 << 5) | ((4 - length) << 2) | type for type in range(4)) for length in range(5)
+)
+
+# ccs=0, indexed by [toggle][complete][number of data bytes]
+_SDO_SEGMENT_DOWNLOAD_COMMANDS = tuple(
+    tuple(tuple((toggle << 4) | ((7 - length) << 1) | complete for length in range(8)) for complete in range(2))
+    for toggle in range(2)
+)
+
+# ccs=2
+_SDO_INITIATE_UPLOAD_COMMAND = 2 << 5
+
+# ccs=3, indexed by [toggle]
+_SDO_SEGMENT_UPLOAD_COMMANDS = tuple((3 << 5) | (toggle << 4) for toggle in range(2))
+
+# ccs=6 (block download), cs=0, with size indicated
+_SDO_BLOCK_DOWNLOAD_INITIATE_COMMAND = (6 << 5) | (1 << 1)
+
+# ccs=6 (block download), cs=1, indexed by [number of bytes not used]
+_SDO_BLOCK_DOWNLOAD_END_COMMANDS = tuple((6 << 5) | (n << 2) | 1 for n in range(8))
+
+# ccs=5 (block upload), indexed by [cs]
+_SDO_BLOCK_UPLOAD_COMMANDS = tuple((5 << 5) | cs for cs in range(4))
+
+# Client side CRC support flag of the block transfer initiate requests
+_SDO_BLOCK_CRC_SUPPORTED = 1 << 2
+
+# Indexed by (e, s) of an initiate upload response
+_SDO_READABLE_TRANSFER_TYPES = {
+    (0, 0): "Reserved",
+    # The length of the data is stored in the data field
+    (0, 1): "Size",
+    # The length is stored in n and data in the data field
+    (1, 1): "DataWithSize",
+    # No size is given and must be inverted from packet size
+    (1, 0): "DataNoSize",
+}
+
+
 class LssMode:
     OPERATION = 0
     CONFIGURATION = 1
@@ -88,88 +170,212 @@ class SdoAbort(Exception):
         return self.__str__()
 
 
-class SdoMessage:
-    def __init__(self, **kwargs):
-        for key, value in kwargs.items():
-            setattr(self, key, value)
+class SdoMessageType(enum.IntEnum):
+    """SDO responses (node -> server) by their server command specifier"""
+
+    UPLOAD_SEGMENT = 0
+    DOWNLOAD_SEGMENT = 1
+    INITIATE_UPLOAD = 2
+    INITIATE_DOWNLOAD = 3
+    ABORT = 4
+    BLOCK_DOWNLOAD = 5
+    BLOCK_UPLOAD = 6
+
+
+class SdoUploadSegment(NamedTuple):
+    node_id: int
+    toggle: bool
+    number_of_bytes_not_used: int
+    complete: bool
+    message: Message
+
+    type = SdoMessageType.UPLOAD_SEGMENT
+
+    @property
+    def seg_data(self):
+        # A view instead of a copy. Only valid as long as the frame is.
+        return memoryview(self.message.data)[1:]
+
+
+class SdoDownloadSegment(NamedTuple):
+    node_id: int
+    toggle: bool
+    message: Message
+
+    type = SdoMessageType.DOWNLOAD_SEGMENT
+
+
+class SdoInitiateUpload(NamedTuple):
+    node_id: int
+    number_of_bytes_not_used: int
+    transfer_type: bool
+    indicates_size: bool
+    index: int
+    subindex: int
+    message: Message
+
+    type = SdoMessageType.INITIATE_UPLOAD
+
+    @property
+    def data(self):
+        return self.message.data[4:]
+
+    @property
+    def readable_transfer_type(self):
+        return _SDO_READABLE_TRANSFER_TYPES[self.transfer_type, self.indicates_size]
+
+
+class SdoInitiateDownload(NamedTuple):
+    node_id: int
+    index: int
+    subindex: int
+    message: Message
+
+    type = SdoMessageType.INITIATE_DOWNLOAD
+
+
+class SdoBlockDownload(NamedTuple):
+    node_id: int
+    subcommand: int
+    crc_supported: bool
+    message: Message
+
+    type = SdoMessageType.BLOCK_DOWNLOAD
+
+    @property
+    def index(self):
+        return _U16.unpack_from(self.message.data, 1)[0]
+
+    @property
+    def subindex(self):
+        return self.message.data[3]
+
+    @property
+    def ackseq(self):
+        # Only valid for SDO_BLOCK_SUBCOMMAND_ACK
+        return self.message.data[1]
+
+    @property
+    def blksize(self):
+        if self.subcommand == SDO_BLOCK_SUBCOMMAND_ACK:
+            return self.message.data[2]
+
+        return self.message.data[4]
+
+
+class SdoBlockUpload(NamedTuple):
+    node_id: int
+    subcommand: int
+    crc_supported: bool
+    indicates_size: bool
+    number_of_bytes_not_used: int
+    message: Message
+
+    type = SdoMessageType.BLOCK_UPLOAD
+
+    @property
+    def index(self):
+        return _U16.unpack_from(self.message.data, 1)[0]
+
+    @property
+    def subindex(self):
+        return self.message.data[3]
+
+    @property
+    def size(self):
+        # Only valid for SDO_BLOCK_SUBCOMMAND_INITIATE
+        return _U32.unpack_from(self.message.data, 4)[0]
+
+    @property
+    def crc(self):
+        # Only valid for SDO_BLOCK_SUBCOMMAND_END
+        return _U16.unpack_from(self.message.data, 1)[0]
+
+
+class SdoAbortMessage(NamedTuple):
+    node_id: int
+    index: int
+    subindex: int
+    error_code: int
+    message: Message
+
+    type = SdoMessageType.ABORT
+
+
+class _TxMessage(Message):
+    """A can.Message with a cheaper constructor for the frames generated below
+
+    All frames sent by the server are 8 byte standard data frames,
+    so everything but the ID and the payload is constant.
+    Setting the slots directly skips the argument handling in
+    Message.__init__, which otherwise dominates the cost of a frame.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, arbitration_id, data):
+        self.timestamp = 0.0
+        self.arbitration_id = arbitration_id
+        self.is_extended_id = False
+        self.is_remote_frame = False
+        self.is_error_frame = False
+        self.channel = None
+        self.is_fd = False
+        self.is_rx = False
+        self.bitrate_switch = False
+        self.error_state_indicator = False
+        self.data = data
+        self.dlc = 8
 
 
 def gen_lss_switch_mode_global_message(lss_mode):
     if lss_mode not in (LssMode.OPERATION, LssMode.CONFIGURATION):
         raise ValueError
 
-    return Message(
-        timestamp=time(),
-        arbitration_id=LSS_PROTOCOL_IDENTIFIER_MASTER_TO_SLAVE,
-        data=struct.pack(
-            "<BBxxxxxx",
-            LSS_COMMAND_SPECIFIER_SWITCH_MODE_GLOBAL,
-            lss_mode,
-        ),
-        is_extended_id=False,
-    )
+    data = bytearray(8)
+    _LSS_COMMAND.pack_into(data, 0, LSS_COMMAND_SPECIFIER_SWITCH_MODE_GLOBAL, lss_mode)
+
+    return _TxMessage(LSS_PROTOCOL_IDENTIFIER_MASTER_TO_SLAVE, data)
 
 
 def gen_lss_configure_node_id_message(node_id):
-    if (
-        not isinstance(node_id, int)
-        or node_id not in range(0, 128)  # only integer
-        or node_id == 125  # canopen ids from 0-127 are valid
-    ):  # reserved for the ISP (bootloader)
+    # canopen ids from 0-127 are valid, 125 is reserved for the ISP (bootloader)
+    if node_id not in _NODE_IDS or node_id == 125 or not isinstance(node_id, int):
         raise ValueError
 
-    return Message(
-        timestamp=time(),
-        arbitration_id=LSS_PROTOCOL_IDENTIFIER_MASTER_TO_SLAVE,
-        data=struct.pack(
-            "<BBxxxxxx",
-            LSS_COMMAND_SPECIFIER_CONFIGURE_NODE_ID,
-            node_id,
-        ),
-        is_extended_id=False,
-    )
+    data = bytearray(8)
+    _LSS_COMMAND.pack_into(data, 0, LSS_COMMAND_SPECIFIER_CONFIGURE_NODE_ID, node_id)
 
+    return _TxMessage(LSS_PROTOCOL_IDENTIFIER_MASTER_TO_SLAVE, data)
 
-def gen_invalidate_node_ids_message():
-    return Message(
-        timestamp=time(),
-        arbitration_id=LSS_PROTOCOL_IDENTIFIER_MASTER_TO_SLAVE,
-        data=struct.pack(
-            "<BBxxxxxx",
-            LSS_COMMAND_SPECIFIER_CONFIGURE_NODE_ID,
-            255,
-        ),
-        is_extended_id=False,
-    )
 
+def gen_invalidate_node_ids_message():
+    data = bytearray(8)
+    _LSS_COMMAND.pack_into(data, 0, LSS_COMMAND_SPECIFIER_CONFIGURE_NODE_ID, 255)
 
-def gen_lss_fast_scan_message(id_number, bit_checked, lss_sub, lss_next):
-    if not isinstance(id_number, int) or id_number not in range(0, 2**32):
-        raise ValueError
+    return _TxMessage(LSS_PROTOCOL_IDENTIFIER_MASTER_TO_SLAVE, data)
 
-    if not isinstance(bit_checked, int) or bit_checked not in range(0, 256):
-        raise ValueError
 
-    if not isinstance(lss_sub, int) or lss_sub not in range(0, 256):
+def gen_lss_fast_scan_message(id_number, bit_checked, lss_sub, lss_next):
+    if not isinstance(id_number, int) or not 0 <= id_number <= 0xFFFFFFFF:
         raise ValueError
 
-    if not isinstance(lss_next, int) or lss_next not in range(0, 256):
+    if bit_checked not in _U8_VALUES or lss_sub not in _U8_VALUES or lss_next not in _U8_VALUES:
         raise ValueError
 
-    return Message(
-        timestamp=time(),
-        arbitration_id=LSS_PROTOCOL_IDENTIFIER_MASTER_TO_SLAVE,
-        data=struct.pack(
-            "<BLBBB",
-            LSS_COMMAND_SPECIFIER_FAST_SCAN,
-            id_number,
-            bit_checked,
-            lss_sub,
-            lss_next,
-        ),
-        is_extended_id=False,
+    data = bytearray(8)
+    _LSS_FAST_SCAN.pack_into(
+        data,
+        0,
+        LSS_COMMAND_SPECIFIER_FAST_SCAN,
+        id_number,
+        bit_checked,
+        lss_sub,
+        lss_next,
     )
 
+    return _TxMessage(LSS_PROTOCOL_IDENTIFIER_MASTER_TO_SLAVE, data)
+
 
 def parse_lss_result(message):
     if not message.arbitration_id == LSS_PROTOCOL_IDENTIFIER_SLAVE_TO_MASTER:
@@ -195,212 +401,287 @@ def parse_lss_fast_scan_result(message):
 def gen_sdo_initiate_download(node_id, type, index, sub_index, data):
     # InitiateDownload (Server -> Node)
 
-    command_specifier = 1
+    if node_id not in _NODE_IDS or sub_index not in _U8_VALUES:
+        raise ValueError
 
-    if node_id not in range(0, 128):
+    if not isinstance(index, int) or not 0 <= index <= 0xFFFF:
         raise ValueError
 
-    if type not in range(0, 4):
+    length = len(data)
+
+    if length > 4 or type not in _SDO_TRANSFER_TYPES:
         raise ValueError
 
-    if index not in range(0, 0xFFFF + 1):
+    frame = bytearray(8)
+    _SDO_INITIATE.pack_into(frame, 0, _SDO_INITIATE_DOWNLOAD_COMMANDS[length][type], index, sub_index)
+    frame[4 : 4 + length] = data
+
+    return _TxMessage(SDO_PROTOCOL_IDENTIFIER_MASTER_TO_SLAVE_PREFIX | node_id, frame)
+
+
+def gen_sdo_segment_download(node_id, toggle, complete, seg_data):
+    # DownloadSegment (Server -> Node)
+
+    if node_id not in _NODE_IDS:
         raise ValueError
 
-    if sub_index not in range(0, 0xFF + 1):
+    if not isinstance(toggle, bool) or not isinstance(complete, bool):
         raise ValueError
 
-    if len(data) not in range(0, 5):
+    length = len(seg_data)
+
+    if length > 7:
         raise ValueError
 
-    n = 4 - len(data)
-
-    return Message(
-        timestamp=time(),
-        arbitration_id=SDO_PROTOCOL_IDENTIFIER_MASTER_TO_SLAVE_PREFIX | node_id,
-        data=struct.pack(
-            "<BHB4s",
-            (command_specifier << 5) | (n << 2) | type,
-            index,
-            sub_index,
-            data,
-        ),
-        is_extended_id=False,
-    )
+    frame = bytearray(8)
+    frame[0] = _SDO_SEGMENT_DOWNLOAD_COMMANDS[toggle][complete][length]
+    frame[1 : 1 + length] = seg_data
 
+    return _TxMessage(SDO_PROTOCOL_IDENTIFIER_MASTER_TO_SLAVE_PREFIX | node_id, frame)
 
-def gen_sdo_segment_download(node_id, toggle, complete, seg_data):
-    # DownloadSegment (Server -> Node)
 
-    command_specifier = 0
+def gen_sdo_initiate_upload(node_id, index, sub_index):
+    # InitiateUpload (Server -> Node)
+
+    if node_id not in _NODE_IDS or sub_index not in _U8_VALUES:
+        raise ValueError
 
-    if node_id not in range(0, 128):
+    if not isinstance(index, int) or not 0 <= index <= 0xFFFF:
         raise ValueError
 
-    if not isinstance(toggle, bool):
+    frame = bytearray(8)
+    _SDO_INITIATE.pack_into(frame, 0, _SDO_INITIATE_UPLOAD_COMMAND, index, sub_index)
+
+    return _TxMessage(SDO_PROTOCOL_IDENTIFIER_MASTER_TO_SLAVE_PREFIX | node_id, frame)
+
+
+def gen_sdo_segment_upload(node_id, toggle):
+    # UploadSegment (Server -> Node)
+
+    if node_id not in _NODE_IDS or not isinstance(toggle, bool):
         raise ValueError
 
-    if not isinstance(complete, bool):
+    frame = bytearray(8)
+    frame[0] = _SDO_SEGMENT_UPLOAD_COMMANDS[toggle]
+
+    return _TxMessage(SDO_PROTOCOL_IDENTIFIER_MASTER_TO_SLAVE_PREFIX | node_id, frame)
+
+
+def gen_sdo_abort(node_id, index, sub_index, error_code):
+    # AbortTransfer (Server -> Node)
+
+    if node_id not in _NODE_IDS or sub_index not in _U8_VALUES:
         raise ValueError
 
-    toggle = int(toggle)
-    complete = int(complete)
+    if not isinstance(index, int) or not 0 <= index <= 0xFFFF:
+        raise ValueError
 
-    if len(seg_data) not in range(0, 8):
+    frame = bytearray(8)
+    _SDO_ABORT_REQUEST.pack_into(frame, 0, 4 << 5, index, sub_index, error_code)
+
+    return _TxMessage(SDO_PROTOCOL_IDENTIFIER_MASTER_TO_SLAVE_PREFIX | node_id, frame)
+
+
+def gen_sdo_block_download_initiate(node_id, index, sub_index, size, crc=True):
+    # InitiateBlockDownload (Server -> Node)
+
+    if node_id not in _NODE_IDS or sub_index not in _U8_VALUES:
         raise ValueError
 
-    n = 7 - len(seg_data)
-
-    return Message(
-        timestamp=time(),
-        arbitration_id=SDO_PROTOCOL_IDENTIFIER_MASTER_TO_SLAVE_PREFIX | node_id,
-        data=struct.pack(
-            "<B7s",
-            (command_specifier << 5) | (toggle << 4) | (n << 1) | complete,
-            seg_data,
-        ),
-        is_extended_id=False,
-    )
+    if not isinstance(index, int) or not 0 <= index <= 0xFFFF:
+        raise ValueError
 
+    command = _SDO_BLOCK_DOWNLOAD_INITIATE_COMMAND | (_SDO_BLOCK_CRC_SUPPORTED if crc else 0)
 
-def gen_sdo_initiate_upload(node_id, index, sub_index):
-    # DownloadSegment (Node -> Server)
+    frame = bytearray(8)
+    _SDO_BLOCK_DOWNLOAD_INITIATE.pack_into(frame, 0, command, index, sub_index, size)
+
+    return _TxMessage(SDO_PROTOCOL_IDENTIFIER_MASTER_TO_SLAVE_PREFIX | node_id, frame)
 
-    command_specifier = 2
 
-    if index not in range(0, 0xFFFF + 1):
+def gen_sdo_block_download_segment(node_id, seqno, last, seg_data):
+    # DownloadBlockSegment (Server -> Node)
+
+    if node_id not in _NODE_IDS or not 0 < seqno <= SDO_BLOCK_SIZE_MAX:
         raise ValueError
 
-    if sub_index not in range(0, 0xFF + 1):
+    length = len(seg_data)
+
+    if length > 7:
         raise ValueError
 
-    return Message(
-        timestamp=time(),
-        arbitration_id=SDO_PROTOCOL_IDENTIFIER_MASTER_TO_SLAVE_PREFIX | node_id,
-        data=struct.pack(
-            "<BHB4s",
-            (command_specifier << 5),
-            index,
-            sub_index,
-            b"",
-        ),
-        is_extended_id=False,
-    )
+    frame = bytearray(8)
+    frame[0] = (0x80 if last else 0) | seqno
+    frame[1 : 1 + length] = seg_data
 
+    return _TxMessage(SDO_PROTOCOL_IDENTIFIER_MASTER_TO_SLAVE_PREFIX | node_id, frame)
 
-def gen_sdo_segment_upload(node_id, toggle):
-    # UploadSegment (Node -> Server)
 
-    command_specifier = 3
+def gen_sdo_block_download_end(node_id, number_of_bytes_not_used, crc):
+    # EndBlockDownload (Server -> Node)
 
-    if node_id not in range(0, 128):
+    if node_id not in _NODE_IDS or not 0 <= number_of_bytes_not_used < 7:
         raise ValueError
 
-    if not isinstance(toggle, bool):
+    frame = bytearray(8)
+    _SDO_BLOCK_END.pack_into(frame, 0, _SDO_BLOCK_DOWNLOAD_END_COMMANDS[number_of_bytes_not_used], crc)
+
+    return _TxMessage(SDO_PROTOCOL_IDENTIFIER_MASTER_TO_SLAVE_PREFIX | node_id, frame)
+
+
+def gen_sdo_block_upload_initiate(node_id, index, sub_index, blksize, pst=0, crc=True):
+    # InitiateBlockUpload (Server -> Node)
+
+    if node_id not in _NODE_IDS or sub_index not in _U8_VALUES or pst not in _U8_VALUES:
         raise ValueError
 
-    toggle = int(toggle)
-
-    return Message(
-        timestamp=time(),
-        arbitration_id=SDO_PROTOCOL_IDENTIFIER_MASTER_TO_SLAVE_PREFIX | node_id,
-        data=struct.pack(
-            "<B7s",
-            (command_specifier << 5) | (toggle << 4),
-            b"",
-        ),
-        is_extended_id=False,
-    )
+    if not isinstance(index, int) or not 0 <= index <= 0xFFFF:
+        raise ValueError
 
+    if not 0 < blksize <= SDO_BLOCK_SIZE_MAX:
+        raise ValueError
 
-def parse_sdo_message(message):
-    sdo_message_kwargs = {}
+    command = _SDO_BLOCK_UPLOAD_COMMANDS[0] | (_SDO_BLOCK_CRC_SUPPORTED if crc else 0)
 
-    command_specifier = (message.data[0] >> 5) & 0b111
-    node_id = message.arbitration_id & 0b1111111
+    frame = bytearray(8)
+    _SDO_BLOCK_UPLOAD_INITIATE.pack_into(frame, 0, command, index, sub_index, blksize, pst)
 
+    return _TxMessage(SDO_PROTOCOL_IDENTIFIER_MASTER_TO_SLAVE_PREFIX | node_id, frame)
+
+
+def gen_sdo_block_upload_start(node_id):
+    # StartBlockUpload (Server -> Node)
+
+    if node_id not in _NODE_IDS:
+        raise ValueError
+
+    frame = bytearray(8)
+    frame[0] = _SDO_BLOCK_UPLOAD_COMMANDS[3]
+
+    return _TxMessage(SDO_PROTOCOL_IDENTIFIER_MASTER_TO_SLAVE_PREFIX | node_id, frame)
+
+
+def gen_sdo_block_upload_ack(node_id, ackseq, blksize):
+    # BlockUploadResponse (Server -> Node)
+
+    if node_id not in _NODE_IDS or not 0 <= ackseq <= SDO_BLOCK_SIZE_MAX:
+        raise ValueError
+
+    if not 0 < blksize <= SDO_BLOCK_SIZE_MAX:
+        raise ValueError
+
+    frame = bytearray(8)
+    frame[0] = _SDO_BLOCK_UPLOAD_COMMANDS[2]
+    frame[1] = ackseq
+    frame[2] = blksize
+
+    return _TxMessage(SDO_PROTOCOL_IDENTIFIER_MASTER_TO_SLAVE_PREFIX | node_id, frame)
+
+
+def gen_sdo_block_upload_end(node_id):
+    # EndBlockUploadResponse (Server -> Node)
+
+    if node_id not in _NODE_IDS:
+        raise ValueError
+
+    frame = bytearray(8)
+    frame[0] = _SDO_BLOCK_UPLOAD_COMMANDS[1]
+
+    return _TxMessage(SDO_PROTOCOL_IDENTIFIER_MASTER_TO_SLAVE_PREFIX | node_id, frame)
+
+
+def sdo_block_crc(data, crc=0):
+    """CRC used by SDO block transfers
+
+    This is the CRC-16-CCITT with polynomial x^16 + x^12 + x^5 + 1 and a
+    start value of 0, which is exactly what binascii.crc_hqx() implements.
+    """
+
+    return binascii.crc_hqx(data, crc)
+
+
+def _parse_sdo_upload_segment(node_id, command, message):
     # upload segment (node -> server)
-    if command_specifier == 0:
-        toggle = ((message.data[0] >> 4) & 1) == 1
-        number_of_bytes_not_used = (message.data[0] >> 1) & 0b111
-        complete = (message.data[0] & 1) == 1
-        seg_data = message.data[1:]
-
-        sdo_message_kwargs = {
-            "type": "upload_segment",
-            "node_id": node_id,
-            "toggle": toggle,
-            "number_of_bytes_not_used": number_of_bytes_not_used,
-            "complete": complete,
-            "seg_data": seg_data,
-        }
+    return SdoUploadSegment(
+        node_id,
+        (command & 0x10) != 0,
+        (command >> 1) & 0b111,
+        (command & 1) != 0,
+        message,
+    )
+
 
+def _parse_sdo_download_segment(node_id, command, message):
     # download segment (server -> node)
-    elif command_specifier == 1:
-        toggle = ((message.data[0] >> 4) & 1) == 1
+    return SdoDownloadSegment(node_id, (command & 0x10) != 0, message)
 
-        sdo_message_kwargs = {
-            "type": "download_segment",
-            "node_id": node_id,
-            "toggle": toggle,
-        }
 
+def _parse_sdo_initiate_upload(node_id, command, message):
     # initiate upload (node -> server)
-    elif command_specifier == 2:
-        sdo_message_kwargs["type"] = "initiate_upload"
-
-        number_of_bytes_not_used = (message.data[0] >> 2) & 0b11
-        transfer_type = ((message.data[0] >> 1) & 1) == 1
-        indicates_size = ((message.data[0] >> 0) & 1) == 1
-
-        index, subindex = struct.unpack("<xHBxxxx", message.data)
-        data = message.data[4:]
-
-        # e s
-        readable_transfer_type = {
-            (0, 0): "Reserved",
-            # The length of the data is stored in the data field
-            (0, 1): "Size",
-            # The length is stored in n and data in the data field
-            (1, 1): "DataWithSize",
-            # No size is given and must be inverted from packet size
-            (1, 0): "DataNoSize",
-        }[transfer_type, indicates_size]
-
-        sdo_message_kwargs = {
-            "type": "initiate_upload",
-            "node_id": node_id,
-            "number_of_bytes_not_used": number_of_bytes_not_used,
-            "transfer_type": transfer_type,
-            "indicates_size": indicates_size,
-            "index": index,
-            "subindex": subindex,
-            "data": data,
-            "readable_transfer_type": readable_transfer_type,
-        }
+    index, subindex = _SDO_MULTIPLEXER.unpack_from(message.data, 1)
+
+    return SdoInitiateUpload(
+        node_id,
+        (command >> 2) & 0b11,
+        (command & 0b10) != 0,
+        (command & 0b01) != 0,
+        index,
+        subindex,
+        message,
+    )
+
 
+def _parse_sdo_initiate_download(node_id, command, message):
     # initiate download (server -> node)
-    elif command_specifier == 3:
-        index, subindex = struct.unpack("<xHBxxxx", message.data)
-
-        sdo_message_kwargs = {
-            "type": "initiate_download",
-            "node_id": node_id,
-            "index": index,
-            "subindex": subindex,
-        }
-
-    # abort
-    elif command_specifier == 4:
-        index, subindex, error_code = struct.unpack("<xHBL", message.data)
-
-        sdo_message_kwargs = {
-            "type": "abort",
-            "node_id": node_id,
-            "index": index,
-            "subindex": subindex,
-            "error_code": error_code,
-        }
-
-    sdo_message_kwargs["message"] = message
-
-    return SdoMessage(**sdo_message_kwargs)
+    index, subindex = _SDO_MULTIPLEXER.unpack_from(message.data, 1)
+
+    return SdoInitiateDownload(node_id, index, subindex, message)
+
+
+def _parse_sdo_abort(node_id, command, message):
+    index, subindex, error_code = _SDO_ABORT.unpack_from(message.data, 1)
+
+    return SdoAbortMessage(node_id, index, subindex, error_code, message)
+
+
+def _parse_sdo_block_download(node_id, command, message):
+    return SdoBlockDownload(node_id, command & 0b11, (command & 0b100) != 0, message)
+
+
+def _parse_sdo_block_upload(node_id, command, message):
+    return SdoBlockUpload(
+        node_id,
+        command & 0b1,
+        (command & 0b100) != 0,
+        (command & 0b10) != 0,
+        (command >> 2) & 0b111,
+        message,
+    )
+
+
+def _parse_sdo_unknown(node_id, command, message):
+    return None
+
+
+# Indexed by the server command specifier
+_SDO_PARSERS = (
+    _parse_sdo_upload_segment,
+    _parse_sdo_download_segment,
+    _parse_sdo_initiate_upload,
+    _parse_sdo_initiate_download,
+    _parse_sdo_abort,
+    _parse_sdo_block_download,
+    _parse_sdo_block_upload,
+    _parse_sdo_unknown,
+)
+
+
+def parse_sdo_message(message):
+    """Parse an SDO response into one of the Sdo* response records
+
+    Returns None for frames with a command specifier we do not know.
+    """
+
+    command = message.data[0]
+
+    return _SDO_PARSERS[command >> 5](message.arbitration_id & 0b1111111, command, message)
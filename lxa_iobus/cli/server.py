@@ -47,7 +47,11 @@ def main():
     # parse command line arguments
     parser = ArgumentParser()
 
-    parser.add_argument("interface")
+    parser.add_argument(
+        "interface",
+        nargs="+",
+        help="CAN interface(s) to serve. Node names are prefixed with the interface name if there is more than one",
+    )
     parser.add_argument(
         "--port",
         type=int,
@@ -66,6 +70,28 @@ def main():
         default="",
         help="LSS addresses cache as json. Reduces startup time for known nodes.",
     )
+    parser.add_argument(
+        "--object-directory-cache-file",
+        type=str,
+        default="",
+        help="Object directories of known nodes as json. Reduces setup time for known nodes.",
+    )
+    parser.add_argument(
+        "--cold-start",
+        action="store_true",
+        help="Invalidate all node ids on startup instead of adopting already configured nodes",
+    )
+    parser.add_argument(
+        "--heartbeat",
+        action="store_true",
+        help="Track node liveness using CANopen heartbeats instead of SDO pings, where supported",
+    )
+    parser.add_argument(
+        "--transport",
+        choices=["threaded", "asyncio"],
+        default="threaded",
+        help="CAN transport. 'asyncio' drives the SocketCAN socket from the event loop. Defaults to 'threaded'",
+    )
 
     parser.add_argument(
         "-l",
@@ -92,32 +118,49 @@ def main():
     asyncio.set_event_loop(loop)
     app = Application()
 
-    # setup lxa network
-    network = LxaNetwork(
-        loop=loop,
-        interface=args.interface,
-        lss_address_cache_file=args.lss_address_cache_file,
-    )
+    # setup an lxa network per interface.
+    # Each of them has its own cache files.
+    def cache_file(path, interface):
+        if not path or len(args.interface) == 1:
+            return path
+
+        return f"{path}.{interface}"
+
+    networks = [
+        LxaNetwork(
+            loop=loop,
+            interface=interface,
+            lss_address_cache_file=cache_file(args.lss_address_cache_file, interface),
+            object_directory_cache_file=cache_file(args.object_directory_cache_file, interface),
+            transport=args.transport,
+            warm_start=not args.cold_start,
+            heartbeat=args.heartbeat,
+        )
+        for interface in args.interface
+    ]
+
+    app["networks"] = networks
 
-    app["network"] = network
+    async def shutdown_networks(app):
+        for network in app["networks"]:
+            network.shutdown()
 
-    async def shutdown_network(app):
-        app["network"].shutdown()
+    app.on_shutdown.append(shutdown_networks)
 
-    app.on_shutdown.append(shutdown_network)
-    loop.create_task(network.run())
+    for network in networks:
+        loop.create_task(network.run())
 
     # start server
     try:
         server = LXAIOBusServer(
             app,
             loop,
-            network,
+            networks,
         )
 
     except OSError as e:
         if e.errno == errno.ENODEV:  # can interface not available
-            exit("interface {} not available".format(args.interface))
+            exit("interface {} not available".format(", ".join(args.interface)))
 
     print("starting server on http://{}:{}/".format(args.host, args.port))
 
@@ -5,9 +5,14 @@ import time
 from datetime import datetime
 
 from lxa_iobus.lpc11xxcanisp import loader
+from lxa_iobus.node.bus_node import WRITE_TIMEOUT
 
 basepath = os.path.dirname(os.path.dirname(loader.__file__))
 
+# Erasing and programming flash sectors is only confirmed once it is done,
+# which takes longer than other writes
+FLASH_TIMEOUT = 5
+
 
 class ExceptionCanIsp(Exception):
     pass
@@ -163,17 +168,18 @@ class CanIsp:
 
         return struct.pack(form, data)
 
-    async def _send(self, index: int, subindex: int, size, num: int):
+    async def _send(self, index: int, subindex: int, size, num: int, timeout=WRITE_TIMEOUT):
         """Sends data to the MCU and converts it"""
 
         await self.node.sdo_write(
             index,
             subindex,
             self.pack(num, size=size),
+            timeout=timeout,
         )
 
-    async def send(self, name, value):
-        await self._send(*self.object_directory[name], value)
+    async def send(self, name, value, timeout=WRITE_TIMEOUT):
+        await self._send(*self.object_directory[name], value, timeout=timeout)
 
     async def _get(self, index: int, subindex: int, size):
         """Gets data from the MCU and converts it"""
@@ -226,7 +232,7 @@ class CanIsp:
 
         await self.send("Copy Flash Address", flash_addr)
         await self.send("Copy RAM Address", ram_addr)
-        await self.send("Copy Length", length)
+        await self.send("Copy Length", length, timeout=FLASH_TIMEOUT)
 
     async def go(self, addr):
         """Jumps to given address"""
@@ -243,7 +249,7 @@ class CanIsp:
         if start > 8 or stop > 8:
             raise ExceptionCanIsp("Sector out of range")
 
-        await self.send("Erase Sectors", ((start & 0xFF) | ((stop & 0xFF) << 8)))
+        await self.send("Erase Sectors", ((start & 0xFF) | ((stop & 0xFF) << 8)), timeout=FLASH_TIMEOUT)
 
     async def read_memory(self, addr: int, length: int) -> bytes:
         """Dumps part of the MCUs memory"""
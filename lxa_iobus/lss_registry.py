@@ -0,0 +1,194 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger("lxa-iobus.lss-registry")
+
+# Time to collect additions before the registry is written to disk
+WRITE_DELAY = 1.0
+
+
+def lss_mask(addresses):
+    """
+    Takes LSS addresses and generates a mask representing all bits that are
+    different between them. Returns known bits (that are the same between
+    all addresses) and a mask indicating the differences.
+
+    A bit differs between any two addresses exactly if it differs between
+    one of them and the first address, so one pass is enough.
+    """
+
+    addresses = iter(addresses)
+    first = next(addresses)
+    mask = [0, 0, 0, 0]
+
+    for address in addresses:
+        for i in range(len(mask)):
+            mask[i] |= address[i] ^ first[i]
+
+    known_bits = [first[i] & (0xFFFFFFFF ^ mask[i]) for i in range(len(mask))]
+
+    return known_bits, mask
+
+
+def write_atomic(path, content):
+    """Replace the file at `path` so that readers see either the old or the new content"""
+
+    tmp_path = f"{path}.tmp"
+
+    with open(tmp_path, "w") as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp_path, path)
+
+
+class LssAddressRegistry:
+    """Set of known LSS addresses, persisted as a json list of lists
+
+    Addresses are stored as (vendor, product, revision, serial) tuples and
+    indexed by (vendor, product, revision).
+    Additions are written to disk in batches, atomically and outside of
+    the event loop.
+    """
+
+    def __init__(self, loop, path=None, write_delay=WRITE_DELAY):
+        self.loop = loop
+        self.path = path
+        self.write_delay = write_delay
+
+        self._addresses = set()
+        self._products = dict()
+        self._masks = dict()
+
+        self._dirty = False
+        self._write_task = None
+
+        # Every change gets a new version. Writes of older versions are
+        # skipped, in case a background write finishes after a newer one.
+        self._version = 0
+        self._written_version = 0
+        self._write_lock = threading.Lock()
+
+    def __contains__(self, address):
+        return tuple(address) in self._addresses
+
+    def __len__(self):
+        return len(self._addresses)
+
+    def __iter__(self):
+        for address in sorted(self._addresses):
+            yield list(address)
+
+    def products(self):
+        """Known addresses by (vendor, product, revision)
+
+        Returns: a dictionary of product tuples and sets of serial numbers.
+        """
+
+        return self._products
+
+    def mask(self, product):
+        """Known bits and mask of the known addresses of a product
+
+        See lss_mask(). Computed once per change of the product's addresses.
+        """
+
+        if product not in self._masks:
+            self._masks[product] = lss_mask((*product, serial) for serial in self._products[product])
+
+        return self._masks[product]
+
+    def _insert(self, address):
+        address = tuple(address)
+
+        if address in self._addresses:
+            return False
+
+        self._addresses.add(address)
+        self._products.setdefault(address[:3], set()).add(address[3])
+        self._masks.pop(address[:3], None)
+        self._version += 1
+
+        return True
+
+    def add(self, address):
+        """Add an address. Returns False if it was already known."""
+
+        if not self._insert(address):
+            return False
+
+        if self.path:
+            self._dirty = True
+
+            if self._write_task is None or self._write_task.done():
+                self._write_task = self.loop.create_task(self._write_later())
+
+        return True
+
+    # persistence #############################################################
+    def load(self):
+        if not self.path:
+            logger.info("no lss address cache file set. skip loading")
+
+            return
+
+        # create file if not present
+        if not os.path.exists(self.path):
+            try:
+                write_atomic(self.path, "[]")
+
+            except Exception:
+                logger.error("exception raised while creating %s", self.path, exc_info=True)
+
+        try:
+            with open(self.path, "r") as f:
+                addresses = json.loads(f.read())
+
+            for address in addresses:
+                self._insert(address)
+
+            self._written_version = self._version
+
+        except FileNotFoundError:
+            logger.error("lss node cache file %s does not exist", self.path)
+
+        except Exception:
+            logger.error("exception raised while reading %s", self.path, exc_info=True)
+
+    def _write(self, content, version):
+        with self._write_lock:
+            if version <= self._written_version:
+                return
+
+            try:
+                write_atomic(self.path, content)
+                self._written_version = version
+
+            except Exception:
+                logger.error("exception raised while writing %s", self.path, exc_info=True)
+
+    async def _write_later(self):
+        while self._dirty:
+            await asyncio.sleep(self.write_delay)
+
+            self._dirty = False
+
+            # Serialize on the event loop, write in a thread
+            content = json.dumps(list(self))
+            await self.loop.run_in_executor(None, self._write, content, self._version)
+
+    def flush(self):
+        """Write pending additions right away, e.g. on shutdown"""
+
+        if self._write_task is not None:
+            self._write_task.cancel()
+            self._write_task = None
+
+        self._dirty = False
+
+        if self.path and self._version > self._written_version:
+            self._write(json.dumps(list(self)), self._version)
@@ -0,0 +1,172 @@
+import logging
+import os
+import socket
+import struct
+
+logger = logging.getLogger("lxa-iobus.netlink")
+
+# linux/netlink.h and linux/rtnetlink.h
+NETLINK_ROUTE = 0
+RTMGRP_LINK = 1
+
+NLMSG_HDR = struct.Struct("=LHHLL")
+IFINFOMSG = struct.Struct("=BxHiII")
+RTATTR = struct.Struct("=HH")
+
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+
+IFLA_IFNAME = 3
+IFLA_OPERSTATE = 16
+
+IFF_UP = 0x1
+
+# linux/if.h
+IF_OPER_UNKNOWN = 0
+IF_OPER_UP = 6
+
+# Receive buffer large enough for a burst of link messages
+RECV_SIZE = 65536
+
+
+def _align(length):
+    return (length + 3) & ~3
+
+
+def read_operstate(interface):
+    """Whether `interface` is up according to sysfs
+
+    Virtual interfaces like vcan report their operstate as "unknown" but
+    are usable nonetheless.
+    """
+
+    path = os.path.join("/sys/class/net/", interface, "operstate")
+
+    try:
+        with open(path, "r") as fd:
+            state = fd.read()
+
+    except OSError:
+        return False
+
+    return state.strip() in ["up", "unknown"]
+
+
+def parse_link_messages(data):
+    """Parse the RTM_NEWLINK and RTM_DELLINK messages in a netlink datagram
+
+    Yields (interface name, is up) tuples.
+    """
+
+    offset = 0
+
+    while offset + NLMSG_HDR.size <= len(data):
+        length, message_type, _, _, _ = NLMSG_HDR.unpack_from(data, offset)
+
+        if length < NLMSG_HDR.size:
+            return
+
+        if message_type in (RTM_NEWLINK, RTM_DELLINK):
+            _, _, _, flags, _ = IFINFOMSG.unpack_from(data, offset + NLMSG_HDR.size)
+
+            name = None
+            operstate = None
+            attr_offset = offset + NLMSG_HDR.size + IFINFOMSG.size
+
+            while attr_offset + RTATTR.size <= offset + length:
+                attr_length, attr_type = RTATTR.unpack_from(data, attr_offset)
+
+                if attr_length < RTATTR.size:
+                    break
+
+                payload = data[attr_offset + RTATTR.size : attr_offset + attr_length]
+
+                if attr_type == IFLA_IFNAME:
+                    name = payload.split(b"\0", 1)[0].decode()
+
+                elif attr_type == IFLA_OPERSTATE:
+                    operstate = payload[0]
+
+                attr_offset += _align(attr_length)
+
+            if name is not None:
+                if message_type == RTM_DELLINK:
+                    is_up = False
+
+                elif operstate is None:
+                    is_up = bool(flags & IFF_UP)
+
+                else:
+                    is_up = operstate in (IF_OPER_UNKNOWN, IF_OPER_UP)
+
+                yield name, is_up
+
+        offset += _align(length)
+
+
+class LinkMonitor:
+    """Tracks whether a network interface is up using rtnetlink
+
+    Link state changes are pushed by the kernel to a netlink socket that
+    is read by the asyncio event loop, so `is_up` is always current
+    and costs nothing to read.
+    `callback(is_up)` is called on the event loop whenever the state changes.
+    """
+
+    def __init__(self, loop, interface, callback=None):
+        self.loop = loop
+        self.interface = interface
+        self.callback = callback
+
+        self.is_up = False
+        self.socket = None
+
+    def open(self):
+        self.socket = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+        self.socket.setblocking(False)
+        self.socket.bind((0, RTMGRP_LINK))
+
+        self.loop.add_reader(self.socket.fileno(), self._read)
+
+        # Changes from here on are seen by the socket
+        self.is_up = read_operstate(self.interface)
+
+    def close(self):
+        if self.socket is None:
+            return
+
+        self.loop.remove_reader(self.socket.fileno())
+        self.socket.close()
+        self.socket = None
+
+    def _read(self):
+        while self.socket is not None:
+            try:
+                data = self.socket.recv(RECV_SIZE)
+
+            except BlockingIOError:
+                return
+
+            except OSError as e:
+                # ENOBUFS means that messages were lost.
+                # Fall back to sysfs to get back in sync.
+                logger.warning("netlink: socket error: %s", e)
+
+                self._set_state(read_operstate(self.interface))
+
+                return
+
+            for name, is_up in parse_link_messages(data):
+                if name == self.interface:
+                    self._set_state(is_up)
+
+    def _set_state(self, is_up):
+        if is_up == self.is_up:
+            return
+
+        self.is_up = is_up
+
+        logger.debug("netlink: %s is %s", self.interface, "up" if is_up else "down")
+
+        if self.callback is not None:
+            self.callback(is_up)
@@ -1,35 +1,385 @@
 import asyncio
+import contextlib
 import enum
 import errno
-import itertools
-import json
 import logging
 import os
 import signal
-from copy import deepcopy
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from can import Bus, CanError
-from janus import Queue, SyncQueueEmpty
 
+from lxa_iobus.bus_statistics import BusStatistics
 from lxa_iobus.canopen import (
+    HEARTBEAT_PROTOCOL_IDENTIFIER,
+    HEARTBEAT_PROTOCOL_IDENTIFIER_PREFIX,
+    LSS_COMMAND_SPECIFIER_FAST_SCAN,
+    LSS_COMMAND_SPECIFIER_IDENTIFY_SLAVE,
     LSS_PROTOCOL_IDENTIFIER_SLAVE_TO_MASTER,
     SDO_PROTOCOL_IDENTIFIER_SLAVE_TO_MASTER,
     LssMode,
+    SdoAbort,
     gen_invalidate_node_ids_message,
     gen_lss_configure_node_id_message,
     gen_lss_fast_scan_message,
     gen_lss_switch_mode_global_message,
-    parse_sdo_message,
 )
-from lxa_iobus.node.bus_node import LxaBusNode
+from lxa_iobus.lss_registry import LssAddressRegistry
+from lxa_iobus.netlink import LinkMonitor, read_operstate
+from lxa_iobus.node.bus_node import DEFAULT_TIMEOUT, FRAME_BITS_MAX, SDO_SEND_TIMEOUT, LxaBusNode
+from lxa_iobus.node.products import PRODUCTS
+from lxa_iobus.object_directory_cache import ObjectDirectoryCache
+from lxa_iobus.socketcan import AsyncSocketCan
+from lxa_iobus.tx_queue import TxPriority, TxQueue, transmit_priority
 
 logger = logging.getLogger("lxa-iobus.network")
 
+TRANSPORTS = ("threaded", "asyncio")
+
+# 11 bit CAN identifiers
+COB_IDS = range(0x800)
+
+SUBSCRIPTION_QUEUE_SIZE = 1024
+
+# LSS responses that do not echo the command specifier of the request
+LSS_RESPONSE_COMMAND_SPECIFIERS = {
+    LSS_COMMAND_SPECIFIER_FAST_SCAN: LSS_COMMAND_SPECIFIER_IDENTIFY_SLAVE,
+}
+
+# Time to wait for the identify slave messages of all nodes that matched
+# a fast scan request
+LSS_FAST_SCAN_SETTLE_TIME = 0.01
+
+# Bounds of the LSS response timeout. The actual timeout is learned from
+# the observed response latency, starting at the maximum.
+LSS_TIMEOUT_MIN = 0.02
+LSS_TIMEOUT_MAX = 0.2
+
+# Time between looking for new unconfigured nodes once all are set up
+LSS_SCAN_INTERVAL = 1
+
+# Nodes whose object directories are read at the same time after discovery
+# and the number of tries per node
+SETUP_CONCURRENCY = 4
+SETUP_ATTEMPTS = 3
+
+# Probing the node ids for nodes that are still configured on startup
+WARM_START_CONCURRENCY = 8
+WARM_START_TIMEOUT = 0.1
+
+# Frames that can not be sent because the TX buffer of the interface is full
+# are retried with an exponential backoff. Once an SDO request timed out
+# its frames are of no use anymore, so they are dropped after DEFAULT_TIMEOUT.
+TX_RETRY_DELAY_MIN = 0.001
+TX_RETRY_DELAY_MAX = 0.05
+TX_RETRY_TIMEOUT = DEFAULT_TIMEOUT
+
+# Senders wait this long for room in the TX queue of their priority class
+# (e.g. while the link is down) before they give up with a TimeoutError
+TX_QUEUE_TIMEOUT = SDO_SEND_TIMEOUT
+
+# CAN_RAW_FILTER_MAX from linux/can/raw.h
+CAN_FILTERS_MAX = 512
+
+# Liveness checking. Nodes that keep answering are checked less often,
+# up to PING_INTERVAL_MAX. Nodes that missed a ping are suspect and checked
+# again after PING_INTERVAL_SUSPECT. After PING_RETRIES misses in a row they
+# are lost and removed from the node list, but keep their node id and
+# object directory. Lost nodes are checked every PING_INTERVAL_LOST and
+# have to answer PING_RECOVERIES pings in a row to be taken back.
+# Nodes that are lost for LOST_RETIRE_TIME are retired and give up their
+# node id.
+PING_INTERVAL_MIN = 2
+PING_INTERVAL_MAX = 8
+PING_INTERVAL_SUSPECT = 0.2
+PING_INTERVAL_LOST = 1
+PING_RETRIES = 3
+PING_RECOVERIES = 2
+PING_CONCURRENCY = 8
+LOST_RETIRE_TIME = 600
+
+# Share of the bus bandwidth pings may use. A ping is a request and a response.
+PING_BUS_LOAD = 0.1
+PING_FRAMES = 2
+
+# Resolution of the liveness check scheduler
+PING_TICK = 0.05
+
+# Heartbeat producer time configured on the nodes in heartbeat mode (in ms)
+# and the number of periods without a heartbeat before a node is pinged.
+HEARTBEAT_PRODUCER_TIME = 1000
+HEARTBEAT_TIMEOUT_FACTOR = 2.5
+
+
+def can_filters(cob_ids):
+    """
+    Covers a set of COB-IDs with (can_id, can_mask) filters that match
+    exactly these COB-IDs. Runs of consecutive IDs are split into aligned
+    power-of-two blocks, so e.g. range(0x581, 0x600) needs seven filters.
+    """
+
+    filters = []
+    cob_ids = sorted(set(cob_ids))
+    i = 0
+
+    while i < len(cob_ids):
+        start = cob_ids[i]
+
+        while i + 1 < len(cob_ids) and cob_ids[i + 1] == cob_ids[i] + 1:
+            i += 1
+
+        end = cob_ids[i] + 1
+        i += 1
+
+        while start < end:
+            # the largest block start is aligned to and that fits the run
+            size = (start & -start) or len(COB_IDS)
+
+            while size > end - start:
+                size >>= 1
+
+            filters.append((start, (len(COB_IDS) - 1) & ~(size - 1)))
+            start += size
+
+    return filters
+
+
+def _is_enobufs(error):
+    # python-can did not always set the errno of CanErrors (fixed in
+    # https://github.com/hardbyte/python-can/commit/0e0c64fd7104774dbcfe3641bd9a362ff54b2641),
+    # so we have to fall back to __context__.
+    if isinstance(error, CanError) and error.__context__ is not None:
+        error = error.__context__
+
+    return getattr(error, "errno", None) == errno.ENOBUFS
+
 
 class LxaShutdown(Exception):
     pass
 
 
+class NodeState(enum.Enum):
+    """Liveness of a node, see NodeLiveness"""
+
+    HEALTHY = "healthy"
+    SUSPECT = "suspect"
+    LOST = "lost"
+    RETIRED = "retired"
+
+
+class NodeLiveness:
+    """Liveness checking state and timing of a single node
+
+    All times are in seconds of the event loop clock.
+    """
+
+    def __init__(self, now):
+        self.state = NodeState.HEALTHY
+        self.interval = PING_INTERVAL_MIN
+        self.next_check = now + self.interval
+        self.failures = 0
+        self.successes = 0
+        self.checks = 0
+
+        self.lost_since = None
+
+        self.last_check = None
+
+        # Round trip time of the last ping
+        self.latency = None
+
+        # Time between the last two checks, which is the worst case time
+        # for a failure to be noticed
+        self.check_interval = None
+        self.check_interval_max = 0
+
+        # Set once the node was configured to send heartbeats
+        self.heartbeat_timeout = None
+        self.heartbeat_supported = True
+        self.last_heartbeat = None
+        self.heartbeats = 0
+
+    def heartbeat(self, now):
+        self.last_heartbeat = now
+        self.heartbeats += 1
+
+        if self.state == NodeState.LOST:
+            # Lost nodes have to answer pings to be taken back
+            self.next_check = now
+
+        elif self.failures:
+            self.state = NodeState.HEALTHY
+            self.failures = 0
+            self.interval = PING_INTERVAL_MIN
+            self.next_check = now + self.interval
+
+    def due(self, now, locator_watched):
+        """Whether the node should be pinged now"""
+
+        if self.heartbeat_timeout is None or self.last_heartbeat is None:
+            return self.next_check <= now
+
+        deadline = self.last_heartbeat + self.heartbeat_timeout
+
+        if now < deadline:
+            # The heartbeats show that the node is alive.
+            # Only poll the locator state if someone is looking at it.
+            return locator_watched and (self.last_check is None or now - self.last_check >= PING_INTERVAL_MIN)
+
+        # The heartbeats stopped. Check right away, then as usual.
+        return self.next_check <= now or self.last_check is None or self.last_check < deadline
+
+    def update(self, alive, now):
+        if self.last_check is not None:
+            self.check_interval = now - self.last_check
+            self.check_interval_max = max(self.check_interval_max, self.check_interval)
+
+        self.last_check = now
+        self.checks += 1
+
+        if alive:
+            self.successes += 1
+            self.failures = 0
+
+            if self.state == NodeState.LOST and self.successes < PING_RECOVERIES:
+                self.interval = PING_INTERVAL_SUSPECT
+
+            elif self.state != NodeState.HEALTHY:
+                self.state = NodeState.HEALTHY
+                self.lost_since = None
+                self.interval = PING_INTERVAL_MIN
+
+            else:
+                self.interval = min(self.interval * 2, PING_INTERVAL_MAX)
+
+        else:
+            self.successes = 0
+            self.failures += 1
+
+            if self.state == NodeState.LOST:
+                self.interval = PING_INTERVAL_LOST
+
+            elif self.failures < PING_RETRIES:
+                self.state = NodeState.SUSPECT
+                self.interval = PING_INTERVAL_SUSPECT
+
+            else:
+                self.state = NodeState.LOST
+                self.lost_since = now
+                self.interval = PING_INTERVAL_LOST
+
+        self.next_check = now + self.interval
+
+    def lose(self, now, since=None):
+        """Mark the node as lost, e.g. because it could not be set up"""
+
+        self.state = NodeState.LOST
+        self.successes = 0
+        self.lost_since = now if since is None else since
+        self.interval = PING_INTERVAL_LOST
+        self.next_check = now + self.interval
+
+    def retire_due(self, now):
+        return self.state == NodeState.LOST and now - self.lost_since >= LOST_RETIRE_TIME
+
+    def to_dict(self):
+        return {
+            "state": self.state.value,
+            "interval": self.interval,
+            "failures": self.failures,
+            "checks": self.checks,
+            "latency": self.latency,
+            "check_interval": self.check_interval,
+            "check_interval_max": self.check_interval_max,
+            "heartbeats": self.heartbeats,
+        }
+
+
+class _TokenBucket:
+    """Limits the rate of an operation to `rate` per second"""
+
+    def __init__(self, loop, rate, burst):
+        self.loop = loop
+        self.rate = rate
+        self.burst = burst
+
+        self._tokens = burst
+        self._time = loop.time()
+
+    async def acquire(self):
+        while True:
+            now = self.loop.time()
+            self._tokens = min(self.burst, self._tokens + (now - self._time) * self.rate)
+            self._time = now
+
+            if self._tokens >= 1:
+                self._tokens -= 1
+
+                return
+
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class Subscription:
+    """Received CAN frames for a set of COB-IDs
+
+    Returned by LxaNetwork.subscribe().
+    Without a callback the frames are queued and can be consumed using
+    `async for message in subscription`. Frames that do not fit into the
+    queue are dropped and counted in `dropped`.
+    """
+
+    def __init__(self, network, cob_ids, callback=None, maxsize=SUBSCRIPTION_QUEUE_SIZE):
+        self.network = network
+        self.cob_ids = cob_ids
+        self.callback = callback
+        self.dropped = 0
+
+        self._queue = None
+
+        if callback is None:
+            self._queue = asyncio.Queue(maxsize=maxsize)
+            self.callback = self._put
+
+    def __repr__(self):
+        return f"<Subscription(cob_ids={len(self.cob_ids)}, dropped={self.dropped})>"
+
+    def _put(self, message):
+        try:
+            self._queue.put_nowait(message)
+
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def unsubscribe(self):
+        """Stop receiving frames. Ends a running `async for` loop."""
+
+        self.network._unsubscribe(self)
+
+        if self._queue is not None:
+            if self._queue.full():
+                self._queue.get_nowait()
+                self.dropped += 1
+
+            self._queue.put_nowait(None)
+
+    def __aiter__(self):
+        if self._queue is None:
+            raise TypeError("subscriptions with a callback can not be iterated")
+
+        return self
+
+    async def __anext__(self):
+        message = await self._queue.get()
+
+        if message is None:
+            raise StopAsyncIteration
+
+        return message
+
+
 class LxaNetwork:
     node_drivers = []
 
@@ -39,17 +389,62 @@ class LxaNetwork:
         IDLE = "Idle"
         SCANNING = "Scanning"
 
-    def __init__(self, loop, interface, bustype="socketcan", bitrate=100000, lss_address_cache_file=None):
+    def __init__(
+        self,
+        loop,
+        interface,
+        bustype="socketcan",
+        bitrate=100000,
+        lss_address_cache_file=None,
+        transport="threaded",
+        warm_start=True,
+        object_directory_cache_file=None,
+        heartbeat=False,
+    ):
+        """
+        heartbeat: configure nodes that support it to send heartbeats and
+                   track their liveness using those instead of SDO pings.
+                   The locator state of these nodes is only polled while
+                   someone is watching it.
+
+        object_directory_cache_file: json file to keep the static parts of
+                                     the object directories of known nodes
+                                     in. Nodes that are set up again only
+                                     have their software version read.
+
+        warm_start: adopt nodes that still have a node id from a previous
+                    run instead of invalidating all node ids on startup.
+
+        transport: "threaded" uses python-can with a receive thread and
+                   sends from a worker thread. Works with every python-can
+                   bustype.
+                   "asyncio" drives a raw SocketCAN socket directly from
+                   the event loop, avoiding the thread hops.
+        """
+
+        if transport not in TRANSPORTS:
+            raise ValueError("unknown transport '{}'".format(transport))
+
+        if transport == "asyncio" and bustype != "socketcan":
+            raise ValueError("the asyncio transport only supports socketcan")
+
         self.loop = loop
         self.interface = interface
         self.bustype = bustype
         self.bitrate = bitrate
+        self.transport = transport
+        self.warm_start = warm_start
+        self.heartbeat = heartbeat
 
         self.lss_address_cache_file = lss_address_cache_file
-        self.lss_address_cache = []
+        self.lss_address_cache = LssAddressRegistry(loop, lss_address_cache_file)
+        self.object_directory_cache_file = object_directory_cache_file
+        self.object_directory_cache = ObjectDirectoryCache(loop, object_directory_cache_file)
         self.lss_state = LxaNetwork.LssStates.SCANNING
 
         self.tx_error = False
+        self.tx_retries = 0
+        self._tx_queue = TxQueue()
 
         self.isp_node = LxaBusNode(
             lxa_network=self,
@@ -57,25 +452,92 @@ class LxaNetwork:
             node_id=125,
         )
 
+        # The LPC11xx ROM bootloader only implements expedited and segmented
+        # SDO transfers.
+        self.isp_node.block_transfer_supported = False
+
         self.nodes = dict()
 
         self._interface_state = False
+        self._link_monitor = None
+        self._link_changed = asyncio.Event()
         self._pending_lss_request = None
-        self._node_in_setup = None
+        self._pending_lss_command = None
+        self._nodes_in_setup = dict()
+        self._lost_nodes = dict()
+        self._liveness = dict()
         self._running = False
+        self._socket = None
+
+        # Responses that did not match the pending request
+        self.stale_lss_responses = 0
+
+        self.lss_timeout = LSS_TIMEOUT_MAX
+        self._lss_latency = None
+        self._lss_latency_variation = None
+        self._lss_response_time = None
+
+        # Subscriptions indexed by COB-ID
+        self._subscriptions = [()] * len(COB_IDS)
+
+        self.bus = None
+        self._filters = None
+        self.rx_frames = 0
+        self.rx_frames_unhandled = 0
+        self.bus_statistics = BusStatistics(bitrate)
+        self._rx_packets_at_open = None
+
+        self.subscribe(LSS_PROTOCOL_IDENTIFIER_SLAVE_TO_MASTER, self._lss_set_response)
+        self.subscribe(SDO_PROTOCOL_IDENTIFIER_SLAVE_TO_MASTER, self._sdo_set_response)
+
+        if heartbeat:
+            self.subscribe(HEARTBEAT_PROTOCOL_IDENTIFIER, self._heartbeat_received)
 
     # interface checker code ##################################################
     def interface_is_up(self):
-        path = os.path.join("/sys/class/net/", self.interface, "operstate")
+        # Only SocketCAN interfaces show up in sysfs
+        if self.bustype != "socketcan":
+            return True
 
-        if os.path.exists(path):
-            with open(path, "r") as fd:
-                state = fd.read()
+        # Kept up to date by rtnetlink messages while running
+        if self._link_monitor is not None:
+            return self._link_monitor.is_up
+
+        return read_operstate(self.interface)
+
+    def _open_link_monitor(self):
+        if self.bustype != "socketcan":
+            return
+
+        self._link_monitor = LinkMonitor(self.loop, self.interface, self._link_state_changed)
+
+        try:
+            self._link_monitor.open()
 
-            if state.strip() in ["up", "unknown"]:
-                return True
+        except OSError:
+            logger.warning("netlink not available. Polling the interface state using sysfs", exc_info=True)
 
-        return False
+            self._link_monitor = None
+
+    def _close_link_monitor(self):
+        if self._link_monitor is not None:
+            self._link_monitor.close()
+            self._link_monitor = None
+
+    def _link_state_changed(self, is_up):
+        # Stop using the interface right away instead of on the next check
+        if not is_up:
+            self._interface_state = False
+
+        self._link_changed.set()
+
+    async def _wait_link_change(self, timeout):
+        # Returns after `timeout` at the latest, so the sysfs fallback
+        # keeps working and shutdowns are noticed.
+        self._link_changed.clear()
+
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(self._link_changed.wait(), timeout)
 
     async def await_interface_is_up(self):
         while self._running:
@@ -88,7 +550,7 @@ class LxaNetwork:
 
             logger.debug("interface is down")
 
-            await asyncio.sleep(1)
+            await self._wait_link_change(1)
 
     async def await_running(self):
         while not self._running:
@@ -101,188 +563,387 @@ class LxaNetwork:
             if not self._interface_state:
                 return
 
-            await asyncio.sleep(1)
+            await self._wait_link_change(1)
+
+    # object directory cache ##################################################
+    def update_object_directory_cache(self, node):
+        # Values that are cacheable but only read on demand (like the
+        # calibration of the ADCs) end up in the snapshot later on,
+        # so this is also called periodically.
+        snapshot = node.od.snapshot()
+
+        if snapshot is not None:
+            self.object_directory_cache.update(node.address, snapshot)
+
+    # CAN send and receive threads ############################################
+    def recv(self):
+        while True:
+            try:
+                message = self.bus.recv(timeout=0.2)
+
+                # timeout
+                if message is None:
+                    if not self._running or not self._interface_state:
+                        break
+
+                    else:
+                        continue
+
+                # Messages are dispatched on the event loop,
+                # so all futures are resolved from there.
+                self.loop.call_soon_threadsafe(self._handle_message, message)
+
+            except Exception as e:
+                logger.exception("rx: crashed with unhandled error %s", e)
+                logger.error("rx: shutdown! Stopping application.")
+                # ask async to stop our application
+                os.kill(os.getpid(), signal.SIGTERM)
+
+    def _handle_message(self, message):
+        logger.debug("rx: %s", str(message))
 
-    # lss node address cache ##################################################
-    def load_lss_address_cache(self):
-        if not self.lss_address_cache_file:
-            logger.info("no lss address cache file set. skip loading")
+        self.rx_frames += 1
+        self.bus_statistics.count_rx(message)
+
+        # Only 11 bit identifiers are used by CANopen
+        if message.is_extended_id:
+            self.rx_frames_unhandled += 1
 
             return
 
-        # create file if not present
-        if not os.path.exists(self.lss_address_cache_file):
+        subscriptions = self._subscriptions[message.arbitration_id]
+
+        if not subscriptions:
+            self.rx_frames_unhandled += 1
+
+        for subscription in subscriptions:
             try:
-                with open(self.lss_address_cache_file, "w+") as f:
-                    f.write("[]")
+                subscription.callback(message)
 
             except Exception:
-                logger.error(
-                    "exception raised while creating %s",
-                    self.lss_address_cache_file,
-                    exc_info=True,
-                )
+                logger.exception("rx: unhandled error in subscriber for 0x%03x", message.arbitration_id)
 
-        # reading file
-        file_content = ""
+    def _heartbeat_received(self, message):
+        liveness = self._liveness.get(message.arbitration_id - HEARTBEAT_PROTOCOL_IDENTIFIER_PREFIX)
 
-        try:
-            with open(self.lss_address_cache_file, "r") as f:
-                file_content = f.read()
+        if liveness is not None:
+            liveness.heartbeat(self.loop.time())
 
-        except FileNotFoundError:
-            logger.error(
-                "lss node cache file %s does not exist",
-                self.lss_address_cache_file,
-            )
+    def _sdo_set_response(self, message):
+        node_id = message.arbitration_id & 0x7F
 
-        try:
-            self.lss_address_cache = json.loads(file_content)
+        if node_id == 125:
+            self.isp_node.set_sdo_response(message)
+
+        elif node_id in self.nodes:
+            self.nodes[node_id].set_sdo_response(message)
+
+        elif node_id in self._nodes_in_setup:
+            self._nodes_in_setup[node_id].set_sdo_response(message)
+
+        elif node_id in self._lost_nodes:
+            self._lost_nodes[node_id].set_sdo_response(message)
+
+        else:
+            logger.warn(f"rx: got sdo response for unknown node id {node_id}")
+
+    # subscriptions ###########################################################
+    def subscribe(self, cob_ids, callback=None):
+        """Subscribe to received CAN frames
+
+        cob_ids: A single COB-ID or an iterable of COB-IDs, e.g. a range.
+        callback: Called with every received can.Message with one of the
+                  COB-IDs on the event loop. If no callback is given the
+                  messages are queued in the returned Subscription, which
+                  can be consumed using `async for message in subscription`.
+
+        returns:
+          Subscription: call `unsubscribe()` on it once you are done
+        """
+
+        if isinstance(cob_ids, int):
+            cob_ids = (cob_ids,)
+
+        cob_ids = tuple(cob_ids)
+
+        for cob_id in cob_ids:
+            if cob_id not in COB_IDS:
+                raise ValueError("invalid COB-ID 0x{:x}".format(cob_id))
+
+        subscription = Subscription(self, cob_ids, callback)
+
+        # The tuples are replaced instead of modified, so (un)subscribing
+        # from within a callback does not disturb the running dispatch.
+        for cob_id in cob_ids:
+            self._subscriptions[cob_id] = self._subscriptions[cob_id] + (subscription,)
+
+        self._update_filters()
+
+        return subscription
+
+    def _unsubscribe(self, subscription):
+        for cob_id in subscription.cob_ids:
+            self._subscriptions[cob_id] = tuple(s for s in self._subscriptions[cob_id] if s is not subscription)
+
+        self._update_filters()
 
-        except Exception:
-            logger.error("exception raised while reading %s", self.lss_address_cache_file, exc_info=True)
+    # receive filters #########################################################
+    def _update_filters(self):
+        """Only let frames somebody subscribed to pass the kernel"""
 
-    def write_lss_address_cache(self):
-        if not self.lss_address_cache_file:
-            logger.debug("no lss address cache file set. skip writing")
+        filters = can_filters(cob_id for cob_id in COB_IDS if self._subscriptions[cob_id])
 
+        if len(filters) > CAN_FILTERS_MAX:
+            logger.warning("too many subscriptions for kernel filters. Receiving all frames")
+
+            filters = []
+
+        if filters == self._filters:
             return
 
-        try:
-            with open(self.lss_address_cache_file, "w") as f:
-                f.write(json.dumps(self.lss_address_cache))
-
-        except Exception:
-            logger.error(
-                "exception raised while writing %s",
-                self.lss_address_cache_file,
-                exc_info=True,
+        self._filters = filters
+
+        logger.debug("setting %d receive filters", len(filters))
+
+        if self._socket is not None:
+            self._socket.set_filters(filters)
+
+        elif self.bus is not None:
+            # python-can falls back to filtering in user space for
+            # interfaces without kernel filters, e.g. the virtual bus
+            self.bus.set_filters(
+                [{"can_id": can_id, "can_mask": can_mask, "extended": False} for can_id, can_mask in filters]
             )
 
-    # CAN send and receive threads ############################################
-    def send(self):
-        while True:
-            try:
-                message = self._outgoing_queue.sync_q.get(timeout=0.2)
+    def _read_interface_rx_packets(self):
+        path = os.path.join("/sys/class/net/", self.interface, "statistics/rx_packets")
 
-                logger.debug("tx: %s", str(message))
+        try:
+            with open(path, "r") as fd:
+                return int(fd.read())
 
-                self.bus.send(message)
+        except (OSError, ValueError):
+            return None
 
-                if self.tx_error:
-                    self.tx_error = False
-                    logger.warn("tx: TX-buffer recovered.")
+    def rx_filter_statistics(self):
+        """Frame counters for the receive filters since the bus was opened
 
-            except SyncQueueEmpty:
-                if not self._running or not self._interface_state:
-                    return
+        rx_frames: frames that reached user space
+        rx_frames_unhandled: frames that reached user space but no subscriber
+        rx_frames_kernel_filtered: estimate of the frames dropped by the
+                                   kernel filters, based on the interface
+                                   statistics. None if they are not available.
+        """
 
-            except CanError as e:
-                # FIXME: python-can does currently (in 3.3.4) not set e.errno
-                # so we have to fall back to __context__.
-                # A fix has already been placed in the development-branch:
-                # https://github.com/hardbyte/python-can/commit/0e0c64fd7104774dbcfe3641bd9a362ff54b2641
-                # But the latest 4.0-dev2 release does not contain this fix
-                # yet.
-                if e.__context__.errno == errno.ENOBUFS:
-                    # Send buffer is full. This can happen if there is no other
-                    # device on the bus.
-                    # Thus this is something normal to happen.
-                    # We will just wait for the bus to recover.
-                    if not self.tx_error:
-                        logger.warn("tx: TX-buffer full. Maybe there is a problem with the bus?")
-                        self.tx_error = True
-                    else:
-                        logger.debug("tx: TX-buffer full. Maybe there is a problem with the bus?")
-                else:
-                    logger.error("tx: Unhandled CAN error: %s", e)
-                    break
+        kernel_filtered = None
+        rx_packets = self._read_interface_rx_packets()
 
-            except Exception as e:
-                logger.error("tx: Unhandled CAN error: %s", e)
-                break
+        if rx_packets is not None and self._rx_packets_at_open is not None:
+            kernel_filtered = max(0, rx_packets - self._rx_packets_at_open - self.rx_frames)
 
-        logger.error("tx: shutdown! Stopping application.")
-        # ask async to stop our application
-        os.kill(os.getpid(), signal.SIGTERM)
+        return {
+            "rx_frames": self.rx_frames,
+            "rx_frames_unhandled": self.rx_frames_unhandled,
+            "rx_frames_kernel_filtered": kernel_filtered,
+        }
+
+    def bus_statistics_to_dict(self):
+        """Traffic counters, bus utilisation and per node traffic,
+        labeled with the node names"""
+
+        statistics = self.bus_statistics.to_dict(
+            node_names={node_id: node.name for node_id, node in self.nodes.items()},
+        )
+
+        statistics.update(self.rx_filter_statistics())
+        statistics["tx_queue"] = self._tx_queue.to_dict()
+        statistics["tx_retries"] = self.tx_retries
+        statistics["sdo_transactions"] = {node.name: node.scheduler.to_dict() for node in self.nodes.values()}
+        statistics["sdo_reads"] = {
+            node.name: {
+                "reads": node.sdo_reads,
+                "coalesced": node.sdo_reads_coalesced,
+                "retries": node.sdo_read_retries,
+                "rtt": node.rtt,
+                "rto": node.rto,
+            }
+            for node in self.nodes.values()
+        }
+
+        return statistics
+
+    def _reset_filters(self):
+        # Called after opening the bus
+        self._filters = None
+        self.rx_frames = 0
+        self.rx_frames_unhandled = 0
+        self._rx_packets_at_open = self._read_interface_rx_packets()
+
+        self._update_filters()
+
+    # asyncio SocketCAN transport #############################################
+    async def _send_frame(self, message):
+        if self.transport == "asyncio":
+            if self._socket is None:
+                raise OSError(errno.ENETDOWN, "socket closed")
+
+            await self._socket.send(message)
+
+        else:
+            # python-can buses block while sending,
+            # so this has to happen outside of the event loop
+            await self.loop.run_in_executor(self._executor, self.bus.send, message)
+
+    async def _transmit(self, priority, message, sent):
+        logger.debug("tx: %s", str(message))
+
+        delay = TX_RETRY_DELAY_MIN
+        deadline = self.loop.time() + TX_RETRY_TIMEOUT
 
-    def recv(self):
         while True:
             try:
-                message = self.bus.recv(timeout=0.2)
+                await self._send_frame(message)
 
-                # timeout
-                if message is None:
-                    if not self._running or not self._interface_state:
-                        break
+                break
 
-                    else:
-                        continue
+            except (CanError, OSError) as e:
+                if not _is_enobufs(e):
+                    logger.error("tx: Unhandled CAN error: %s", e)
+                    self._tx_queue.dropped(priority)
+                    sent.cancel()
 
-                logger.debug("rx: %s", str(message))
+                    return
 
-                # lss messages
-                if message.arbitration_id == LSS_PROTOCOL_IDENTIFIER_SLAVE_TO_MASTER:
-                    self._lss_set_response(message)
+            # Send buffer is full. This can happen if there is no other
+            # device on the bus.
+            # Thus this is something normal to happen.
+            # We will just wait for the bus to recover.
+            if not self.tx_error:
+                logger.warn("tx: TX-buffer full. Maybe there is a problem with the bus?")
+                self.tx_error = True
 
-                # sdo message
-                elif message.arbitration_id in SDO_PROTOCOL_IDENTIFIER_SLAVE_TO_MASTER:
-                    sdo_message = parse_sdo_message(message)
-                    node_id = sdo_message.node_id
+            if not self._running or self.loop.time() + delay > deadline:
+                logger.debug("tx: TX-buffer still full. Dropping %s", message)
+                self._tx_queue.dropped(priority)
+                sent.cancel()
 
-                    if node_id == 125:
-                        self.isp_node.set_sdo_response(sdo_message)
+                return
 
-                    elif node_id in self.nodes:
-                        self.nodes[node_id].set_sdo_response(sdo_message)
+            self.tx_retries += 1
 
-                    elif self._node_in_setup is not None:
-                        self._node_in_setup.set_sdo_response(sdo_message)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, TX_RETRY_DELAY_MAX)
 
-                    else:
-                        logger.warn(f"rx: got sdo response for unknown node id {node_id}")
+        # Used by the nodes to start their timeouts and measure round trip times
+        message.timestamp = time.time()
 
-            except Exception as e:
-                logger.exception("rx: crashed with unhandled error %s", e)
-                logger.error("rx: shutdown! Stopping application.")
-                # ask async to stop our application
-                os.kill(os.getpid(), signal.SIGTERM)
+        if not sent.done():
+            sent.set_result(message.timestamp)
+
+        self.bus_statistics.count_tx(message)
+        self._tx_queue.sent(priority)
+
+        if self.tx_error:
+            self.tx_error = False
+            logger.warn("tx: TX-buffer recovered.")
+
+    async def _tx_pump(self):
+        # Frames are handed to the interface one at a time, so the most
+        # urgent frame is always the next one to go out.
+        try:
+            while self._running and self._interface_state:
+                frame = await self._tx_queue.get(timeout=0.2)
+
+                if frame is not None:
+                    await self._transmit(*frame)
+
+        finally:
+            self._tx_queue.clear()
+
+    async def _run_socket(self):
+        # Reception happens in the reader callback of the socket.
+        # All that is left to do here is closing it once we are done.
+        try:
+            while self._running and self._interface_state:
+                await asyncio.sleep(0.2)
+
+        finally:
+            self._socket.close()
+            self._socket = None
 
     # Canopen LSS #############################################################
     def _lss_set_response(self, response):
-        async def __lss_set_response():
-            if not self._pending_lss_request.done() and not self._pending_lss_request.cancelled():
-                self._pending_lss_request.set_result(response)
+        pending = self._pending_lss_request
+
+        if pending is None or pending.done() or response.data[0] != self._pending_lss_command:
+            self.stale_lss_responses += 1
 
-        asyncio.run_coroutine_threadsafe(
-            __lss_set_response(),
-            loop=self.loop,
+            logger.debug("rx: dropping stale lss response 0x%02x", response.data[0])
+
+            return
+
+        self._lss_response_time = self.loop.time()
+        pending.set_result(response)
+
+    def _update_lss_timeout(self, latency):
+        # Smoothed latency and its variation as used for TCP (RFC 6298).
+        # Nodes that do not match a fast scan request do not answer at all,
+        # so the timeout decides how long every negative bit check takes.
+        if self._lss_latency is None:
+            self._lss_latency = latency
+            self._lss_latency_variation = latency / 2
+
+        else:
+            self._lss_latency_variation += (abs(self._lss_latency - latency) - self._lss_latency_variation) / 4
+            self._lss_latency += (latency - self._lss_latency) / 8
+
+        self.lss_timeout = min(
+            max(self._lss_latency + 4 * self._lss_latency_variation, LSS_TIMEOUT_MIN),
+            LSS_TIMEOUT_MAX,
         )
 
-    async def lss_request(self, message, timeout=0.2):
+    async def lss_send(self, message):
+        """Send an LSS message that is not answered, like switch mode global"""
+
         if not self._running or not self._interface_state:
             raise LxaShutdown
 
-        self._pending_lss_request = asyncio.Future()
-        self._outgoing_queue.sync_q.put(message)
+        await self.send_message(message, TxPriority.LSS)
 
-        try:
-            await asyncio.wait_for(self._pending_lss_request, timeout=timeout)
+    async def lss_request(self, message, timeout=None):
+        """Send an LSS request and wait for the response
 
-            return self._pending_lss_request.result()
+        timeout: defaults to the timeout learned from previous responses
 
-        except asyncio.TimeoutError:
-            if not self._pending_lss_request.done() and not self._pending_lss_request.cancelled():
-                self._pending_lss_request.set_result(None)
+        returns:
+          None: No response
+          The response message
+        """
+
+        if not self._running or not self._interface_state:
+            raise LxaShutdown
 
+        if timeout is None:
+            timeout = self.lss_timeout
+
+        command = message.data[0]
+
+        self._pending_lss_request = self.loop.create_future()
+        self._pending_lss_command = LSS_RESPONSE_COMMAND_SPECIFIERS.get(command, command)
+        send_time = self.loop.time()
+        await self.send_message(message, TxPriority.LSS)
+
+        try:
+            response = await asyncio.wait_for(self._pending_lss_request, timeout=timeout)
+
+        except asyncio.TimeoutError:
             return None
 
-    async def fast_scan_request(self, lss_id, bit_checked, lss_sub, lss_next):
-        # TODO: check if we got the correct response
+        self._update_lss_timeout(self._lss_response_time - send_time)
 
-        # FIXME: sleep is required because RX may not be clean
-        # and we may still get replies from the previous request.
+        return response
 
+    async def fast_scan_request(self, lss_id, bit_checked, lss_sub, lss_next):
         response = await self.lss_request(
             gen_lss_fast_scan_message(lss_id, bit_checked, lss_sub, lss_next),
         )
@@ -290,38 +951,23 @@ class LxaNetwork:
         if not response:
             return False
 
-        await asyncio.sleep(0.1)
+        # All matching nodes answer with the same identify slave message.
+        # Give the stragglers a moment, so their answers are not mistaken
+        # for answers to the next request.
+        await asyncio.sleep(LSS_FAST_SCAN_SETTLE_TIME)
 
         return True
 
-    def create_mask_from_list(self, lss_ids):
-        """
-        Takes a list of LSS addresses and generates a mask representing all
-        bits that are different between them. Returns known bits (that are the
-        same between all addresses) and a mask indication the differences
-        """
-
-        mask = [0, 0, 0, 0]
-
-        for a, b in itertools.combinations(lss_ids, 2):
-            for i in range(len(mask)):
-                mask[i] |= a[i] ^ b[i]
-
-        known_bits = [0, 0, 0, 0]
-
-        for i in range(len(mask)):
-            known_bits[i] = lss_ids[0][i] & (0xFFFFFFFF ^ mask[i])
-
-        return known_bits, mask
-
-    async def _fast_scan(self, start=None, mask=None):
+    async def _fast_scan(self, start=None, mask=None, reset=True):
         """
         Implements the fast scan algorithm.
 
         fast_scan_request: fast_scan_request method
         start: Start value for the LSS address (default: [0, 0, 0, 0])
-        mask: Only bits that are 0 are going to be tested.
+        mask: Only bits that are 1 are going to be tested.
               (default: [0xffffffff, 0xffffffff, 0xffffffff, 0xffffffff])
+        reset: Reset the fast scan state of the nodes first. Can be skipped
+               if the last request was a reset.
 
         returns:
           None: No node could be selected
@@ -335,14 +981,27 @@ class LxaNetwork:
             mask = [0xFFFFFFFF, 0xFFFFFFFF, 0xFFFFFFFF, 0xFFFFFFFF]
 
         # Check if node on Bus
-        if not await self.fast_scan_request(0, 0x80, 0, 0):
+        if reset and not await self.fast_scan_request(0, 0x80, 0, 0):
             logger.debug("fast_scan: no unconfigured node")
 
             return None
 
-        lss_id = start
+        lss_id = list(start)
 
         for lss_sub in range(0, 4):
+            # The bits above the highest tested bit are given by start.
+            # Check them first, so we do not test all bits below when there
+            # is no node with these bits in the first place.
+            top_bit = mask[lss_sub].bit_length()
+
+            if 0 < top_bit < 32:
+                response = await self.fast_scan_request(lss_id[lss_sub], top_bit, lss_sub, lss_sub)
+
+                if not response:
+                    logger.debug("fast_scan: No node in range")
+
+                    return None
+
             for bit_checked in range(31, -1, -1):
                 # check if we need to even test this bit
                 if not mask[lss_sub] & 1 << bit_checked:
@@ -376,10 +1035,43 @@ class LxaNetwork:
 
         return lss_id
 
+    def scan_clusters(self, known_nodes=None):
+        """
+        Groups of LSS addresses to search for unconfigured nodes in before
+        resorting to a wider search, most likely first, as (start, mask) tuples.
+
+        A single mask over a mixed set of products degenerates to almost
+        all bits, so there is one group per product instead:
+        the known nodes of each product, most common product first,
+        and then every product from the product table.
+        Searching a group only costs the bits that differ within it.
+
+        known_nodes: an LssAddressRegistry
+        """
+
+        clusters = []
+
+        if known_nodes:
+            products = known_nodes.products()
+
+            for product in sorted(products, key=lambda product: len(products[product]), reverse=True):
+                clusters.append(known_nodes.mask(product))
+
+        for product in PRODUCTS:
+            cluster = (
+                [product.LSS_VENDOR, product.LSS_PRODUCT, product.LSS_REVISION, 0],
+                [0, 0, 0, 0xFFFFFFFF],
+            )
+
+            if cluster not in clusters:
+                clusters.append(cluster)
+
+        return clusters
+
     async def fast_scan_known_range_all(self, known_nodes=None, start=None, mask=None):
         """
-        Implements a fast scan that first tries to search for nodes from a list.
-        Then in a range and then all addresses
+        Implements a fast scan that first tries to search for nodes from a list
+        and of known products. Then in a range and then all addresses
         """
 
         # Check if node on Bus
@@ -391,11 +1083,11 @@ class LxaNetwork:
 
         self.lss_state = LxaNetwork.LssStates.SCANNING
 
-        # Try to find a node from the known node list
-        if known_nodes is not None and len(known_nodes) > 0:
-            known_start, known_mask = self.create_mask_from_list(known_nodes)
-
-            response = await self._fast_scan(known_start, known_mask)
+        # Try to find a node from the known node list or of a known product.
+        # Groups that do not contain an unconfigured node fail on the first
+        # differing request.
+        for i, (cluster_start, cluster_mask) in enumerate(self.scan_clusters(known_nodes)):
+            response = await self._fast_scan(cluster_start, cluster_mask, reset=i > 0)
 
             if response:
                 return response
@@ -415,41 +1107,238 @@ class LxaNetwork:
             if i == 125:  # reserved for ISP
                 continue
 
-            if i in self.nodes:
+            if i in self.nodes or i in self._nodes_in_setup or i in self._lost_nodes:
                 continue
 
             return i
 
-    async def lss_fast_scan(self):
-        try:
-            response = await self.lss_request(
-                gen_lss_switch_mode_global_message(LssMode.CONFIGURATION),
-            )
+    async def _probe_node_id(self, node_id, semaphore):
+        """
+        Reads the identity object of a node that got its node id in a
+        previous run.
 
-            if not response:
-                logger.debug("fast_scan: No response to switch_mode_global")
+        returns:
+          None: No node with this node id
+          False: Something answers on this node id but could not be identified
+          LSS Address
+        """
 
-            response = await self.lss_request(
-                gen_invalidate_node_ids_message(),
-            )
+        node = LxaBusNode(
+            lxa_network=self,
+            lss_address=[0, 0, 0, 0],
+            node_id=node_id,
+        )
 
-            if not response:
-                logger.debug("fast_scan: No response to invalidate_node_IDs")
+        async with semaphore:
+            self._nodes_in_setup[node_id] = node
 
-            response = await self.lss_request(
-                gen_lss_switch_mode_global_message(LssMode.OPERATION),
-            )
+            try:
+                lss_address = []
 
-            if not response:
-                logger.debug("fast_scan: No response to switch_mode_global")
+                for sub_index in range(1, 5):
+                    # Most node ids are not in use, so give up on those quickly
+                    if sub_index == 1:
+                        data = await node.sdo_read(0x1018, sub_index, timeout=WARM_START_TIMEOUT, retries=0)
 
-            # List of old node
-            self.load_lss_address_cache()
-            old_nodes = deepcopy(self.lss_address_cache)
+                    else:
+                        data = await node.sdo_read(0x1018, sub_index)
 
-            while self._running and self._interface_state:
-                await asyncio.sleep(1)
+                    lss_address.append(struct.unpack("<L", data)[0])
+
+            except TimeoutError:
+                if not lss_address:
+                    return None
+
+                logger.warning("warm_start: node %s stopped answering", node_id)
+
+                return False
+
+            except (SdoAbort, struct.error) as e:
+                logger.warning("warm_start: could not identify node %s: %s", node_id, e)
+
+                return False
+
+            finally:
+                self._nodes_in_setup.pop(node_id)
+
+        # Two nodes with the same node id answer every request twice
+        if node.stale_responses:
+            logger.warning("warm_start: node id %s seems to be used by more than one node", node_id)
+
+            return False
+
+        return lss_address
+
+    def _add_node_in_setup(self, lss_address, node_id):
+        # We need to receive SDO responses while the node is being set
+        # up but do not want it to be in the node list yet,
+        # so we store a reference in self._nodes_in_setup that can be used
+        # in self._sdo_set_response().
+        # Otherwise the node would show up as half initialized in the list
+        # of nodes for a moment.
+        # This also reserves the node id.
+        node = LxaBusNode(
+            lxa_network=self,
+            lss_address=lss_address,
+            node_id=node_id,
+        )
+
+        self._nodes_in_setup[node_id] = node
+
+        return node
+
+    def _readopt_node(self, lss_address):
+        # A known node that shows up in the fast scan again was reset.
+        # Healthy nodes are only pinged every PING_INTERVAL_MAX, so it may
+        # still be healthy or suspect, not only lost.
+        # The node gets its old node id back and is set up again,
+        # keeping its object directory if possible.
+        #
+        # Returns the node and whether it is being set up already.
+        lss_address = list(lss_address)
+
+        for node in self._nodes_in_setup.values():
+            if node.lss_address == lss_address:
+                return node, True
+
+        for nodes in (self.nodes, self._lost_nodes):
+            for node_id, node in nodes.items():
+                if node.lss_address == lss_address:
+                    nodes.pop(node_id)
+                    self._liveness.pop(node_id, None)
+                    self._nodes_in_setup[node_id] = node
+
+                    return node, False
+
+        return None, False
+
+    async def _enumerate_node(self, node):
+        if node.od is not None:
+            if await node.od.is_current(node):
+                return
+
+            logger.info("fast_scan: node %s has changed. Scanning the object directory again", node)
+
+        # Fetch the list of available objects from the node,
+        # or take it from the cache if the node did not change.
+        await node.setup_object_directory(
+            snapshot=self.object_directory_cache.get(node.address),
+        )
+
+        # The software version is used to validate the object directory
+        # when the node is set up again
+        with contextlib.suppress(SdoAbort):
+            await node.od.manufacturer_software_version.version()
+
+    async def _add_node(self, node):
+        # Now that the node is fully set up we can add it to the
+        # actual node list and remove the temporary reference.
+        self._nodes_in_setup.pop(node.node_id)
+        self.nodes[node.node_id] = node
+        self._liveness[node.node_id] = NodeLiveness(self.loop.time())
+
+        if self.heartbeat:
+            await self._configure_heartbeat(node, self._liveness[node.node_id])
+
+        self.update_object_directory_cache(node)
+
+        self.lss_address_cache.add(node.lss_address)
+
+    async def _setup_node_in_background(self, node, semaphore):
+        async with semaphore:
+            for attempt in range(1, SETUP_ATTEMPTS + 1):
+                try:
+                    await self._enumerate_node(node)
+
+                except Exception as e:
+                    logger.warning(
+                        "fast_scan: setting up node %s failed (attempt %d of %d): %r", node, attempt, SETUP_ATTEMPTS, e
+                    )
+
+                    continue
+
+                await self._add_node(node)
+
+                logger.info("fast_scan: Created new node with id {} for {}".format(node.node_id, node.lss_address))
+
+                return
+
+        logger.error("fast_scan: giving up on setting up node %s. Keeping node id %d for it", node, node.node_id)
+
+        # The node keeps the node id it got through LSS and will not show up
+        # in the fast scan again, so the id must stay reserved.
+        # As a lost node it is set up again once it answers pings,
+        # or gives up the id once it is retired.
+        liveness = NodeLiveness(self.loop.time())
+        liveness.lose(self.loop.time())
+
+        self._nodes_in_setup.pop(node.node_id)
+        self._lost_nodes[node.node_id] = node
+        self._liveness[node.node_id] = liveness
+
+    async def _adopt_configured_nodes(self):
+        """
+        Looks for nodes that kept their node id from a previous run and sets
+        them up without going through LSS again.
+
+        returns:
+          True: All nodes that answered were adopted
+          False: Some node could not be identified. All node ids have to be
+                 invalidated to get to a known state.
+        """
+
+        semaphore = asyncio.Semaphore(WARM_START_CONCURRENCY)
+        node_ids = [node_id for node_id in range(1, 128) if node_id != 125]
+
+        lss_addresses = await asyncio.gather(*[self._probe_node_id(node_id, semaphore) for node_id in node_ids])
+
+        if False in lss_addresses:
+            return False
+
+        found = {node_ids[i]: lss for i, lss in enumerate(lss_addresses) if lss is not None}
+
+        logger.info("warm_start: found %d configured nodes", len(found))
+
+        # Nodes that can not be set up are retried and finally kept as lost
+        # nodes, so one of them does not stop the discovery of the others.
+        nodes = [self._add_node_in_setup(lss, node_id) for node_id, lss in found.items()]
+
+        await asyncio.gather(*[self._setup_node_in_background(node, semaphore) for node in nodes])
+
+        return True
+
+    async def _invalidate_node_ids(self):
+        await self.lss_send(
+            gen_lss_switch_mode_global_message(LssMode.CONFIGURATION),
+        )
+
+        response = await self.lss_request(
+            gen_invalidate_node_ids_message(),
+        )
+
+        if not response:
+            logger.debug("fast_scan: No response to invalidate_node_IDs")
+
+        await self.lss_send(
+            gen_lss_switch_mode_global_message(LssMode.OPERATION),
+        )
+
+    async def lss_fast_scan(self):
+        # The object directories of new nodes are read in the background,
+        # so the next node can be discovered in the meantime.
+        semaphore = asyncio.Semaphore(SETUP_CONCURRENCY)
+        setups = set()
+
+        try:
+            self.lss_address_cache.load()
+            self.object_directory_cache.load()
 
+            if not self.warm_start or not await self._adopt_configured_nodes():
+                logger.info("fast_scan: invalidating all node ids")
+
+                await self._invalidate_node_ids()
+
+            while self._running and self._interface_state:
                 logger.debug("Nodes: %s", self.nodes)
 
                 lss = await self.fast_scan_known_range_all(
@@ -458,117 +1347,303 @@ class LxaNetwork:
                     mask=[0x00000000, 0x000000FF, 0x000000FF, 0x0000FFFF],
                 )
 
+                # Look for the next node right away,
+                # but only poll every now and then once all nodes are set up.
                 if lss is None:
-                    continue
+                    await asyncio.sleep(LSS_SCAN_INTERVAL)
 
-                if lss not in self.lss_address_cache:
-                    self.lss_address_cache.append(lss)
-                    self.write_lss_address_cache()
+                    continue
 
                 logger.debug("fast_scan: lss: %s", lss)
 
-                # we dont need to search for nodes we already found
-                if lss in old_nodes:
-                    old_nodes.remove(lss)
+                node, setting_up = self._readopt_node(lss)
+
+                if node is None:
+                    node = self._add_node_in_setup(lss, self._gen_canopen_node_id())
 
-                node_id = self._gen_canopen_node_id()
+                else:
+                    logger.info("fast_scan: node %s was reset. Reusing node id %d", node, node.node_id)
 
                 response = await self.lss_request(
-                    gen_lss_configure_node_id_message(node_id),
+                    gen_lss_configure_node_id_message(node.node_id),
                 )
 
                 if not response:
                     logger.error("fast_scan: failed to set node ID")
 
-                response = await self.lss_request(gen_lss_switch_mode_global_message(LssMode.OPERATION))
+                await self.lss_send(gen_lss_switch_mode_global_message(LssMode.OPERATION))
 
-                if not response:
-                    logger.debug("fast_scan: failed to make node operational")
-
-                # We need to receive SDO responses while the node is being set
-                # up but do not want it to be in the node list yet,
-                # so we store a reference in self._node_in_setup that can be used
-                # in self.recv().
-                # Otherwise the node would show up as half initialized in the list
-                # of nodes for a moment.
-                self._node_in_setup = LxaBusNode(
-                    lxa_network=self,
-                    lss_address=lss,
-                    node_id=node_id,
-                )
-
-                # Fetch the list of available objects from the node.
-                await self._node_in_setup.setup_object_directory()
-
-                # Now that the node is fully set up we can add it to the
-                # actual node list and remove the temporary reference.
-                self.nodes[node_id] = self._node_in_setup
-                self._node_in_setup = None
+                # The running setup retries, should the reset have interrupted it
+                if setting_up:
+                    continue
 
-                logger.info("fast_scan: Created new node with id {} for {}".format(node_id, lss))
+                setup = self.loop.create_task(self._setup_node_in_background(node, semaphore))
+                setups.add(setup)
+                setup.add_done_callback(setups.discard)
 
         except LxaShutdown:
             logger.debug("fast_scan: shutdown")
 
+        finally:
+            for setup in setups:
+                setup.cancel()
+
+            await asyncio.gather(*setups, return_exceptions=True)
+
+    async def _configure_heartbeat(self, node, liveness):
+        try:
+            await node.od.producer_heartbeat_time.set_time(HEARTBEAT_PRODUCER_TIME)
+
+        except SdoAbort:
+            logger.info("heartbeat: node %s does not support heartbeats", node)
+            liveness.heartbeat_supported = False
+
+            return
+
+        except TimeoutError:
+            # The node is pinged until its heartbeats are configured,
+            # which is tried again after the next successful ping.
+            logger.warning("heartbeat: configuring heartbeats of node %s timed out", node)
+
+            return
+
+        liveness.heartbeat_timeout = HEARTBEAT_PRODUCER_TIME / 1000 * HEARTBEAT_TIMEOUT_FACTOR
+
+    async def _check_liveness(self, node_id, node, liveness, semaphore, bucket):
+        async with semaphore:
+            await bucket.acquire()
+
+            start = self.loop.time()
+            alive = await node.ping()
+            now = self.loop.time()
+
+        if alive:
+            liveness.latency = now - start
+
+        heartbeat_lost = (
+            liveness.heartbeat_timeout is not None
+            and liveness.last_heartbeat is not None
+            and now > liveness.last_heartbeat + liveness.heartbeat_timeout
+        )
+
+        heartbeat_pending = self.heartbeat and liveness.heartbeat_supported and liveness.heartbeat_timeout is None
+
+        previous_state = liveness.state
+        lost_since = liveness.lost_since
+        liveness.update(alive, now)
+
+        if liveness.state == NodeState.HEALTHY:
+            # The node kept its node id while it was gone,
+            # so it was not reset and its object directory is still valid.
+            if previous_state == NodeState.LOST and self._lost_nodes.get(node_id) is node:
+                # Unless setting up the node failed before
+                if node.od is None and not await self._setup_lost_node(node):
+                    liveness.lose(self.loop.time(), since=lost_since)
+
+                    return
+
+                logger.info("lss_ping: lost node %s is back", node)
+
+                self._lost_nodes.pop(node_id)
+                self.nodes[node_id] = node
+
+            self.update_object_directory_cache(node)
+
+            # The node may have been reset and forgot its heartbeat configuration,
+            # or configuring it timed out before
+            if heartbeat_lost or heartbeat_pending:
+                await self._configure_heartbeat(node, liveness)
+
+        elif liveness.state == NodeState.SUSPECT:
+            logger.info("lss_ping: node %s missed %d pings", node, liveness.failures)
+
+        elif previous_state != NodeState.LOST and self.nodes.get(node_id) is node:
+            logger.warning("lss_ping: node %s does not respond. Keeping node id %d for it", node, node_id)
+
+            self.nodes.pop(node_id)
+            self._lost_nodes[node_id] = node
+
+    async def _setup_lost_node(self, node):
+        try:
+            await self._enumerate_node(node)
+
+        except Exception as e:
+            logger.warning("lss_ping: setting up node %s failed: %r", node, e)
+
+            return False
+
+        self.lss_address_cache.add(node.lss_address)
+
+        return True
+
+    def _retire_node(self, node_id, node, liveness):
+        logger.warning("lss_ping: node %s is gone for good. Releasing node id %d", node, node_id)
+
+        liveness.state = NodeState.RETIRED
+
+        self._lost_nodes.pop(node_id)
+        self._liveness.pop(node_id, None)
+
     async def lss_ping(self):
+        # Nodes are checked concurrently, so a few dead nodes do not delay
+        # the checks of the others, but the pings must not use more than
+        # PING_BUS_LOAD of the bus bandwidth.
+        semaphore = asyncio.Semaphore(PING_CONCURRENCY)
+        bucket = _TokenBucket(
+            self.loop,
+            rate=self.bitrate * PING_BUS_LOAD / (PING_FRAMES * FRAME_BITS_MAX),
+            burst=PING_CONCURRENCY,
+        )
+        checks = dict()
+
         try:
             while self._running and self._interface_state:
-                for node_id, node in self.nodes.copy().items():
-                    if not await node.ping():
-                        logger.warning("lss_ping: node %s does not respond", node)
+                now = self.loop.time()
+
+                for node_id, task in list(checks.items()):
+                    if task.done():
+                        checks.pop(node_id)
 
-                        self.nodes.pop(node_id)
+                        if not task.cancelled() and task.exception() is not None:
+                            logger.error("lss_ping: checking node %s failed", node_id, exc_info=task.exception())
 
-                await asyncio.sleep(2)
+                try:
+                    for node_id, node in [*self.nodes.items(), *self._lost_nodes.items()]:
+                        liveness = self._liveness.get(node_id)
 
-        except Exception:
+                        if liveness is None or node_id in checks:
+                            continue
+
+                        if liveness.retire_due(now):
+                            self._retire_node(node_id, node, liveness)
+
+                            continue
+
+                        if not liveness.due(now, node.locator_watched):
+                            continue
+
+                        checks[node_id] = self.loop.create_task(
+                            self._check_liveness(node_id, node, liveness, semaphore, bucket),
+                        )
+
+                except Exception:
+                    logger.error("lss_ping: scheduling liveness checks failed", exc_info=True)
+
+                await asyncio.sleep(PING_TICK)
+
+        except asyncio.CancelledError:
             logger.debug("lss_ping: shutdown")
 
+            raise
+
+        finally:
+            for task in checks.values():
+                task.cancel()
+
+            await asyncio.gather(*checks.values(), return_exceptions=True)
+
+    def liveness_statistics(self):
+        """Liveness checking state and timing of all nodes, by node name
+
+        Includes lost nodes, which are not part of self.nodes.
+        """
+
+        return {
+            node.name: self._liveness[node_id].to_dict()
+            for node_id, node in [*self.nodes.items(), *self._lost_nodes.items()]
+            if node_id in self._liveness
+        }
+
     # Canopen SDO #############################################################
-    async def send_message(self, message):
-        await self._outgoing_queue.async_q.put(message)
+    async def send_message(self, message, priority=None):
+        """Queue a frame for sending
+
+        priority: a TxPriority. Defaults to the priority set using
+                  transmit_priority(), or TxPriority.USER_WRITE.
+                  Waits while the queue of the priority class is full and
+                  raises TimeoutError if it stays full for TX_QUEUE_TIMEOUT.
+
+        Returns a future that resolves to the time the frame was sent at,
+        or is cancelled if the frame was dropped. Cancel it to drop the frame
+        if it was not sent yet.
+        """
+
+        return await self._tx_queue.put(message, priority, timeout=TX_QUEUE_TIMEOUT)
 
     # public api ##############################################################
     def shutdown(self):
         self._running = False
 
     async def run(self, with_lss=True):
-        # The janus Queue can only be set up while we are inside the running
-        # asyncio event loop, so we have to do it here instead of in __init__.
-        # Make sure to set up before signal being _running = True.
-        self._outgoing_queue = Queue()
-
         self._running = True
+        self._open_link_monitor()
+
+        # The receive thread blocks for its whole lifetime and sending
+        # blocks as well. Give them threads of their own instead of taking
+        # them from the default executor, which is shared with other networks.
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix=f"lxa-iobus-{self.interface}")
 
+        try:
+            await self._run(with_lss)
+
+        finally:
+            self._close_link_monitor()
+            self._executor.shutdown(wait=False)
+            self.lss_address_cache.flush()
+            self.object_directory_cache.flush()
+
+    async def _run(self, with_lss):
         while self._running:
             await self.await_interface_is_up()
 
             if not self._running:
                 break
 
-            self.bus = Bus(
-                channel=self.interface,
-                bustype=self.bustype,
-                bitrate=self.bitrate,
-            )
+            if self.transport == "asyncio":
+                self._socket = AsyncSocketCan(self.loop, self.interface, self._handle_message)
+                self._socket.open()
+                self._reset_filters()
+
+                tasks = [
+                    self.update_interface_state(),
+                    self._run_socket(),
+                    self._tx_pump(),
+                ]
+
+            else:
+                self.bus = Bus(
+                    channel=self.interface,
+                    bustype=self.bustype,
+                    bitrate=self.bitrate,
+                )
+
+                self._reset_filters()
 
-            tasks = [
-                self.update_interface_state(),
-                self.loop.run_in_executor(None, self.send),
-                self.loop.run_in_executor(None, self.recv),
-            ]
+                tasks = [
+                    self.update_interface_state(),
+                    self._tx_pump(),
+                    self.loop.run_in_executor(self._executor, self.recv),
+                ]
 
             if with_lss:
-                tasks.append(self.lss_fast_scan())
-                tasks.append(self.lss_ping())
+                # Tasks copy the context they are created in,
+                # so everything discovery and the liveness checks send
+                # is background traffic.
+                with transmit_priority(TxPriority.POLLING):
+                    tasks.append(self.loop.create_task(self.lss_fast_scan()))
+                    tasks.append(self.loop.create_task(self.lss_ping()))
 
             await asyncio.gather(*tasks)
 
             self.nodes = dict()
-            self._outgoing_queue = Queue()
+            self._nodes_in_setup = dict()
+            self._lost_nodes = dict()
+            self._liveness = dict()
             self._pending_lss_request = None
 
-            self.bus.shutdown()
+            if self.transport != "asyncio":
+                self.bus.shutdown()
+                self.bus = None
 
     async def setup_single_node(self):
         """Set up a bus that is known to only contain a single node skipping lss scanning
@@ -582,7 +1657,7 @@ class LxaNetwork:
         self.nodes = dict()
 
         # Set all connected nodes to the configuration state
-        await self.lss_request(gen_lss_switch_mode_global_message(LssMode.CONFIGURATION))
+        await self.lss_send(gen_lss_switch_mode_global_message(LssMode.CONFIGURATION))
 
         # Give all connected nodes the node id 1.
         # This will obviously wreck havoc when multiple nodes are connected
@@ -591,7 +1666,7 @@ class LxaNetwork:
 
         # Set all connected nodes to the operation state,
         # completing the setup.
-        await self.lss_request(gen_lss_switch_mode_global_message(LssMode.OPERATION))
+        await self.lss_send(gen_lss_switch_mode_global_message(LssMode.OPERATION))
 
         # Just assume that we have a node with id 1 now.
         # The lss_address is a bogus address, because we never discovered the nodes address.
@@ -1,12 +1,16 @@
 import contextlib
 import json
 import logging
+import time
 
 from .object_directory import ObjectDirectory
 from .products import find_product
 
 logger = logging.getLogger("lxa_iobus.base_node")
 
+# Time the locator state keeps being polled after it was last looked at
+LOCATOR_WATCH_TIME = 5
+
 
 class LxaBaseNode(object):
     def __init__(self, lss_address):
@@ -14,20 +18,57 @@ class LxaBaseNode(object):
         self.product = find_product(lss_address)
         self.name = self.product.name()
         self.address = ".".join(["{:08x}".format(i) for i in lss_address])
+        self.od = None
 
         self.locator_state = False
+        self._locator_watched_until = 0
+
+    def watch_locator(self):
+        """Note that someone is looking at `locator_state`
+
+        Nodes that send heartbeats are only polled for the locator state
+        while it is watched.
+        """
+
+        self._locator_watched_until = time.monotonic() + LOCATOR_WATCH_TIME
+
+    @property
+    def locator_watched(self):
+        return time.monotonic() < self._locator_watched_until
+
+    async def sdo_read_many(self, objects):
+        """Read several objects, given as (index, sub_index) tuples
 
-    async def setup_object_directory(self):
+        Returns a list of the payloads, in the same order.
+        Subclasses implement this more efficiently than one sdo_read() after
+        the other.
+        """
+
+        return [await self.sdo_read(index, sub_index) for index, sub_index in objects]
+
+    async def sdo_write_many(self, objects):
+        """Write several objects, given as (index, sub_index, data) tuples"""
+
+        for index, sub_index, data in objects:
+            await self.sdo_write(index, sub_index, data)
+
+    async def setup_object_directory(self, snapshot=None):
         self.od = await ObjectDirectory.scan(
             self,
             self.product.ADC_NAMES,
             self.product.INPUT_NAMES,
             self.product.OUTPUT_NAMES,
+            snapshot=snapshot,
         )
 
     async def ping(self):
         try:
-            if "locator" in self.od:
+            if self.od is None:
+                # Setting up the node failed. Every CANopen node has to
+                # provide its vendor id.
+                await self.sdo_read(0x1018, 1)
+
+            elif "locator" in self.od:
                 self.locator_state = await self.od.locator.active()
             else:
                 # The device does not advertise having an IOBus locator.
@@ -1,25 +1,178 @@
 import asyncio
-import concurrent
+import contextlib
 import logging
 import struct
+import time
+from typing import NamedTuple
 
 from lxa_iobus.canopen import (
+    SDO_ABORT_CODE_CRC_ERROR,
+    SDO_ABORT_CODE_TIMEOUT,
+    SDO_ABORT_CODE_UNKNOWN_COMMAND,
+    SDO_BLOCK_SIZE_MAX,
+    SDO_BLOCK_SUBCOMMAND_ACK,
+    SDO_BLOCK_SUBCOMMAND_END,
+    SDO_BLOCK_SUBCOMMAND_INITIATE,
     SDO_TRANSFER_TYPE_DATA_WITH_SIZE,
     SDO_TRANSFER_TYPE_SIZE,
     SdoAbort,
+    SdoMessageType,
+    gen_sdo_abort,
+    gen_sdo_block_download_end,
+    gen_sdo_block_download_initiate,
+    gen_sdo_block_download_segment,
+    gen_sdo_block_upload_ack,
+    gen_sdo_block_upload_end,
+    gen_sdo_block_upload_initiate,
+    gen_sdo_block_upload_start,
     gen_sdo_initiate_download,
     gen_sdo_initiate_upload,
     gen_sdo_segment_download,
     gen_sdo_segment_upload,
+    parse_sdo_message,
+    sdo_block_crc,
 )
 
 from .base_node import LxaBaseNode
-
-DEFAULT_TIMEOUT = 1
+from .scheduler import Transaction, TransactionClass, TransactionScheduler
+
+DEFAULT_TIMEOUT = 0.5
+
+# Writes are not retried and the node may do a lot of work before it
+# confirms one (e.g. erasing flash), so they get more time than reads.
+WRITE_TIMEOUT = 1
+
+# Reads time out after a retransmission timeout (RTO) that is derived from
+# the round trip times measured per node, like it is done for TCP (RFC 6298),
+# and are retried up to SDO_READ_RETRIES times. The RTO is doubled for every
+# timeout in a row. Until the first round trip was measured DEFAULT_TIMEOUT
+# is used.
+# All attempts of a read together wait no longer than SDO_READ_TIME_MAX for
+# responses, so a node that does not answer at all is given up on as fast
+# as with a fixed timeout.
+SDO_RTO_MIN = 0.02
+SDO_RTO_MAX = DEFAULT_TIMEOUT
+SDO_READ_RETRIES = 2
+SDO_READ_TIME_MAX = DEFAULT_TIMEOUT
+
+# Response timeouts only start once a request went out on the bus.
+# Requests that are held up in the TX queue for longer than this
+# (e.g. while the link is down) are given up.
+SDO_SEND_TIMEOUT = 1
+
+# Segmented uploads are collected in a buffer of the size announced by the
+# node. Sizes above this are not trusted and the buffer is grown instead.
+SEGMENTED_UPLOAD_PREALLOCATE_MAX = 1024 * 1024
+
+# A block transfer takes three round trips (initiate, block acknowledge and
+# end) for up to 127 segments, a segmented transfer one round trip per segment
+# plus the initiate. Below three segments the segmented transfer is not slower.
+BLOCK_TRANSFER_MIN_SIZE = 3 * 7
+
+# Worst case length of a bit-stuffed CAN frame with 8 data bytes including the
+# inter frame space. Used to estimate how long a sub-block takes on the bus.
+FRAME_BITS_MAX = 135
 
 logger = logging.getLogger("lxa_iobus.bus_node")
 
 
+class _BlockTransferUnsupported(Exception):
+    pass
+
+
+class _ReadAborted(Exception):
+    """A batch gave up before it read an object that others joined"""
+
+
+class _SubBlock:
+    """Collects the segments of a single sub-block of an SDO block upload
+
+    While a sub-block is in progress the frames sent by the node are not
+    regular SDO responses but carry a sequence number in the first byte,
+    so they are fed into here unparsed.
+    """
+
+    def __init__(self, blksize):
+        self.blksize = blksize
+        self.ackseq = 0
+        self.received = False
+        self.complete = False
+        self.segments = []
+
+        # Resolves to None once the sub-block is done or to the parsed
+        # response if the node sent something else (e.g. an abort).
+        self.result = asyncio.get_running_loop().create_future()
+
+    def feed(self, message):
+        command = message.data[0]
+        seqno = command & 0x7F
+        last = (command & 0x80) != 0
+
+        if seqno == 0:
+            self._done(parse_sdo_message(message))
+
+            return
+
+        self.received = True
+
+        # Segments after a lost one are dropped.
+        # The node will resend them in the next sub-block, starting after
+        # the acknowledged sequence number.
+        if seqno == self.ackseq + 1:
+            self.ackseq = seqno
+            self.segments.append(message.data[1:])
+            self.complete = last
+
+        if last or seqno >= self.blksize:
+            self._done(None)
+
+    def _done(self, response):
+        if not self.result.done():
+            self.result.set_result(response)
+
+
+class _SharedRead(NamedTuple):
+    """An SDO read that concurrent sdo_read() calls of the same object share"""
+
+    task: asyncio.Task
+    transaction: Transaction
+
+
+class _Expected(NamedTuple):
+    """The response a pending SDO request waits for
+
+    Responses that do not match are late answers to earlier requests
+    (e.g. ones that timed out) and must not complete the pending request.
+    """
+
+    types: tuple
+    index: int
+    sub_index: int
+    toggle: bool | None = None
+    subcommand: int | None = None
+
+    def matches(self, response):
+        if response.type is SdoMessageType.ABORT:
+            # Some nodes do not fill in the multiplexer of an abort
+            return (response.index, response.subindex) in ((self.index, self.sub_index), (0, 0))
+
+        if response.type not in self.types:
+            return False
+
+        if response.type in (SdoMessageType.UPLOAD_SEGMENT, SdoMessageType.DOWNLOAD_SEGMENT):
+            return response.toggle == self.toggle
+
+        # Block transfers carry a subcommand
+        if response.type in (SdoMessageType.BLOCK_UPLOAD, SdoMessageType.BLOCK_DOWNLOAD):
+            if response.subcommand != self.subcommand:
+                return False
+
+            if response.subcommand != SDO_BLOCK_SUBCOMMAND_INITIATE:
+                return True
+
+        return response.index == self.index and response.subindex == self.sub_index
+
+
 class LxaBusNode(LxaBaseNode):
     def __init__(self, lxa_network, lss_address, node_id):
         super().__init__(lss_address)
@@ -27,257 +180,760 @@ class LxaBusNode(LxaBaseNode):
         self.lxa_network = lxa_network
         self.node_id = node_id
 
+        # None until the first block transfer tells us whether the node
+        # supports them.
+        self.block_transfer_supported = None
+
+        # Responses that did not match the pending request
+        self.stale_responses = 0
+
+        # Reads and the share of them that were served by a read of the
+        # same object that was already in flight
+        self.sdo_reads = 0
+        self.sdo_reads_coalesced = 0
+        self.sdo_read_retries = 0
+
+        # Smoothed round trip time and its variation
+        self.rtt = None
+        self.rtt_variation = None
+        self.rto = DEFAULT_TIMEOUT
+        self._measure_rtt = False
+
         self._pending_message = None
-        self._lock = asyncio.Lock()
+        self._expected = None
+        self._sub_block = None
+        self._large_objects = set()
+        self._inflight_reads = dict()
+        self._read_batches = set()
+
+        # Only one SDO transaction can be in progress per node.
+        # Interactive ones go first.
+        self.scheduler = TransactionScheduler()
 
     def __repr__(self):
         return f"<LxaBusNode(address={self.address}, node_id={self.node_id})>"
 
     def set_sdo_response(self, message):
-        if self._pending_message and not self._pending_message.done() and not self._pending_message.cancelled():
-            self._pending_message.set_result(message)
+        sub_block = self._sub_block
+
+        if sub_block is not None:
+            sub_block.feed(message)
+
+            return
+
+        response = parse_sdo_message(message)
+
+        if response is None:
+            logger.debug("rx: dropping sdo message with unknown command specifier for node %s", self.node_id)
+
+            return
+
+        if self._pending_message is None or self._pending_message.done() or not self._expected.matches(response):
+            self.stale_responses += 1
+
+            logger.debug("rx: dropping stale sdo response %s for node %s", response.type.name, self.node_id)
+
+            return
 
-    async def _send_sdo_message(self, message, timeout=DEFAULT_TIMEOUT):
-        self._pending_message = concurrent.futures.Future()
-        async_fut = asyncio.futures.wrap_future(self._pending_message)
+        self._pending_message.set_result(response)
 
-        await self.lxa_network.send_message(message)
+    async def _send_sdo_message(self, message, expected, timeout=DEFAULT_TIMEOUT):
+        return await self._send_sdo_messages((message,), expected, timeout=timeout)
+
+    async def _send_sdo_messages(self, messages, expected, timeout=DEFAULT_TIMEOUT):
+        # Sends multiple frames and waits for a single response,
+        # as is the case for the segments of an SDO block download.
+        self._pending_message = asyncio.get_running_loop().create_future()
+        self._expected = expected
+
+        sent = []
 
         try:
-            await asyncio.wait_for(
-                async_fut,
-                timeout=timeout,
-            )
+            for message in messages:
+                sent.append(await self.lxa_network.send_message(message))
 
-            return async_fut.result()
+            response = await self._wait_for_response(sent[-1], timeout)
+
+        finally:
+            # Frames of a request that was given up must not be sent anymore
+            for frame in sent:
+                frame.cancel()
+
+        request = sent[-1]
+
+        if response is not None and self._measure_rtt and request.done() and not request.cancelled():
+            self._update_rto(time.time() - request.result())
+
+        return response
+
+    async def _wait_for_response(self, sent, timeout):
+        pending = self._pending_message
+
+        try:
+            # The timeout starts once the request went out on the bus,
+            # which the network signals through `sent`.
+            await asyncio.wait((pending, sent), timeout=SDO_SEND_TIMEOUT, return_when=asyncio.FIRST_COMPLETED)
+
+            if pending.done():
+                return pending.result()
+
+            # Dropped or still queued
+            if not sent.done() or sent.cancelled():
+                return None
+
+            remaining = sent.result() + timeout - time.time()
+
+            with contextlib.suppress(asyncio.TimeoutError):
+                return await asyncio.wait_for(asyncio.shield(pending), timeout=max(remaining, 0))
 
-        except asyncio.TimeoutError:
             return None
 
-    async def sdo_read(self, index, sub_index, timeout=DEFAULT_TIMEOUT):
-        async with self._lock:
-            # Depending on the answer we do:
-            #  * normal(Segment) transfer > 4 byte: multiple transactions
-            #  * expedited <= 4 byte: one transaction
-            message = gen_sdo_initiate_upload(
-                node_id=self.node_id,
-                index=index,
-                sub_index=sub_index,
+        finally:
+            pending.cancel()
+
+    def _update_rto(self, rtt):
+        if self.rtt is None:
+            self.rtt = rtt
+            self.rtt_variation = rtt / 2
+
+        else:
+            self.rtt_variation += (abs(self.rtt - rtt) - self.rtt_variation) / 4
+            self.rtt += (rtt - self.rtt) / 8
+
+        self.rto = min(max(self.rtt + 4 * self.rtt_variation, SDO_RTO_MIN), SDO_RTO_MAX)
+
+    async def _send_sdo_abort(self, index, sub_index, error_code):
+        await self.lxa_network.send_message(gen_sdo_abort(self.node_id, index, sub_index, error_code))
+
+    def _block_timeout(self, timeout, frames):
+        # The response to a sub-block can only arrive once all of its
+        # segments went over the bus.
+        return timeout + frames * FRAME_BITS_MAX / self.lxa_network.bitrate
+
+    def _check_response(self, response, expected_type):
+        if response is None:
+            raise TimeoutError
+
+        # Something went wrong on the node side
+        if response.type is SdoMessageType.ABORT:
+            raise SdoAbort(
+                node_id=response.node_id,
+                index=response.index,
+                sub_index=response.subindex,
+                error_code=response.error_code,
             )
 
-            response = await self._send_sdo_message(message, timeout=timeout)
+        # Not the packet we were expecting
+        if response.type is not expected_type:
+            raise Exception("Got wrong answer: {}".format(response.type.name))
 
-            if response is None:
+    def _check_block_initiate_response(self, response):
+        # Nodes that do not implement block transfers either abort them or
+        # do not answer at all. Either way we fall back to a segmented transfer.
+        if response is None:
+            if self.block_transfer_supported:
                 raise TimeoutError
 
-            # Something went wrong on the node side
-            if response.type == "abort":
-                raise SdoAbort(
-                    node_id=response.node_id,
-                    index=response.index,
-                    sub_index=response.subindex,
-                    error_code=response.error_code,
-                )
-            # Not the packet we were expecting
-            if not response.type == "initiate_upload":
-                raise Exception("Got wrong answer: {}".format(response.type))
-
-            if response.index != index or response.subindex != sub_index:
-                raise Exception(
-                    "Got answer to the wrong data object: Is: {}-{} , Should: {}-{}".format(
-                        response.index,
-                        response.subindex,
-                        index,
-                        sub_index,
-                    ),
-                )
+            self.block_transfer_supported = False
 
-            # We get a packet where the size field is used
-            if response.readable_transfer_type == "DataWithSize":
-                return response.data[0 : 4 - response.number_of_bytes_not_used]
+            raise _BlockTransferUnsupported
 
-            # We got a packet data uses the packet length as size
-            # Is not used in the firmware
-            if response.readable_transfer_type == "DataNoSize":
-                return response.data
+        if response.type is SdoMessageType.ABORT:
+            if response.error_code == SDO_ABORT_CODE_UNKNOWN_COMMAND:
+                self.block_transfer_supported = False
 
-            # Segmented transfer
-            # We get the size of data to come
-            if not response.readable_transfer_type == "Size":
-                raise Exception("Unknown transfer type")
+            raise _BlockTransferUnsupported
 
-            transfer_size = struct.unpack("<L", response.data)[0]
+    async def sdo_read(self, index, sub_index, timeout=None, block=None, retries=SDO_READ_RETRIES):
+        """Read an object from the node
 
-            logger.debug("Long SDO read: size {}".format(transfer_size))
+        `timeout` is the time to wait for every response. By default it is
+        derived from the round trip times measured before and all attempts
+        together wait no longer than SDO_READ_TIME_MAX.
+        Reads that time out are tried again up to `retries` times.
 
-            PACKET_SIZE = 7
-            collected_data = b""
-            toggle = False
+        `block` selects whether an SDO block upload should be tried first.
+        By default block uploads are used for objects that were found to be
+        large in previous reads.
+        If the node does not support block transfers a segmented transfer
+        is used instead.
 
-            while transfer_size > 0:
-                message = gen_sdo_segment_upload(
-                    node_id=self.node_id,
-                    toggle=toggle,
-                )
+        Concurrent reads of the same object share a single transfer and its
+        result, no matter which arguments they were called with.
+        The shared transfer waits for the node with the most urgent
+        TransactionClass of its callers. Its frames keep the transmit
+        priority of the caller that started it, as they are only sent once
+        the node was granted and spend little time in the TX queue.
+
+        Returns the payload as bytes.
+        """
+
+        self.sdo_reads += 1
+
+        return await self._sdo_read_shared(index, sub_index, timeout, block, retries)
+
+    async def _sdo_read_shared(self, index, sub_index, timeout, block, retries):
+        key = (index, sub_index)
+        transaction_class = TransactionClass.current(write=False)
+
+        while True:
+            read = self._inflight_reads.get(key)
 
-                response = await self._send_sdo_message(
-                    message,
-                    timeout=timeout,
+            if read is None:
+                transaction = Transaction(transaction_class)
+                task = asyncio.get_running_loop().create_task(
+                    self._sdo_read(index, sub_index, timeout, block, retries, transaction),
                 )
+                task.add_done_callback(lambda task: self._sdo_read_done(key, task))
 
-                if response is None:
-                    raise TimeoutError
+                read = _SharedRead(task, transaction)
+                self._inflight_reads[key] = read
 
-                if response.type == "abort":
-                    raise SdoAbort(
-                        node_id=response.node_id,
-                        index=response.index,
-                        sub_index=response.subindex,
-                        error_code=response.error_code,
-                    )
+            else:
+                self.sdo_reads_coalesced += 1
+
+                read.transaction.promote(transaction_class)
+
+            try:
+                # A reader that is cancelled must not cancel the read of the others
+                return await asyncio.shield(read.task)
+
+            except _ReadAborted:
+                logger.debug("Node %s: batch read of 0x%04x.%d was aborted. Reading again", self.node_id, *key)
+
+    def _sdo_read_done(self, key, task):
+        read = self._inflight_reads.get(key)
+
+        if read is not None and read.task is task:
+            self._inflight_reads.pop(key)
+
+        # Retrieve the exception, in case all readers were cancelled
+        if not task.cancelled():
+            task.exception()
+
+    async def _sdo_read(self, index, sub_index, timeout, block, retries, transaction):
+        async with self.scheduler.acquire(transaction):
+            # The result is shared by all readers, so it must not be mutable
+            return bytes(await self._sdo_read_retrying(index, sub_index, timeout, block, retries))
+
+    async def _sdo_read_retrying(self, index, sub_index, timeout, block, retries):
+        budget = SDO_READ_TIME_MAX
+
+        for attempt in range(retries + 1):
+            # Late responses to an earlier attempt can not be told apart
+            # from responses to the retry, so only measure first attempts.
+            self._measure_rtt = attempt == 0
+
+            attempt_timeout = timeout
+
+            if timeout is None:
+                attempt_timeout = min(self.rto, budget)
+                budget -= attempt_timeout
+
+            try:
+                return await self._sdo_read_once(index, sub_index, attempt_timeout, block)
+
+            except TimeoutError:
+                if timeout is None:
+                    self.rto = min(self.rto * 2, SDO_RTO_MAX)
+
+                if attempt == retries or (timeout is None and budget < SDO_RTO_MIN):
+                    raise
+
+                self.sdo_read_retries += 1
+
+                logger.debug("Node %s: read of 0x%04x.%d timed out. Retrying", self.node_id, index, sub_index)
+
+            finally:
+                self._measure_rtt = False
+
+    async def sdo_read_many(self, objects, timeout=None, retries=SDO_READ_RETRIES):
+        """Read several objects from the node in one go
+
+        `objects` is an iterable of (index, sub_index) tuples.
+        Returns a list of the payloads as bytes, in the same order.
+
+        The node is held for the whole batch, so every request is sent as
+        soon as the response to the previous one arrived, instead of
+        competing for the node again. Only transactions of a more urgent
+        class may get in between.
+        Like with sdo_read(), objects that are already being read are not
+        read again, and concurrent reads of the objects of the batch share
+        its transfers.
+        """
+
+        objects = list(objects)
+
+        if not objects:
+            return []
+
+        loop = asyncio.get_running_loop()
+        transaction_class = TransactionClass.current(write=False)
+        transaction = Transaction(transaction_class)
+        reads = []
+        batch = []
+
+        self.sdo_reads += len(objects)
+
+        for index, sub_index in objects:
+            key = (index, sub_index)
+            read = self._inflight_reads.get(key)
+
+            if read is None:
+                future = loop.create_future()
+                future.add_done_callback(lambda future, key=key: self._sdo_read_done(key, future))
+
+                read = _SharedRead(future, transaction)
+                self._inflight_reads[key] = read
+                batch.append((key, future))
+
+            else:
+                self.sdo_reads_coalesced += 1
+
+                read.transaction.promote(transaction_class)
+
+            reads.append(read)
+
+        if batch:
+            task = loop.create_task(self._sdo_read_batch(batch, timeout, retries, transaction))
+
+            self._read_batches.add(task)
+            task.add_done_callback(self._read_batches.discard)
+
+        payloads = []
+
+        for (index, sub_index), read in zip(objects, reads, strict=True):
+            try:
+                # A reader that is cancelled must not cancel the reads of the others
+                payloads.append(await asyncio.shield(read.task))
 
-                if not response.type == "upload_segment":
-                    raise Exception("Got wrong answer: {}".format(response.type))
+            except _ReadAborted:
+                payloads.append(await self._sdo_read_shared(index, sub_index, timeout, None, retries))
 
-                if toggle != response.toggle:
-                    Exception(
-                        "Toggle bit does not match: is: {}, should: {}".format(
-                            response.toggle,
-                            toggle,
-                        ),
+        return payloads
+
+    async def _sdo_read_batch(self, batch, timeout, retries, transaction):
+        try:
+            async with self.scheduler.acquire(transaction):
+                for (index, sub_index), future in batch:
+                    await transaction.yield_to_urgent()
+
+                    try:
+                        payload = await self._sdo_read_retrying(index, sub_index, timeout, None, retries)
+
+                    except SdoAbort as e:
+                        # Only this object is affected
+                        future.set_exception(e)
+
+                        continue
+
+                    except Exception as e:
+                        # The node is unlikely to answer the rest either.
+                        # The caller of the batch fails with this object.
+                        future.set_exception(e)
+
+                        return
+
+                    future.set_result(bytes(payload))
+
+        finally:
+            # Others that joined the objects that were not read
+            # have to read them on their own
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(_ReadAborted())
+
+    async def _sdo_read_once(self, index, sub_index, timeout, block):
+        if block is None:
+            block = (index, sub_index) in self._large_objects
+
+        if block and self.block_transfer_supported is not False:
+            try:
+                return await self._sdo_block_upload(index, sub_index, timeout)
+
+            except _BlockTransferUnsupported:
+                logger.debug("Node %s: block upload failed. Falling back to segmented transfer", self.node_id)
+
+        return await self._sdo_upload(index, sub_index, timeout)
+
+    async def _sdo_upload(self, index, sub_index, timeout):
+        # Depending on the answer we do:
+        #  * normal(Segment) transfer > 4 byte: multiple transactions
+        #  * expedited <= 4 byte: one transaction
+        message = gen_sdo_initiate_upload(
+            node_id=self.node_id,
+            index=index,
+            sub_index=sub_index,
+        )
+
+        expected = _Expected((SdoMessageType.INITIATE_UPLOAD,), index, sub_index)
+        response = await self._send_sdo_message(message, expected, timeout=timeout)
+
+        self._check_response(response, SdoMessageType.INITIATE_UPLOAD)
+
+        return await self._finish_upload(response, index, sub_index, timeout)
+
+    async def _finish_upload(self, response, index, sub_index, timeout):
+        # We get a packet where the size field is used
+        if response.readable_transfer_type == "DataWithSize":
+            return response.data[0 : 4 - response.number_of_bytes_not_used]
+
+        # We got a packet data uses the packet length as size
+        # Is not used in the firmware
+        if response.readable_transfer_type == "DataNoSize":
+            return response.data
+
+        # Segmented transfer
+        # We get the size of data to come
+        if not response.readable_transfer_type == "Size":
+            raise Exception("Unknown transfer type")
+
+        transfer_size = struct.unpack("<L", response.data)[0]
+
+        logger.debug("Long SDO read: size {}".format(transfer_size))
+
+        # Use a block transfer the next time this object is read
+        if transfer_size >= BLOCK_TRANSFER_MIN_SIZE:
+            self._large_objects.add((index, sub_index))
+
+        PACKET_SIZE = 7
+        collected_data = bytearray(min(transfer_size, SEGMENTED_UPLOAD_PREALLOCATE_MAX))
+        received = 0
+        toggle = False
+
+        while received < transfer_size:
+            message = gen_sdo_segment_upload(
+                node_id=self.node_id,
+                toggle=toggle,
+            )
+
+            # Segments with the wrong toggle bit are dropped as stale
+            response = await self._send_sdo_message(
+                message,
+                _Expected((SdoMessageType.UPLOAD_SEGMENT,), index, sub_index, toggle=toggle),
+                timeout=timeout,
+            )
+
+            self._check_response(response, SdoMessageType.UPLOAD_SEGMENT)
+
+            # Flip toggle
+            toggle ^= True
+
+            length = PACKET_SIZE - response.number_of_bytes_not_used
+
+            # Copies the segment into place. The buffer only grows if the
+            # node sends more than it announced.
+            collected_data[received : received + length] = response.seg_data[0:length]
+            received += length
+
+            if response.complete:
+                break
+
+        # The node sent less than it announced
+        del collected_data[received:]
+
+        return collected_data
+
+    async def _sdo_block_upload(self, index, sub_index, timeout):
+        message = gen_sdo_block_upload_initiate(
+            node_id=self.node_id,
+            index=index,
+            sub_index=sub_index,
+            blksize=SDO_BLOCK_SIZE_MAX,
+        )
+
+        # The node may switch to a normal upload if the object is small
+        expected = _Expected(
+            (SdoMessageType.BLOCK_UPLOAD, SdoMessageType.INITIATE_UPLOAD),
+            index,
+            sub_index,
+            subcommand=SDO_BLOCK_SUBCOMMAND_INITIATE,
+        )
+
+        response = await self._send_sdo_message(message, expected, timeout=timeout)
+
+        self._check_block_initiate_response(response)
+
+        if response.type is SdoMessageType.INITIATE_UPLOAD:
+            return await self._finish_upload(response, index, sub_index, timeout)
+
+        self._check_response(response, SdoMessageType.BLOCK_UPLOAD)
+        if response.subcommand != SDO_BLOCK_SUBCOMMAND_INITIATE:
+            raise Exception("Got wrong block upload answer: {}".format(response.subcommand))
+
+        self.block_transfer_supported = True
+
+        use_crc = response.crc_supported
+        transfer_size = response.size if response.indicates_size else None
+
+        logger.debug("Block SDO read: size {}".format(transfer_size))
+
+        segments = []
+        message = gen_sdo_block_upload_start(self.node_id)
+
+        try:
+            while True:
+                # The node starts sending segments as soon as it receives the
+                # start or acknowledge message, so the sub-block has to be
+                # set up before.
+                sub_block = _SubBlock(SDO_BLOCK_SIZE_MAX)
+                self._sub_block = sub_block
+
+                await self.lxa_network.send_message(message)
+
+                try:
+                    response = await asyncio.wait_for(
+                        sub_block.result,
+                        timeout=self._block_timeout(timeout, SDO_BLOCK_SIZE_MAX),
                     )
 
-                # Flip toggle
-                toggle ^= True
+                except asyncio.TimeoutError:
+                    # The last segment of the sub-block got lost.
+                    # Segments of the sub-block did arrive, so the node got
+                    # our last message and waits for the acknowledge.
+                    # It sends the rest again, starting after `ackseq`.
+                    if not sub_block.received:
+                        raise
+
+                    logger.debug("Node %s: sub-block incomplete. Acknowledging %d", self.node_id, sub_block.ackseq)
+
+                    response = None
+
+                self._sub_block = None
 
-                seg_data_end = PACKET_SIZE - response.number_of_bytes_not_used
-                seg_data = response.seg_data[0:seg_data_end]
-                collected_data += seg_data
-                transfer_size -= len(seg_data)
+                if response is not None:
+                    self._check_response(response, None)
 
-                if response.complete:
+                segments.extend(sub_block.segments)
+
+                message = gen_sdo_block_upload_ack(self.node_id, sub_block.ackseq, SDO_BLOCK_SIZE_MAX)
+
+                if sub_block.complete:
                     break
 
-            return collected_data
-
-    async def sdo_write(self, index, sub_index, data, timeout=DEFAULT_TIMEOUT):
-        async with self._lock:
-            #  * normal(Segment) transfer > 4 byte: multiple transactions
-            #  * expedited <= 4 byte: one transaction
-
-            if len(data) <= 4:
-                #######################################
-                # expedited transfer
-                message = gen_sdo_initiate_download(
-                    node_id=self.node_id,
-                    index=index,
-                    sub_index=sub_index,
-                    data=data,
-                    type=SDO_TRANSFER_TYPE_DATA_WITH_SIZE,
-                )
+        except asyncio.TimeoutError:
+            await self._send_sdo_abort(index, sub_index, SDO_ABORT_CODE_TIMEOUT)
 
-                response = await self._send_sdo_message(
-                    message,
-                    timeout=timeout,
-                )
+            raise TimeoutError from None
 
-                if response is None:
-                    raise TimeoutError
+        finally:
+            self._sub_block = None
 
-                if response.type == "abort":
-                    raise SdoAbort(
-                        node_id=response.node_id,
-                        index=response.index,
-                        sub_index=response.subindex,
-                        error_code=response.error_code,
-                    )
+        # The acknowledge of the last sub-block is answered with the end message
+        expected = _Expected((SdoMessageType.BLOCK_UPLOAD,), index, sub_index, subcommand=SDO_BLOCK_SUBCOMMAND_END)
+        response = await self._send_sdo_message(message, expected, timeout=timeout)
 
-                if not response.type == "initiate_download":
-                    raise Exception("Got wrong answer: {}".format(response.type))
+        self._check_response(response, SdoMessageType.BLOCK_UPLOAD)
 
-                return
+        data = b"".join(segments)
+        data = data[0 : len(data) - response.number_of_bytes_not_used]
+
+        if use_crc and sdo_block_crc(data) != response.crc:
+            await self._send_sdo_abort(index, sub_index, SDO_ABORT_CODE_CRC_ERROR)
+
+            raise Exception("CRC mismatch in block upload")
+
+        if transfer_size is not None and transfer_size != len(data):
+            raise Exception("Block upload size mismatch: is: {}, should: {}".format(len(data), transfer_size))
+
+        await self.lxa_network.send_message(gen_sdo_block_upload_end(self.node_id))
+
+        return data
+
+    async def sdo_write(self, index, sub_index, data, timeout=WRITE_TIMEOUT):
+        # Reads that are already in flight may return the old value.
+        # Reads that start after the write wait for it to be done.
+        self._inflight_reads.pop((index, sub_index), None)
+
+        async with self.scheduler.transaction(TransactionClass.current(write=True)):
+            return await self._sdo_write_once(index, sub_index, data, timeout)
+
+    async def _sdo_write_once(self, index, sub_index, data, timeout):
+        #  * block transfer for larger objects, if the node supports it
+        #  * normal(Segment) transfer > 4 byte: multiple transactions
+        #  * expedited <= 4 byte: one transaction
+
+        if len(data) >= BLOCK_TRANSFER_MIN_SIZE and self.block_transfer_supported is not False:
+            try:
+                return await self._sdo_block_download(index, sub_index, data, timeout)
+
+            except _BlockTransferUnsupported:
+                logger.debug("Node %s: block download failed. Falling back to segmented transfer", self.node_id)
 
-            ########################################
-            # Segment transfer
-            transfer_size = len(data)
+        return await self._sdo_download(index, sub_index, data, timeout)
 
-            # Send the length of the transfer
+    async def sdo_write_many(self, objects, timeout=WRITE_TIMEOUT):
+        """Write several objects to the node in one go
+
+        `objects` is an iterable of (index, sub_index, data) tuples.
+        The objects are written in order, like with sdo_read_many().
+        """
+
+        objects = list(objects)
+
+        for index, sub_index, _ in objects:
+            self._inflight_reads.pop((index, sub_index), None)
+
+        async with self.scheduler.transaction(TransactionClass.current(write=True)) as transaction:
+            for index, sub_index, data in objects:
+                await transaction.yield_to_urgent()
+
+                await self._sdo_write_once(index, sub_index, data, timeout)
+
+    async def _sdo_download(self, index, sub_index, data, timeout):
+        if len(data) <= 4:
+            #######################################
+            # expedited transfer
             message = gen_sdo_initiate_download(
                 node_id=self.node_id,
                 index=index,
                 sub_index=sub_index,
-                data=struct.pack("<L", transfer_size),
-                type=SDO_TRANSFER_TYPE_SIZE,
+                data=data,
+                type=SDO_TRANSFER_TYPE_DATA_WITH_SIZE,
             )
 
             response = await self._send_sdo_message(
                 message,
+                _Expected((SdoMessageType.INITIATE_DOWNLOAD,), index, sub_index),
                 timeout=timeout,
             )
 
-            if response is None:
-                raise TimeoutError
+            self._check_response(response, SdoMessageType.INITIATE_DOWNLOAD)
 
-            if response.type == "abort":
-                raise SdoAbort(
-                    node_id=response.node_id,
-                    index=response.index,
-                    sub_index=response.subindex,
-                    error_code=response.error_code,
-                )
+            return
 
-            if not response.type == "initiate_download":
-                raise Exception("Got wrong answer: {}".format(response.type))
+        ########################################
+        # Segment transfer
+        transfer_size = len(data)
 
-            PACKET_SIZE = 7
-            segment = 0
-            toggle = False
+        # Send the length of the transfer
+        message = gen_sdo_initiate_download(
+            node_id=self.node_id,
+            index=index,
+            sub_index=sub_index,
+            data=struct.pack("<L", transfer_size),
+            type=SDO_TRANSFER_TYPE_SIZE,
+        )
 
-            while transfer_size > 0:
-                offset = segment * PACKET_SIZE
-                length = min(transfer_size, PACKET_SIZE)
+        response = await self._send_sdo_message(
+            message,
+            _Expected((SdoMessageType.INITIATE_DOWNLOAD,), index, sub_index),
+            timeout=timeout,
+        )
 
-                # Is this last packet
-                complete = False
+        self._check_response(response, SdoMessageType.INITIATE_DOWNLOAD)
 
-                if length < PACKET_SIZE:
-                    complete = True
+        PACKET_SIZE = 7
+        view = memoryview(data)
+        segment = 0
+        toggle = False
 
-                if len(data) == offset + length:
-                    complete = True
+        while transfer_size > 0:
+            offset = segment * PACKET_SIZE
+            length = min(transfer_size, PACKET_SIZE)
 
-                message = gen_sdo_segment_download(
-                    node_id=self.node_id,
-                    toggle=toggle,
-                    complete=complete,
-                    seg_data=data[offset : offset + length],
-                )
+            # Is this last packet
+            complete = False
 
-                response = await self._send_sdo_message(
-                    message,
-                    timeout=timeout,
-                )
+            if length < PACKET_SIZE:
+                complete = True
 
-                if response is None:
-                    raise TimeoutError
+            if len(data) == offset + length:
+                complete = True
 
-                if response.type == "abort":
-                    raise SdoAbort(
-                        node_id=response.node_id,
-                        index=response.index,
-                        sub_index=response.subindex,
-                        error_code=response.error_code,
-                    )
+            message = gen_sdo_segment_download(
+                node_id=self.node_id,
+                toggle=toggle,
+                complete=complete,
+                seg_data=view[offset : offset + length],
+            )
+
+            response = await self._send_sdo_message(
+                message,
+                _Expected((SdoMessageType.DOWNLOAD_SEGMENT,), index, sub_index, toggle=toggle),
+                timeout=timeout,
+            )
+
+            self._check_response(response, SdoMessageType.DOWNLOAD_SEGMENT)
+
+            if complete:
+                return
+
+            segment += 1
+            toggle ^= True
+            transfer_size -= length
+
+        # Maybe the complete flag is not correctly set
+        raise Exception("Something went wrong with segmented download")
+
+    async def _sdo_block_download(self, index, sub_index, data, timeout):
+        transfer_size = len(data)
+
+        message = gen_sdo_block_download_initiate(
+            node_id=self.node_id,
+            index=index,
+            sub_index=sub_index,
+            size=transfer_size,
+        )
+
+        expected = _Expected(
+            (SdoMessageType.BLOCK_DOWNLOAD,),
+            index,
+            sub_index,
+            subcommand=SDO_BLOCK_SUBCOMMAND_INITIATE,
+        )
+
+        response = await self._send_sdo_message(message, expected, timeout=timeout)
+
+        self._check_block_initiate_response(response)
+        self._check_response(response, SdoMessageType.BLOCK_DOWNLOAD)
+
+        self.block_transfer_supported = True
+
+        use_crc = response.crc_supported
+        blksize = response.blksize
+
+        PACKET_SIZE = 7
+        view = memoryview(data)
+        offset = 0
+
+        while True:
+            block_start = offset
+            messages = list()
+            last = False
+
+            while len(messages) < blksize and not last:
+                seg_data = view[offset : offset + PACKET_SIZE]
+                offset += len(seg_data)
+                last = offset >= transfer_size
+
+                messages.append(gen_sdo_block_download_segment(self.node_id, len(messages) + 1, last, seg_data))
+
+            response = await self._send_sdo_messages(
+                messages,
+                _Expected((SdoMessageType.BLOCK_DOWNLOAD,), index, sub_index, subcommand=SDO_BLOCK_SUBCOMMAND_ACK),
+                timeout=self._block_timeout(timeout, len(messages)),
+            )
+
+            if response is None:
+                await self._send_sdo_abort(index, sub_index, SDO_ABORT_CODE_TIMEOUT)
+
+            self._check_response(response, SdoMessageType.BLOCK_DOWNLOAD)
+
+            # The node acknowledges the last segment it received in sequence.
+            # Everything after it has to be sent again in the next sub-block.
+            offset = min(block_start + response.ackseq * PACKET_SIZE, transfer_size)
+            blksize = response.blksize
+
+            if last and response.ackseq == len(messages):
+                break
 
-                if not response.type == "download_segment":
-                    raise Exception("Got wrong answer: {}".format(response.type))
+        number_of_bytes_not_used = (PACKET_SIZE - transfer_size % PACKET_SIZE) % PACKET_SIZE
+        crc = sdo_block_crc(data) if use_crc else 0
 
-                if complete:
-                    return
+        message = gen_sdo_block_download_end(self.node_id, number_of_bytes_not_used, crc)
 
-                segment += 1
-                toggle ^= True
-                transfer_size -= length
+        expected = _Expected((SdoMessageType.BLOCK_DOWNLOAD,), index, sub_index, subcommand=SDO_BLOCK_SUBCOMMAND_END)
+        response = await self._send_sdo_message(message, expected, timeout=timeout)
 
-            # Maybe the complete flag is not correctly set
-            raise Exception("Something went wrong with segmented download")
+        self._check_response(response, SdoMessageType.BLOCK_DOWNLOAD)
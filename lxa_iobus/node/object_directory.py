@@ -285,16 +285,71 @@ class ProcessDataObject(object):
 
     Sub indices can also be marked as read only / write only and cacheable
     (which means they do not have to be re-fetched from the node every time they are read).
+    The cached values can be saved using `snapshot()` and put back using `restore()`.
     """
 
     INDEX = None
 
     def __init__(self, node):
         self._cache = dict()
+        self._cacheable = dict()
+        self._readable = dict()
         self._node = node
 
+    def snapshot(self):
+        """Get the raw payloads of all cacheable sub indices that were read so far
+
+        Returns: a dictionary of sub index ids and hex encoded payloads.
+        """
+
+        return dict(
+            (sub_index, sub.encode(self._cache[key]).hex())
+            for sub_index, (key, sub) in self._cacheable.items()
+            if key in self._cache
+        )
+
+    def restore(self, payloads):
+        """Fill the cache with payloads from `snapshot()`"""
+
+        for sub_index, payload in payloads.items():
+            if sub_index in self._cacheable:
+                key, sub = self._cacheable[sub_index]
+                self._cache[key] = sub.decode(bytes.fromhex(payload))
+
+    async def read_many(self, keys):
+        """Read several sub indices using a single batch of SDO reads
+
+        `keys` are names of sub indices registered using `add_sub` and
+        (name, instance) tuples for those registered using `add_sub_array`.
+        Values that are in the cache are not read again.
+
+        Returns: a list of the decoded values, in the same order.
+        """
+
+        keys = list(keys)
+        missing = [key for key in dict.fromkeys(keys) if key not in self._cache]
+        values = dict()
+
+        if missing:
+            payloads = await self._node.sdo_read_many(
+                (self.INDEX, self._readable[key][0].sub_index) for key in missing
+            )
+
+            for key, payload in zip(missing, payloads, strict=True):
+                sub, cacheable = self._readable[key]
+                values[key] = sub.decode(payload)
+
+                if cacheable:
+                    self._cache[key] = values[key]
+
+        return [values[key] if key in values else self._cache[key] for key in keys]
+
     def add_sub(self, name: str, sub: SubIndex, readable=True, writable=True, cacheable=False):
+        if cacheable:
+            self._cacheable[sub.sub_index] = (name, sub)
+
         if readable:
+            self._readable[name] = (sub, cacheable)
 
             async def get_sub(self):
                 if cacheable and name in self._cache:
@@ -327,7 +382,13 @@ class ProcessDataObject(object):
             setattr(self, set_name, types.MethodType(set_sub, self))
 
     def add_sub_array(self, name: str, subs: [SubIndex], readable=True, writable=True, cacheable=False):
+        if cacheable:
+            for instance, sub in enumerate(subs):
+                self._cacheable[sub.sub_index] = ((name, instance), sub)
+
         if readable:
+            for instance, sub in enumerate(subs):
+                self._readable[name, instance] = (sub, cacheable)
 
             async def get_sub(self, instance: int):
                 if cacheable and (name, instance) in self._cache:
@@ -388,6 +449,16 @@ class ManufacturerSoftwareVersion(ProcessDataObject):
         self.add_sub("version", StringSubIndex(0), writable=False, cacheable=True)
 
 
+class ProducerHeartbeatTime(ProcessDataObject):
+    INDEX = 0x1017
+
+    def __init__(self, node):
+        super().__init__(node)
+
+        # Time between two heartbeat messages of the node in ms. 0 disables them.
+        self.add_sub("time", SubIndex.u16(0))
+
+
 class SupportedProtocols(ProcessDataObject):
     """Gets the protocol indices supported by a node
 
@@ -420,15 +491,9 @@ class SupportedProtocols(ProcessDataObject):
         self.add_sub("protocol_count", SubIndex.u32(0), writable=False, cacheable=True)
 
     async def fetch(self):
-        protocols = list()
-
         count = await self.protocol_count()
 
-        for i in range(count):
-            protocol = await self.protocol(i)
-            protocols.append(protocol)
-
-        return tuple(protocols)
+        return tuple(await self.read_many(("protocol", i) for i in range(count)))
 
 
 class VersionInfo(ProcessDataObject):
@@ -504,9 +569,7 @@ class InputOutputBase(ProcessDataObject):
 
         res = dict()
 
-        for channel in range(channel_count):
-            bits = await self.data(channel)
-
+        for bits in await self.read_many(("data", channel) for channel in range(channel_count)):
             res.update((name, value) for name, value in bits.items() if not name.endswith("_mask"))
 
         return res
@@ -854,10 +917,18 @@ class Adc(ProcessDataObject):
         return await self.read_by_index(index)
 
     async def read_all(self):
+        indices = [self._name_to_index_map[name] for name in self.channel_names]
+
+        # Offset and scale are usually cached already, so this mostly reads the data
+        values = await self.read_many(
+            key for index in indices for key in (("data", index), ("offset", index), ("scale", index))
+        )
+
         res = dict()
 
-        for name in self.channel_names:
-            res[name] = await self.read(name)
+        for i, name in enumerate(self.channel_names):
+            data, offset, scale = values[i * 3 : i * 3 + 3]
+            res[name] = (data + offset) * scale
 
         return res
 
@@ -895,13 +966,7 @@ class ChipUid(ProcessDataObject):
         self.add_sub_array("uid_field", sub_indices, writable=False, cacheable=True)
 
     async def uid(self):
-        uid = list()
-
-        for i in range(4):
-            field = await self.uid_field(i)
-            uid.append(field)
-
-        return tuple(uid)
+        return tuple(await self.read_many(("uid_field", i) for i in range(4)))
 
 
 class ServerTimeout(ProcessDataObject):
@@ -944,6 +1009,45 @@ class ServerTimeout(ProcessDataObject):
         self.set_status(0)
 
 
+class _SnapshotReplay(object):
+    """Serves the SDO reads of ObjectDirectory.scan() from a snapshot
+
+    Reads of objects that are not part of the snapshot and everything else
+    are passed on to the actual node.
+    """
+
+    def __init__(self, node, snapshot):
+        self._node = node
+        self._snapshot = snapshot
+
+    def _lookup(self, index, sub_index):
+        return self._snapshot.get(_snapshot_key(index), {}).get(str(sub_index))
+
+    async def sdo_read(self, index, sub_index, *args, **kwargs):
+        payload = self._lookup(index, sub_index)
+
+        if payload is None:
+            return await self._node.sdo_read(index, sub_index, *args, **kwargs)
+
+        return bytes.fromhex(payload)
+
+    async def sdo_read_many(self, objects):
+        objects = list(objects)
+        payloads = [self._lookup(index, sub_index) for index, sub_index in objects]
+        missing = [obj for obj, payload in zip(objects, payloads, strict=True) if payload is None]
+
+        fetched = iter(await self._node.sdo_read_many(missing) if missing else ())
+
+        return [next(fetched) if payload is None else bytes.fromhex(payload) for payload in payloads]
+
+    def __getattr__(self, name):
+        return getattr(self._node, name)
+
+
+def _snapshot_key(index):
+    return f"0x{index:04x}"
+
+
 class ObjectDirectory(dict):
     """Auto-Enumerated directory of LXA IOBus node CANopen objects"""
 
@@ -958,8 +1062,25 @@ class ObjectDirectory(dict):
     }
 
     @classmethod
-    async def scan(cls, node, adc_names=None, input_names=None, output_names=None):
-        """Set up an ObjectDirectory by enumerating available objects on a node"""
+    async def scan(cls, node, adc_names=None, input_names=None, output_names=None, snapshot=None):
+        """Set up an ObjectDirectory by enumerating available objects on a node
+
+        If a `snapshot()` of a previous scan of the same node is given and the
+        node still runs the same software version, the static information is
+        taken from the snapshot instead of reading it from the node.
+        """
+
+        if snapshot is not None:
+            if await cls._snapshot_is_valid(node, snapshot):
+                this = await cls.scan(_SnapshotReplay(node, snapshot), adc_names, input_names, output_names)
+
+                for obj in this.values():
+                    obj._node = node
+                    obj.restore(dict((int(k), v) for k, v in snapshot.get(_snapshot_key(obj.INDEX), {}).items()))
+
+                return this
+
+            logger.info(f"Node {node.name} has changed. Scanning the object directory again")
 
         this = cls(node)
 
@@ -987,6 +1108,53 @@ class ObjectDirectory(dict):
 
         return this
 
+    @classmethod
+    async def _snapshot_is_valid(cls, node, snapshot):
+        index = ManufacturerSoftwareVersion.INDEX
+
+        try:
+            software_version = await node.sdo_read(index, 0)
+
+        except SdoAbort:
+            return False
+
+        return snapshot.get(_snapshot_key(index), {}).get("0") == bytes(software_version).hex()
+
+    async def is_current(self, node):
+        """Whether `node` still runs the software version this object directory was read from
+
+        Only the software version is read from the node.
+        """
+
+        snapshot = self.snapshot()
+
+        return snapshot is not None and await self._snapshot_is_valid(node, snapshot)
+
+    def snapshot(self):
+        """Get the static information read from the node in a JSON serializable form
+
+        The snapshot can be passed to `scan()` to set up the object directory
+        of the same node again without reading all of it.
+
+        Returns: None if the software version was not read yet, because
+        the snapshot could not be validated without it.
+        """
+
+        snapshot = dict()
+
+        for obj in self.values():
+            payloads = obj.snapshot()
+
+            if payloads:
+                snapshot.setdefault(_snapshot_key(obj.INDEX), dict()).update(
+                    (str(sub_index), payload) for sub_index, payload in payloads.items()
+                )
+
+        if _snapshot_key(ManufacturerSoftwareVersion.INDEX) not in snapshot:
+            return None
+
+        return snapshot
+
     async def _try_protocol_setup(self, node, name, cls, *args):
         try:
             if hasattr(cls, "new"):
@@ -1014,6 +1182,7 @@ class ObjectDirectory(dict):
         self["manufacturer_device_name"] = ManufacturerDeviceName(node)
         self["manufacturer_hardware_version"] = ManufacturerHardwareVersion(node)
         self["manufacturer_software_version"] = ManufacturerSoftwareVersion(node)
+        self["producer_heartbeat_time"] = ProducerHeartbeatTime(node)
 
     def __getattr__(self, name):
         # This allows accessing e.g. od["adc"] via od.adc as well,
@@ -148,8 +148,12 @@ class Unknown(Node):
         return cls(lss_address[3])
 
 
+# All products with a known LSS vendor, product and revision
+PRODUCTS = [Iobus4Do3Di3Ai, PTXIOMux, EthernetMux, Optick]
+
+
 def find_product(lss_address: list[int]):
-    for node_cls in [Iobus4Do3Di3Ai, PTXIOMux, EthernetMux, Optick]:
+    for node_cls in PRODUCTS:
         node = node_cls.try_match(lss_address)
 
         if node is not None:
@@ -60,9 +60,16 @@ class LxaRemoteNode(LxaBaseNode):
         self.base_url = base_url
         self.node_name = node_name
 
+        # Servers before the batch endpoint answer it with 404 Not Found.
+        # Batches are then split into single requests.
+        self.batch_supported = True
+
     def _sdo_url(self, index, sub_index):
         return f"{self.base_url}/api/v2/node/{self.node_name}/raw_sdo/0x{index:04x}/{sub_index}"
 
+    def _sdo_batch_url(self):
+        return f"{self.base_url}/api/v2/node/{self.node_name}/raw_sdo_batch"
+
     async def sdo_read(self, index, sub_index, _timeout=None):
         """Perform a raw SDO read on the node
 
@@ -98,6 +105,70 @@ class LxaRemoteNode(LxaBaseNode):
             # but no node id and error id "General error" should be good enough.
             raise SdoAbort(0, index, sub_index, 0x08000000) from e
 
+    async def sdo_read_many(self, objects):
+        """Perform several raw SDO reads on the node in a single HTTP request
+
+        `objects` is an iterable of (index, sub_index) tuples.
+        Returns a list of the raw contents, in the same order.
+        """
+
+        objects = list(objects)
+
+        if not objects:
+            return []
+
+        if not self.batch_supported:
+            return await super().sdo_read_many(objects)
+
+        try:
+            response = await self.session.post(
+                self._sdo_batch_url(),
+                json={"read": [[index, sub_index] for index, sub_index in objects]},
+            )
+            body = await response.json()
+        except ClientResponseError as e:
+            if e.status == 404:
+                self.batch_supported = False
+
+                return await super().sdo_read_many(objects)
+
+            logger.warn(f"sdo_read_many() failed for node {self.name}: {e}")
+
+            # The server does not tell which of the reads failed
+            raise SdoAbort(0, objects[0][0], objects[0][1], 0x08000000) from e
+
+        return [bytes.fromhex(data) for data in body]
+
+    async def sdo_write_many(self, objects):
+        """Perform several raw SDO writes on the node in a single HTTP request
+
+        `objects` is an iterable of (index, sub_index, data) tuples.
+        """
+
+        objects = list(objects)
+
+        if not objects:
+            return
+
+        if not self.batch_supported:
+            return await super().sdo_write_many(objects)
+
+        try:
+            await self.session.post(
+                self._sdo_batch_url(),
+                json={"write": [[index, sub_index, bytes(data).hex()] for index, sub_index, data in objects]},
+            )
+        except ClientResponseError as e:
+            if e.status == 404:
+                self.batch_supported = False
+
+                return await super().sdo_write_many(objects)
+
+            logger.warn(f"sdo_write_many() failed for node {self.name}: {e}")
+
+            # The server does not tell which of the writes failed
+            raise SdoAbort(0, objects[0][0], objects[0][1], 0x08000000) from e
+
     async def close(self):
         """Clean up the session
 
@@ -0,0 +1,214 @@
+import asyncio
+import contextlib
+import enum
+import math
+
+from lxa_iobus.tx_queue import TxPriority, current_priority
+
+
+class TransactionClass(enum.IntEnum):
+    """Priority classes of SDO transactions. Lower classes go first."""
+
+    INTERACTIVE_WRITE = 0
+    INTERACTIVE_READ = 1
+    POLLING = 2
+    BULK = 3
+
+    @classmethod
+    def current(cls, write):
+        """The class of a transaction started from the current task
+
+        Derived from the transmit priority, see tx_queue.transmit_priority().
+        """
+
+        priority = current_priority()
+
+        if priority == TxPriority.BULK:
+            return cls.BULK
+
+        if priority == TxPriority.POLLING:
+            return cls.POLLING
+
+        return cls.INTERACTIVE_WRITE if write else cls.INTERACTIVE_READ
+
+
+# A waiting transaction is moved up by one class for every AGING_TIME seconds
+# it waited, so polling and bulk transfers are delayed but never starved.
+AGING_TIME = 0.2
+
+# Upper bounds of the wait time histogram buckets in seconds
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, math.inf)
+
+
+class WaitHistogram:
+    __slots__ = ("counts", "wait_max")
+
+    def __init__(self):
+        self.counts = [0] * len(WAIT_BUCKETS)
+        self.wait_max = 0
+
+    def add(self, wait):
+        for i, bound in enumerate(WAIT_BUCKETS):
+            if wait <= bound:
+                self.counts[i] += 1
+
+                break
+
+        self.wait_max = max(self.wait_max, wait)
+
+    def to_dict(self):
+        return {
+            "transactions": sum(self.counts),
+            "wait_max": self.wait_max,
+            "histogram": {
+                ("+Inf" if math.isinf(bound) else str(bound)): count
+                for bound, count in zip(WAIT_BUCKETS, self.counts, strict=True)
+            },
+        }
+
+
+class _Waiter:
+    __slots__ = ("transaction", "sequence", "enqueued", "future")
+
+    def __init__(self, transaction, sequence, enqueued, future):
+        self.transaction = transaction
+        self.sequence = sequence
+        self.enqueued = enqueued
+        self.future = future
+
+    def key(self, now):
+        aged_class = self.transaction.transaction_class - int((now - self.enqueued) / AGING_TIME)
+
+        return aged_class, self.sequence
+
+
+class Transaction:
+    """A transaction that is waiting for or holding a node, see TransactionScheduler.acquire()"""
+
+    def __init__(self, transaction_class):
+        self.transaction_class = transaction_class
+        self.scheduler = None
+
+    def promote(self, transaction_class):
+        """Move the transaction up to `transaction_class` if that is more urgent
+
+        Used when a more urgent caller starts waiting for the result of
+        the transaction. Takes effect while it waits for the node.
+        """
+
+        self.transaction_class = min(self.transaction_class, transaction_class)
+
+    async def yield_to_urgent(self):
+        """Let waiting transactions of a more urgent class go first
+
+        Returns once this transaction has the node again.
+        Used to split up long batches of requests.
+        """
+
+        await self.scheduler._yield(self)
+
+
+class TransactionScheduler:
+    """Runs the SDO transactions of a node one at a time, by priority
+
+    Like an asyncio.Lock, but waiting transactions are granted access in
+    order of their (aged) TransactionClass instead of first come,
+    first served.
+    """
+
+    def __init__(self):
+        self._holder = None
+        self._waiting = []
+        self._sequence = 0
+
+        self.statistics = {transaction_class: WaitHistogram() for transaction_class in TransactionClass}
+
+    def transaction(self, transaction_class):
+        """Wait for the node and hold it for a transaction of `transaction_class`
+
+        Example:
+
+            async with scheduler.transaction(TransactionClass.POLLING):
+                ...
+        """
+
+        return self.acquire(Transaction(transaction_class))
+
+    @contextlib.asynccontextmanager
+    async def acquire(self, transaction):
+        """Like transaction(), for a Transaction that was created beforehand"""
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        transaction.scheduler = self
+
+        if self._holder is not None or self._waiting:
+            await self._wait(self._enqueue(transaction, start))
+
+        else:
+            self._holder = transaction
+
+        self.statistics[transaction.transaction_class].add(loop.time() - start)
+
+        try:
+            yield transaction
+
+        finally:
+            if self._holder is transaction:
+                self._release()
+
+    def _enqueue(self, transaction, now):
+        waiter = _Waiter(transaction, self._sequence, now, asyncio.get_running_loop().create_future())
+
+        self._sequence += 1
+        self._waiting.append(waiter)
+
+        return waiter
+
+    async def _wait(self, waiter):
+        try:
+            await waiter.future
+
+        except asyncio.CancelledError:
+            if waiter in self._waiting:
+                self._waiting.remove(waiter)
+
+            # Cancelled after being granted access. Pass it on.
+            elif self._holder is waiter.transaction:
+                self._release()
+
+            raise
+
+    async def _yield(self, transaction):
+        now = asyncio.get_running_loop().time()
+
+        if not any(waiter.key(now)[0] < transaction.transaction_class for waiter in self._waiting):
+            return
+
+        waiter = self._enqueue(transaction, now)
+        self._release()
+
+        await self._wait(waiter)
+
+    def _release(self):
+        self._holder = None
+        now = asyncio.get_running_loop().time()
+
+        while self._waiting:
+            waiter = min(self._waiting, key=lambda waiter: waiter.key(now))
+            self._waiting.remove(waiter)
+
+            # Cancelled, but the waiting task did not get to run yet
+            if waiter.future.done():
+                continue
+
+            self._holder = waiter.transaction
+            waiter.future.set_result(None)
+
+            return
+
+    def to_dict(self):
+        return {
+            transaction_class.name.lower(): self.statistics[transaction_class].to_dict()
+            for transaction_class in TransactionClass
+        }
@@ -0,0 +1,107 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+
+from lxa_iobus.lss_registry import WRITE_DELAY, write_atomic
+
+logger = logging.getLogger("lxa-iobus.object-directory-cache")
+
+
+class ObjectDirectoryCache:
+    """Snapshots of the object directories of known nodes, persisted as json
+
+    Snapshots are stored by node address.
+    Changes are written to disk in batches, atomically and outside of the
+    event loop, just like the LssAddressRegistry.
+    """
+
+    def __init__(self, loop, path=None, write_delay=WRITE_DELAY):
+        self.loop = loop
+        self.path = path
+        self.write_delay = write_delay
+
+        self._snapshots = dict()
+
+        self._dirty = False
+        self._write_task = None
+
+        # Every change gets a new version. Writes of older versions are
+        # skipped, in case a background write finishes after a newer one.
+        self._version = 0
+        self._written_version = 0
+        self._write_lock = threading.Lock()
+
+    def get(self, address):
+        return self._snapshots.get(address)
+
+    def update(self, address, snapshot):
+        """Store the snapshot of a node. Returns False if it did not change."""
+
+        if self._snapshots.get(address) == snapshot:
+            return False
+
+        self._snapshots[address] = snapshot
+        self._version += 1
+
+        if self.path:
+            self._dirty = True
+
+            if self._write_task is None or self._write_task.done():
+                self._write_task = self.loop.create_task(self._write_later())
+
+        return True
+
+    # persistence #############################################################
+    def load(self):
+        if not self.path:
+            logger.info("no object directory cache file set. skip loading")
+
+            return
+
+        if not os.path.exists(self.path):
+            return
+
+        try:
+            with open(self.path, "r") as f:
+                self._snapshots = json.loads(f.read())
+
+            self._written_version = self._version
+
+        except Exception:
+            logger.error("exception raised while reading %s", self.path, exc_info=True)
+
+    def _write(self, content, version):
+        with self._write_lock:
+            if version <= self._written_version:
+                return
+
+            try:
+                write_atomic(self.path, content)
+                self._written_version = version
+
+            except Exception:
+                logger.error("exception raised while writing %s", self.path, exc_info=True)
+
+    async def _write_later(self):
+        while self._dirty:
+            await asyncio.sleep(self.write_delay)
+
+            self._dirty = False
+
+            # Serialize on the event loop, write in a thread
+            content = json.dumps(self._snapshots)
+            await self.loop.run_in_executor(None, self._write, content, self._version)
+
+    def flush(self):
+        """Write pending changes right away, e.g. on shutdown"""
+
+        if self._write_task is not None:
+            self._write_task.cancel()
+            self._write_task = None
+
+        self._dirty = False
+
+        if self.path and self._version > self._written_version:
+            self._write(json.dumps(self._snapshots), self._version)
@@ -19,6 +19,8 @@ from aiohttp.web import (
 
 from lxa_iobus.lpc11xxcanisp.can_isp import CanIsp
 from lxa_iobus.lpc11xxcanisp.firmware import FIRMWARE_DIR
+from lxa_iobus.network import LxaNetwork
+from lxa_iobus.tx_queue import TxPriority, transmit_priority
 
 STATIC_ROOT = os.path.join(os.path.dirname(__file__), "static")
 logger = logging.getLogger("LXAIOBusServer")
@@ -30,6 +32,28 @@ EVENT_DELAY_STATUS = 1.0 / 10.0
 EVENT_DELAY_PINS = 1.0 / 1.0
 
 
+def parse_sdo_address(index, sub_index):
+    """Check an index and sub index of a raw SDO request
+
+    Both may be given as hex (with 0x prefix) or decimal strings or as ints.
+    Only standard and vendor specific indices may be accessed.
+    """
+
+    try:
+        index = int(str(index), base=0)
+        sub_index = int(str(sub_index), base=0)
+    except ValueError as e:
+        raise HTTPBadRequest(body="Malformed index/sub index") from e
+
+    if index < 0x1000 or index >= 0x3000:
+        raise HTTPForbidden(body="Raw SDO access for non-standard, non-vendor indices is not allowed")
+
+    if sub_index < 0 or sub_index > 255:
+        raise HTTPBadRequest(body="SDO sub index outside of valid range")
+
+    return index, sub_index
+
+
 class MaybeJsonEventStream:
     """Serve a single JSON response or an event stream based on user request
 
@@ -82,10 +106,16 @@ class MaybeJsonEventStream:
 
 
 class LXAIOBusServer:
-    def __init__(self, app, loop, network):
+    """REST API and web interface for one or more LxaNetworks
+
+    With more than one network the node names are prefixed with the name
+    of the CAN interface the node is connected to (e.g. "can1:Ethernet-Mux-00003.00020").
+    """
+
+    def __init__(self, app, loop, networks):
         self.app = app
         self.loop = loop
-        self.network = network
+        self.networks = list(networks)
         self._isp_console = list()
         self._isp_console_queues = list()
 
@@ -110,9 +140,12 @@ class LXAIOBusServer:
 
         app.router.add_route("GET", "/api/v2/status", self.get_status)
         app.router.add_route("GET", "/api/v2/isp_log", self.get_isp_console)
+        app.router.add_route("GET", "/api/v2/liveness", self.get_liveness)
+        app.router.add_route("GET", "/api/v2/bus_statistics", self.get_bus_statistics)
 
         app.router.add_route("GET", "/api/v2/node/{node}/raw_sdo/{index}/{sub_index}", self.get_sdo_raw)
         app.router.add_route("POST", "/api/v2/node/{node}/raw_sdo/{index}/{sub_index}", self.send_sdo_raw)
+        app.router.add_route("POST", "/api/v2/node/{node}/raw_sdo_batch", self.sdo_raw_batch)
 
         # static files
         app.router.add_static("/static", STATIC_ROOT)
@@ -120,13 +153,15 @@ class LXAIOBusServer:
         app.router.add_route("GET", "/node", self.get_html("node.html"))
         app.router.add_route("GET", "/isp", self.get_html("isp.html"))
 
-        # setup can isp
-        self.can_isp = CanIsp(node=network.isp_node, logging_callback=self._isp_logging_callback)
-
-        # flash worker
+        # setup can isp and a flash worker per network,
+        # so nodes on different buses can be flashed at the same time
         self._running = True
-        self.flash_jobs = asyncio.Queue()
-        self.loop.create_task(self.flash_worker())
+        self.flash_jobs = dict()
+
+        for network in self.networks:
+            can_isp = CanIsp(node=network.isp_node, logging_callback=self._isp_logging_callback)
+            self.flash_jobs[network] = asyncio.Queue()
+            self.loop.create_task(self.flash_worker(can_isp, self.flash_jobs[network]))
 
     def shutdown(self):
         self._running = False
@@ -158,31 +193,34 @@ class LXAIOBusServer:
 
         return queue
 
-    async def flash_worker(self):
+    async def flash_worker(self, can_isp, flash_jobs):
         while self._running:
             try:
-                shutdown, node, file_name = await self.flash_jobs.get()
+                shutdown, node, file_name = await flash_jobs.get()
 
                 if shutdown:
                     return
 
-                await self.can_isp.console_log(
+                await can_isp.console_log(
                     "Flashing {} ({})".format(
                         node.name,
                         node.address,
                     )
                 )
 
-                await self.can_isp.console_log("Invoking isp")
-                await node.invoke_isp()
+                # Flashing sends a lot of frames,
+                # but nobody is waiting for a single one of them.
+                with transmit_priority(TxPriority.BULK):
+                    await can_isp.console_log("Invoking isp")
+                    await node.invoke_isp()
 
-                await self.can_isp.console_log("Start flashing")
-                await self.can_isp.write_flash(file_name)
+                    await can_isp.console_log("Start flashing")
+                    await can_isp.write_flash(file_name)
 
-                await self.can_isp.console_log("Resetting node")
-                await self.can_isp.reset()
+                    await can_isp.console_log("Resetting node")
+                    await can_isp.reset()
 
-                await self.can_isp.console_log("Flashing done")
+                await can_isp.console_log("Flashing done")
 
             except CancelledError:
                 return
@@ -190,15 +228,46 @@ class LXAIOBusServer:
             except Exception:
                 logger.exception("flashing failed")
 
+    # nodes ###################################################################
+    def _node_name(self, network, node):
+        if len(self.networks) == 1:
+            return node.name
+
+        return f"{network.interface}:{node.name}"
+
+    def _nodes(self):
+        """All nodes of all networks as (name, node) tuples"""
+
+        for network in self.networks:
+            for node in network.nodes.copy().values():
+                yield self._node_name(network, node), node
+
+    def get_node_by_name(self, name):
+        if len(self.networks) == 1:
+            return self.networks[0].get_node_by_name(name)
+
+        interface, _, node_name = name.partition(":")
+
+        for network in self.networks:
+            if network.interface == interface:
+                return network.get_node_by_name(node_name)
+
+        raise ValueError("unknown node name '{}'".format(name))
+
     # views ###################################################################
     def _get_server_info_once(self):
+        lss_states = [network.lss_state for network in self.networks]
+
         return {
             "hostname": os.uname()[1],
             "started": str(self.started),
-            "can_interface": self.network.interface,
-            "can_interface_is_up": self.network.interface_is_up(),
-            "lss_state": self.network.lss_state.value,
-            "can_tx_error": self.network.tx_error,
+            "can_interface": ", ".join(network.interface for network in self.networks),
+            "can_interface_is_up": all(network.interface_is_up() for network in self.networks),
+            "lss_state": (
+                LxaNetwork.LssStates.SCANNING if LxaNetwork.LssStates.SCANNING in lss_states else lss_states[0]
+            ).value,
+            "can_tx_error": any(network.tx_error for network in self.networks),
+            "can_bus_load": max(network.bus_statistics.utilisation()[0] for network in self.networks),
         }
 
     async def get_server_info(self, request):
@@ -226,7 +295,7 @@ class LXAIOBusServer:
         response = MaybeJsonEventStream(request, headers)
 
         while self._running:
-            node_names = sorted(node.name for node in self.network.nodes.values())
+            node_names = sorted(name for name, _ in self._nodes())
             message = {
                 "code": 0,
                 "error_message": "",
@@ -249,11 +318,13 @@ class LXAIOBusServer:
 
         try:
             node_name = request.match_info["node"]
-            node = self.network.get_node_by_name(node_name)
+            node = self.get_node_by_name(node_name)
 
             driver = node.product.__class__.__name__ + "Driver"
             info = await node.info()
 
+            node.watch_locator()
+
             response["result"] = {
                 "locator": node.locator_state,
                 "driver": driver,
@@ -321,8 +392,10 @@ class LXAIOBusServer:
 
                 message["nodes"] = dict()
 
-                for node in self.network.nodes.values():
-                    message["nodes"][node.name] = {
+                for name, node in self._nodes():
+                    node.watch_locator()
+
+                    message["nodes"][name] = {
                         "locator": node.locator_state,
                         "driver": f"{node.product.__class__.__name__}Driver",
                         "info": await node.info(),
@@ -331,10 +404,13 @@ class LXAIOBusServer:
             if pin_delay <= 0.0:
                 pin_delay += pins_interval
 
-                message["pins"] = dict()
+                # Poll the nodes concurrently. Nodes on different buses
+                # do not have to wait for each other.
+                # Polling must not delay the writes of other users.
+                with transmit_priority(TxPriority.POLLING):
+                    pin_infos = await asyncio.gather(*[self._get_pin_info_once(node_name) for node_name in pins])
 
-                for node_name in pins:
-                    message["pins"][node_name] = await self._get_pin_info_once(node_name)
+                message["pins"] = dict(zip(pins, pin_infos, strict=True))
 
             stop = await response.push(message)
             if stop:
@@ -375,6 +451,28 @@ class LXAIOBusServer:
 
         return response
 
+    async def get_liveness(self, request):
+        headers = {"Access-Control-Allow-Origin": "*"}
+        liveness = dict()
+
+        for network in self.networks:
+            for node_name, statistics in network.liveness_statistics().items():
+                name = node_name if len(self.networks) == 1 else f"{network.interface}:{node_name}"
+                liveness[name] = statistics
+
+        return json_response(liveness, headers=headers)
+
+    async def get_bus_statistics(self, request):
+        headers = {"Access-Control-Allow-Origin": "*"}
+
+        if len(self.networks) == 1:
+            statistics = self.networks[0].bus_statistics_to_dict()
+
+        else:
+            statistics = {network.interface: network.bus_statistics_to_dict() for network in self.networks}
+
+        return json_response(statistics, headers=headers)
+
     async def get_pins(self, request):
         response = {
             "code": 0,
@@ -384,7 +482,7 @@ class LXAIOBusServer:
 
         try:
             node_name = request.match_info["node"]
-            node = self.network.get_node_by_name(node_name)
+            node = self.get_node_by_name(node_name)
 
             if "outputs" in node.od:
                 response["result"].extend(node.od.outputs.pins)
@@ -426,7 +524,7 @@ class LXAIOBusServer:
         try:
             node_name = request.match_info["node"]
             pin_name = request.match_info["pin"]
-            node = self.network.get_node_by_name(node_name)
+            node = self.get_node_by_name(node_name)
 
             if "outputs" in node.od and pin_name in node.od.outputs.pins:
                 response["result"] = int(await node.od.outputs.get(pin_name))
@@ -488,7 +586,9 @@ class LXAIOBusServer:
         }
 
         try:
-            node = self.network.get_node_by_name(node_name)
+            node = self.get_node_by_name(node_name)
+
+            node.watch_locator()
 
             pin_info = {
                 "locator": node.locator_state,
@@ -564,7 +664,8 @@ class LXAIOBusServer:
         response = MaybeJsonEventStream(request)
 
         while self._running:
-            info = await self._get_pin_info_once(node_name)
+            with transmit_priority(TxPriority.POLLING):
+                info = await self._get_pin_info_once(node_name)
             stop = await response.push(info)
             if stop:
                 break
@@ -588,7 +689,7 @@ class LXAIOBusServer:
             post = await (request.json() if content_type == "application/json" else request.post())
             value = post["value"]
 
-            node = self.network.get_node_by_name(node_name)
+            node = self.get_node_by_name(node_name)
 
             if value == "toggle":
                 await node.od.outputs.toggle(pin_name)
@@ -644,22 +745,10 @@ class LXAIOBusServer:
         index = request.match_info["index"]
         sub_index = request.match_info["sub_index"]
 
-        try:
-            # Allow users to specify the sdo indices as hex (with 0x prefix)
-            # or as decimal.
-            index = int(index, base=0)
-            sub_index = int(sub_index, base=0)
-        except ValueError as e:
-            raise HTTPBadRequest(body="Malformed index/sub index") from e
-
-        if index < 0x1000 or index >= 0x3000:
-            raise HTTPForbidden(body="Raw SDO access for non-standard, non-vendor indices is not allowed")
-
-        if sub_index < 0 or sub_index > 255:
-            raise HTTPBadRequest(body="SDO sub index outside of valid range")
+        index, sub_index = parse_sdo_address(index, sub_index)
 
         try:
-            node = self.network.get_node_by_name(node_name)
+            node = self.get_node_by_name(node_name)
         except ValueError as e:
             raise HTTPNotFound(body="Node ID not found") from e
 
@@ -675,22 +764,10 @@ class LXAIOBusServer:
         index = request.match_info["index"]
         sub_index = request.match_info["sub_index"]
 
-        try:
-            # Allow users to specify the sdo indices as hex (with 0x prefix)
-            # or as decimal.
-            index = int(index, base=0)
-            sub_index = int(sub_index, base=0)
-        except ValueError as e:
-            raise HTTPBadRequest(body="Malformed index/sub index") from e
-
-        if index < 0x1000 or index >= 0x3000:
-            raise HTTPForbidden(body="Raw SDO access for non-standard, non-vendor indices is not allowed")
-
-        if sub_index < 0 or sub_index > 255:
-            raise HTTPBadRequest(body="SDO sub index outside of valid range")
+        index, sub_index = parse_sdo_address(index, sub_index)
 
         try:
-            node = self.network.get_node_by_name(node_name)
+            node = self.get_node_by_name(node_name)
         except ValueError as e:
             raise HTTPNotFound(body="Node ID not found") from e
 
@@ -704,6 +781,44 @@ class LXAIOBusServer:
         # No Content
         return Response(status=204)
 
+    async def sdo_raw_batch(self, request):
+        """Read or write several raw SDOs of a node in one request
+
+        The body is either {"read": [[index, sub_index], ...]}, which is
+        answered with a list of hex encoded payloads, or
+        {"write": [[index, sub_index, "hex data"], ...]}.
+        """
+
+        node_name = request.match_info["node"]
+
+        try:
+            body = await request.json()
+            reads = body.get("read", [])
+            writes = body.get("write", [])
+
+            reads = [parse_sdo_address(index, sub_index) for index, sub_index in reads]
+            writes = [(*parse_sdo_address(index, sub_index), bytes.fromhex(data)) for index, sub_index, data in writes]
+        except (ValueError, TypeError, AttributeError) as e:
+            raise HTTPBadRequest(body="Malformed batch") from e
+
+        try:
+            node = self.get_node_by_name(node_name)
+        except ValueError as e:
+            raise HTTPNotFound(body="Node ID not found") from e
+
+        # Like with single raw SDOs any SdoAbort or TimeoutError ends
+        # up as an internal server error.
+        if writes:
+            await node.sdo_write_many(writes)
+
+        if not reads:
+            # No Content
+            return Response(status=204)
+
+        results = await node.sdo_read_many(reads)
+
+        return json_response([bytes(result).hex() for result in results])
+
     async def toggle_locator(self, request):
         response = {
             "code": 0,
@@ -713,10 +828,13 @@ class LXAIOBusServer:
 
         try:
             node_name = request.match_info["node"]
-            node = self.network.get_node_by_name(node_name)
+            node = self.get_node_by_name(node_name)
 
-            # The locator state is updated by periodic pings
+            # The locator state is updated by periodic pings while it is watched.
             # The current state may thus be stale by up to a second or so.
+            if not node.locator_watched:
+                await node.ping()
+
             new_state = not node.locator_state
             await node.set_locator_state(new_state)
             logger.info(
@@ -756,12 +874,12 @@ class LXAIOBusServer:
 
         try:
             node_name = request.match_info["node"]
-            node = self.network.get_node_by_name(node_name)
+            node = self.get_node_by_name(node_name)
 
             file_name = node.product.FIRMWARE_FILE
             file_name = os.path.join(FIRMWARE_DIR, file_name)
 
-            await self.flash_jobs.put(
+            await self.flash_jobs[node.lxa_network].put(
                 (
                     False,
                     node,
@@ -20,6 +20,7 @@ async function post_json(url, content) {
 function set_server_info(data) {
   data["can_interface_is_up"] = data["can_interface_is_up"] ? "UP" : "DOWN";
   data["can_tx_error"] = data["can_tx_error"] ? "TX_ERROR!" : "";
+  data["can_bus_load"] = `${(data["can_bus_load"] * 100).toFixed(1)} %`;
 
   const key_elem = [
     ["hostname", "server-info-hostname"],
@@ -28,6 +29,7 @@ function set_server_info(data) {
     ["can_interface_is_up", "server-info-can-interface-state"],
     ["can_tx_error", "server-info-can-tx-error"],
     ["lss_state", "server-info-lss-state"],
+    ["can_bus_load", "server-info-can-bus-load"],
   ];
 
   for (const [key, elem] of key_elem) {
@@ -0,0 +1,115 @@
+import logging
+import socket
+import struct
+import time
+
+from can import Message
+
+logger = logging.getLogger("lxa-iobus.socketcan")
+
+# struct can_frame from linux/can.h
+CAN_FRAME = struct.Struct("=IB3x8s")
+
+CAN_EFF_FLAG = 0x80000000
+CAN_RTR_FLAG = 0x40000000
+CAN_ERR_FLAG = 0x20000000
+CAN_EFF_MASK = 0x1FFFFFFF
+
+
+class AsyncSocketCan:
+    """Raw SocketCAN socket driven by the asyncio event loop
+
+    Received frames are read in a reader callback registered with
+    `loop.add_reader()` and handed to `callback` directly on the event loop.
+    Frames are sent using `loop.sock_sendall()`.
+    No threads are involved.
+    """
+
+    def __init__(self, loop, interface, callback):
+        self.loop = loop
+        self.interface = interface
+        self.callback = callback
+
+        self.socket = None
+
+    def open(self):
+        self.socket = socket.socket(socket.PF_CAN, socket.SOCK_RAW, socket.CAN_RAW)
+        self.socket.setblocking(False)
+        self.socket.bind((self.interface,))
+
+        self.loop.add_reader(self.socket.fileno(), self._read)
+
+    def close(self):
+        if self.socket is None:
+            return
+
+        self.loop.remove_reader(self.socket.fileno())
+        self.socket.close()
+        self.socket = None
+
+    def set_filters(self, filters):
+        """Install kernel receive filters
+
+        filters: list of (can_id, can_mask) tuples matching 11 bit
+                 identifiers. An empty list receives all frames.
+        """
+
+        # Do not let 29 bit identifiers with the same low bits through
+        filters = [(can_id, can_mask | CAN_EFF_FLAG) for can_id, can_mask in filters]
+
+        if not filters:
+            filters = [(0, 0)]
+
+        self.socket.setsockopt(
+            socket.SOL_CAN_RAW,
+            socket.CAN_RAW_FILTER,
+            struct.pack(f"={2 * len(filters)}I", *(value for f in filters for value in f)),
+        )
+
+    async def send(self, message):
+        can_id = message.arbitration_id
+
+        if message.is_extended_id:
+            can_id |= CAN_EFF_FLAG
+
+        if message.is_remote_frame:
+            can_id |= CAN_RTR_FLAG
+
+        await self.loop.sock_sendall(
+            self.socket,
+            CAN_FRAME.pack(can_id, message.dlc, bytes(message.data)),
+        )
+
+    def _read(self):
+        # Drain everything the socket has buffered,
+        # so a burst of frames costs only a single wakeup.
+        while self.socket is not None:
+            try:
+                frame = self.socket.recv(CAN_FRAME.size)
+
+            except BlockingIOError:
+                return
+
+            except OSError as e:
+                logger.error("rx: socket error: %s", e)
+
+                return
+
+            can_id, dlc, data = CAN_FRAME.unpack(frame)
+
+            if can_id & CAN_ERR_FLAG:
+                continue
+
+            is_extended_id = bool(can_id & CAN_EFF_FLAG)
+
+            message = Message(
+                timestamp=time.time(),
+                arbitration_id=can_id & CAN_EFF_MASK if is_extended_id else can_id & 0x7FF,
+                is_extended_id=is_extended_id,
+                is_remote_frame=bool(can_id & CAN_RTR_FLAG),
+                dlc=dlc,
+                data=data[:dlc],
+                channel=self.interface,
+            )
+
+            self.callback(message)
@@ -0,0 +1,179 @@
+import asyncio
+import contextlib
+import contextvars
+import enum
+import time
+
+
+class TxPriority(enum.IntEnum):
+    """Transmit priority classes. Frames of lower classes are sent first."""
+
+    LSS = 0
+    USER_WRITE = 1
+    POLLING = 2
+    BULK = 3
+
+
+# Frames that can be queued per class before senders have to wait
+TX_QUEUE_SIZES = {
+    TxPriority.LSS: 8,
+    TxPriority.USER_WRITE: 32,
+    TxPriority.POLLING: 32,
+    TxPriority.BULK: 128,
+}
+
+# Priority of the frames sent from the current task,
+# unless a priority is passed to LxaNetwork.send_message() explicitly
+_tx_priority = contextvars.ContextVar("tx_priority", default=TxPriority.USER_WRITE)
+
+
+def current_priority():
+    return _tx_priority.get()
+
+
+@contextlib.contextmanager
+def transmit_priority(priority):
+    """Send all frames from inside the with block with `priority`
+
+    Example:
+
+        with transmit_priority(TxPriority.POLLING):
+            await node.od.inputs.get_all()
+    """
+
+    token = _tx_priority.set(priority)
+
+    try:
+        yield
+
+    finally:
+        _tx_priority.reset(token)
+
+
+class TxClassStatistics:
+    """Frames sent and dropped and the time they spent in the queue"""
+
+    __slots__ = ("sent", "dropped", "depth_max", "waited", "wait_total", "wait_max")
+
+    def __init__(self):
+        self.sent = 0
+        self.dropped = 0
+        self.depth_max = 0
+        self.waited = 0
+        self.wait_total = 0
+        self.wait_max = 0
+
+    def to_dict(self, depth):
+        return {
+            "depth": depth,
+            "depth_max": self.depth_max,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "wait_avg": self.wait_total / self.waited if self.waited else None,
+            "wait_max": self.wait_max,
+        }
+
+
+class TxQueue:
+    """Bounded transmit queues, one per TxPriority
+
+    `put()` waits while the queue of the priority class of a frame is full,
+    which slows down producers of bulk traffic instead of letting the
+    backlog and with it the latency of everyone else grow.
+    `get()` returns the oldest frame of the most urgent class.
+    """
+
+    def __init__(self, sizes=None):
+        sizes = sizes or TX_QUEUE_SIZES
+
+        self._queues = {priority: asyncio.Queue(maxsize=sizes[priority]) for priority in TxPriority}
+        self._available = asyncio.Event()
+
+        self.statistics = {priority: TxClassStatistics() for priority in TxPriority}
+
+    async def put(self, message, priority=None, timeout=None):
+        """Queue a frame
+
+        Returns a future that resolves to the time.time() the frame was
+        sent at, or is cancelled if the frame was dropped.
+        Senders can cancel the future to drop a frame that is still queued,
+        e.g. because its request timed out.
+
+        Raises TimeoutError if the queue stayed full for `timeout` seconds.
+        """
+
+        if priority is None:
+            priority = current_priority()
+
+        queue = self._queues[priority]
+        sent = asyncio.get_running_loop().create_future()
+
+        try:
+            await asyncio.wait_for(queue.put((time.monotonic(), message, sent)), timeout=timeout)
+
+        except asyncio.TimeoutError:
+            self.dropped(priority)
+
+            raise TimeoutError(f"TX queue {priority.name.lower()} is full") from None
+
+        statistics = self.statistics[priority]
+        statistics.depth_max = max(statistics.depth_max, queue.qsize())
+
+        self._available.set()
+
+        return sent
+
+    async def get(self, timeout=None):
+        """The next frame to send as a (priority, message, sent) tuple
+
+        Returns None if no frame was queued within `timeout` seconds.
+        """
+
+        while True:
+            for priority, queue in self._queues.items():
+                while not queue.empty():
+                    enqueued, message, sent = queue.get_nowait()
+
+                    # The sender gave up on the frame
+                    if sent.cancelled():
+                        self.dropped(priority)
+
+                        continue
+
+                    wait = time.monotonic() - enqueued
+
+                    statistics = self.statistics[priority]
+                    statistics.waited += 1
+                    statistics.wait_total += wait
+                    statistics.wait_max = max(statistics.wait_max, wait)
+
+                    return priority, message, sent
+
+            self._available.clear()
+
+            try:
+                await asyncio.wait_for(self._available.wait(), timeout=timeout)
+
+            except asyncio.TimeoutError:
+                return None
+
+    def sent(self, priority):
+        self.statistics[priority].sent += 1
+
+    def dropped(self, priority):
+        self.statistics[priority].dropped += 1
+
+    def clear(self):
+        """Drop all queued frames, e.g. when the interface went down"""
+
+        for priority, queue in self._queues.items():
+            while not queue.empty():
+                _, _, sent = queue.get_nowait()
+                sent.cancel()
+                self.dropped(priority)
+
+    def to_dict(self):
+        return {
+            priority.name.lower(): self.statistics[priority].to_dict(self._queues[priority].qsize())
+            for priority in TxPriority
+        }
@@ -0,0 +1,53 @@
+"""Run LxaNetwork against the simulated nodes of the benchmarks
+
+No CAN interface is needed. Every network gets a python-can virtual bus
+channel of its own, so tests do not see each other's frames.
+"""
+
+import asyncio
+import contextlib
+import itertools
+import pathlib
+import sys
+
+sys.path.insert(0, str(pathlib.Path(__file__).parents[1] / "contrib" / "benchmarks"))
+
+from simulated_bus import SimulatedBus, SimulatedNode  # noqa: E402
+
+from lxa_iobus.network import LxaNetwork  # noqa: E402
+
+__all__ = ["SimulatedNode", "simulated_network", "wait_until"]
+
+_channels = itertools.count()
+
+
+async def wait_until(condition, timeout=10):
+    """Poll `condition` until it is true. Raises TimeoutError after `timeout` seconds."""
+
+    async def poll():
+        while not condition():
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(poll(), timeout)
+
+
+@contextlib.asynccontextmanager
+async def simulated_network(simulated_nodes, latency=0.0, **kwargs):
+    """An LxaNetwork that runs until the end of the block, with all nodes set up"""
+
+    channel = f"lxa-iobus-test-{next(_channels)}"
+    bus = SimulatedBus(simulated_nodes, channel, latency=latency)
+
+    loop = asyncio.get_running_loop()
+    network = LxaNetwork(loop, channel, bustype="virtual", **kwargs)
+    task = loop.create_task(network.run())
+
+    try:
+        await wait_until(lambda: len(network.nodes) == len(simulated_nodes))
+
+        yield network
+
+    finally:
+        network.shutdown()
+        await task
+        bus.stop()
@@ -0,0 +1,75 @@
+import asyncio
+import struct
+
+import pytest
+from simulation import SimulatedNode, simulated_network
+
+from lxa_iobus.canopen import SdoAbort
+from lxa_iobus.node.bus_node import SDO_READ_TIME_MAX
+
+
+def test_batch_read_abort_does_not_fail_joined_reads():
+    async def main():
+        async with simulated_network([SimulatedNode([0x507, 4, 3, 1])]) as network:
+            node = next(iter(network.nodes.values()))
+
+            batch, single = await asyncio.gather(
+                node.sdo_read_many([(0x2100, 9), (0x2100, 1)]),
+                node.sdo_read(0x2100, 1),
+                return_exceptions=True,
+            )
+
+            assert isinstance(batch, SdoAbort)
+            assert single == struct.pack("<L", 4)
+            assert node.sdo_reads_coalesced == 1
+
+    asyncio.run(main())
+
+
+class SilentObjectNode(SimulatedNode):
+    """Does not answer reads of SILENT_INDEX"""
+
+    SILENT_INDEX = 0x2F01
+
+    def sdo(self, data):
+        if struct.unpack_from("<H", data, 1)[0] == self.SILENT_INDEX:
+            return []
+
+        return super().sdo(data)
+
+
+def test_batch_read_timeout_rereads_joined_objects():
+    async def main():
+        async with simulated_network([SilentObjectNode([0x507, 4, 3, 1])]) as network:
+            node = next(iter(network.nodes.values()))
+
+            # The batch gives up before it gets to 0x2101.1
+            batch, single = await asyncio.gather(
+                node.sdo_read_many([(SilentObjectNode.SILENT_INDEX, 0), (0x2101, 1)]),
+                node.sdo_read(0x2101, 1),
+                return_exceptions=True,
+            )
+
+            assert isinstance(batch, TimeoutError)
+            assert single == struct.pack("<L", 3)
+
+    asyncio.run(main())
+
+
+def test_read_from_silent_object_is_given_up_in_time():
+    async def main():
+        async with simulated_network([SilentObjectNode([0x507, 4, 3, 1])]) as network:
+            node = next(iter(network.nodes.values()))
+            loop = asyncio.get_running_loop()
+
+            # Every timeout doubles the retransmission timeout,
+            # which must not make the reads that follow take longer
+            for _ in range(4):
+                start = loop.time()
+
+                with pytest.raises(TimeoutError):
+                    await node.sdo_read(SilentObjectNode.SILENT_INDEX, 0)
+
+                assert loop.time() - start < SDO_READ_TIME_MAX + 0.1
+
+    asyncio.run(main())
@@ -0,0 +1,35 @@
+import asyncio
+
+from simulation import SimulatedNode, simulated_network, wait_until
+
+from lxa_iobus.network import NodeState
+
+
+def test_node_reset_while_healthy():
+    async def main():
+        simulated_nodes = [SimulatedNode([0x507, 4, 3, serial]) for serial in range(1, 4)]
+
+        async with simulated_network(simulated_nodes) as network:
+            nodes = dict(network.nodes)
+            node = next(node for node in nodes.values() if node.lss_address == simulated_nodes[0].lss_address)
+            od = node.od
+
+            # The node forgets its node id long before the next ping
+            simulated_nodes[0].reset()
+
+            await wait_until(lambda: simulated_nodes[0].node_id != 0xFF)
+            await wait_until(lambda: len(network.nodes) == len(nodes))
+
+            # It gets its old node id and keeps its object directory,
+            # instead of showing up a second time
+            assert simulated_nodes[0].node_id == node.node_id
+            assert network.nodes == nodes
+            assert network.nodes[node.node_id].od is od
+            assert not network._lost_nodes
+
+            statistics = network.liveness_statistics()
+
+            assert len(statistics) == len(nodes)
+            assert all(liveness["state"] == NodeState.HEALTHY.value for liveness in statistics.values())
+
+    asyncio.run(main())
@@ -0,0 +1,131 @@
+import asyncio
+import errno
+import socket
+
+import pytest
+from can import Message
+
+from lxa_iobus.network import LxaNetwork
+from lxa_iobus.socketcan import CAN_EFF_FLAG, CAN_ERR_FLAG, CAN_FRAME, CAN_RTR_FLAG, AsyncSocketCan
+from lxa_iobus.tx_queue import TxPriority
+
+
+def connect(socket_can):
+    """Attach a socket pair instead of a raw CAN socket. Returns the other end."""
+
+    # Like a raw CAN socket, a SEQPACKET socket keeps the frame boundaries
+    ours, theirs = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    ours.setblocking(False)
+
+    socket_can.socket = ours
+    socket_can.loop.add_reader(ours.fileno(), socket_can._read)
+
+    return theirs
+
+
+@pytest.mark.parametrize(
+    "message, can_id",
+    [
+        (Message(arbitration_id=0x601, data=b"\x40\x18\x10\x01", is_extended_id=False), 0x601),
+        (Message(arbitration_id=0x1234567, data=b"\x01", is_extended_id=True), 0x1234567 | CAN_EFF_FLAG),
+        (Message(arbitration_id=0x701, is_remote_frame=True, dlc=1, is_extended_id=False), 0x701 | CAN_RTR_FLAG),
+    ],
+)
+def test_send_encodes_can_frame(message, can_id):
+    async def main():
+        socket_can = AsyncSocketCan(asyncio.get_running_loop(), "can0", callback=None)
+        theirs = connect(socket_can)
+
+        await socket_can.send(message)
+
+        assert CAN_FRAME.unpack(theirs.recv(CAN_FRAME.size)) == (
+            can_id,
+            message.dlc,
+            bytes(message.data).ljust(8, b"\x00"),
+        )
+
+        socket_can.close()
+        theirs.close()
+
+    asyncio.run(main())
+
+
+def test_receive_decodes_can_frames():
+    async def main():
+        received = []
+        socket_can = AsyncSocketCan(asyncio.get_running_loop(), "can0", received.append)
+        theirs = connect(socket_can)
+
+        theirs.send(CAN_FRAME.pack(0x581, 4, b"\x43\x18\x10\x01\x00\x00\x00\x00"))
+        theirs.send(CAN_FRAME.pack(CAN_ERR_FLAG | 0x004, 8, bytes(8)))
+        theirs.send(CAN_FRAME.pack(0x1234567 | CAN_EFF_FLAG, 2, b"\x01\x02" + bytes(6)))
+
+        while len(received) < 2:
+            await asyncio.sleep(0.01)
+
+        # Error frames are skipped, data beyond the dlc is cut off
+        assert [(m.arbitration_id, m.is_extended_id, bytes(m.data)) for m in received] == [
+            (0x581, False, b"\x43\x18\x10\x01"),
+            (0x1234567, True, b"\x01\x02"),
+        ]
+
+        socket_can.close()
+        theirs.close()
+
+    asyncio.run(main())
+
+
+class FailingSocket:
+    """Raises `error` for the first `failures` frames"""
+
+    def __init__(self, error, failures):
+        self.error = error
+        self.failures = failures
+        self.sent = []
+
+    async def send(self, message):
+        if self.failures:
+            self.failures -= 1
+
+            raise OSError(self.error, "send failed")
+
+        self.sent.append(message)
+
+
+@pytest.mark.parametrize(
+    "error, failures, sent",
+    [
+        # The send buffer of the interface is full. Wait for it to drain.
+        (errno.ENOBUFS, 3, True),
+        # Still full once TX_RETRY_TIMEOUT is over
+        (errno.ENOBUFS, 1000, False),
+        # Anything else is not retried
+        (errno.ENETDOWN, 1, False),
+    ],
+)
+def test_transmit_retries_only_while_send_buffer_is_full(error, failures, sent):
+    async def main():
+        network = LxaNetwork(asyncio.get_running_loop(), "can0", transport="asyncio")
+        network._running = True
+        network._socket = FailingSocket(error, failures)
+
+        message = Message(arbitration_id=0x601, data=bytes(8), is_extended_id=False)
+        future = asyncio.get_running_loop().create_future()
+
+        await network._transmit(TxPriority.USER_WRITE, message, future)
+
+        statistics = network._tx_queue.statistics[TxPriority.USER_WRITE]
+
+        if sent:
+            assert network._socket.sent == [message]
+            assert future.result() == message.timestamp
+            assert network.tx_retries == failures
+            assert statistics.sent == 1
+            assert not network.tx_error
+
+        else:
+            assert network._socket.sent == []
+            assert future.cancelled()
+            assert statistics.dropped == 1
+
+    asyncio.run(main())